@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+# How many documents may be extracted at the same time, how many more
+# may wait for a slot, and how long they may wait before we give up.
+EXTRACT_MAX_IN_FLIGHT = max(1, int(os.getenv("EXTRACT_MAX_IN_FLIGHT", "2")))
+EXTRACT_MAX_QUEUE = max(0, int(os.getenv("EXTRACT_MAX_QUEUE", "8")))
+EXTRACT_QUEUE_TIMEOUT = float(os.getenv("EXTRACT_QUEUE_TIMEOUT", "30"))
+
+
+class GateSaturated(Exception):
+    """
+    Raised when a request cannot be admitted. Carries the HTTP status to
+    answer with and a Retry-After hint in seconds.
+    """
+
+    def __init__(self, message: str, status_code: int, retry_after: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class ExtractionGate:
+    """
+    Runs blocking extraction work on a bounded thread pool, off the event
+    loop, with admission control:
+
+      - at most `max_in_flight` jobs run at once,
+      - at most `max_queue` more wait for a slot (else 429),
+      - a waiting job gives up after `queue_timeout` seconds (503).
+
+    A slot is released when the work itself finishes, not when the
+    awaiting request goes away, so disconnects can't oversubscribe.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = EXTRACT_MAX_IN_FLIGHT,
+        max_queue: int = EXTRACT_MAX_QUEUE,
+        queue_timeout: float = EXTRACT_QUEUE_TIMEOUT,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self.in_flight = 0
+        self.queued = 0
+        # background jobs waiting for a slot (outside the admission queue)
+        self.background_waiting = 0
+        self.rejected = 0
+        self.completed = 0
+        # moving average of job duration, used for Retry-After
+        self._avg_seconds = 10.0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_in_flight,
+                    thread_name_prefix="extract",
+                )
+            return self._executor
+
+    def retry_after(self) -> int:
+        """
+        Rough seconds until a slot frees up for a new request.
+        """
+        waves = (self.queued + 1) / self.max_in_flight
+        return max(1, math.ceil(self._avg_seconds * waves))
+
+    def check_capacity(self) -> None:
+        """
+        Cheap early check, so saturated requests can be refused before
+        the upload is even read.
+        """
+        if self.in_flight + self.queued >= self.max_in_flight + self.max_queue:
+            self.rejected += 1
+            raise GateSaturated(
+                "Extraction queue is full, try again later",
+                status_code=429,
+                retry_after=self.retry_after(),
+            )
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Wait for a slot and run `fn(*args)` on the extraction pool.
+        """
+        self.check_capacity()
+
+        self.queued += 1
+        try:
+            # not wait_for: on 3.11 it can time out after the acquire went
+            # through, and the slot would never be released
+            async with asyncio.timeout(self.queue_timeout):
+                await self._slots.acquire()
+        except TimeoutError:
+            self.rejected += 1
+            raise GateSaturated(
+                "Timed out waiting for an extraction slot",
+                status_code=503,
+                retry_after=self.retry_after(),
+            ) from None
+        finally:
+            self.queued -= 1
+
+        return await self._run_in_slot(fn, *args)
+
+    async def run_background(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Like `run`, for work nobody is waiting on a response for (async
+        jobs): no admission control, it waits for a slot as long as it
+        takes, but it takes the same slots, so it counts against
+        `max_in_flight` like every request.
+        """
+        self.background_waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.background_waiting -= 1
+
+        return await self._run_in_slot(fn, *args)
+
+    async def _run_in_slot(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run `fn(*args)` on the extraction pool in an acquired slot, which
+        is released when the work finishes.
+        """
+        loop = asyncio.get_running_loop()
+        self.in_flight += 1
+        started = loop.time()
+
+        def release(_future) -> None:
+            elapsed = loop.time() - started
+            self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * elapsed
+            self.in_flight -= 1
+            self.completed += 1
+            self._slots.release()
+
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BaseException:
+            release(None)
+            raise
+        future.add_done_callback(
+            lambda f: loop.call_soon_threadsafe(release, f)
+        )
+        return await asyncio.wrap_future(future)
+
+    def snapshot(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "background_waiting": self.background_waiting,
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self) -> None:
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
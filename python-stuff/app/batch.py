@@ -0,0 +1,209 @@
+"""
+Multi-document extraction for /extract/batch.
+
+A batch is several PDF uploads, or PDFs inside one zip archive. Every
+input is spooled to its own file, then all of their pages go through one
+shared queue (`extractor.iter_extracted_documents`), so short documents
+come back first. Results are streamed as records, one per document as it
+finishes:
+
+  {"type": "start", "documents": [{"index", "filename"}, ...]}
+  {"type": "result", "index", ...ExtractionResult}    per finished input
+  {"type": "error", "index", "filename", "status_code", "detail"}
+                                                      per failed input
+  {"type": "summary", "documents", "succeeded", "failed"}
+
+A failed input only costs its own record; the others are unaffected.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import zipfile
+from pathlib import PurePosixPath
+from typing import AsyncIterator, BinaryIO, Callable, Iterator, List, Optional
+
+from .admission import ExtractionGate
+from .cache import cached_result, page_cache, store_result
+from .documents import SpooledUpload
+from .extractor import ExtractionResult, iter_extracted_documents
+from .streaming import NDJSON_MEDIA_TYPE, stream_records
+
+logger = logging.getLogger(__name__)
+
+# Limits on what one batch may unpack to.
+BATCH_MAX_DOCUMENTS = int(os.getenv("BATCH_MAX_DOCUMENTS", "100"))
+BATCH_MAX_BYTES = int(os.getenv("BATCH_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+
+class InvalidBatch(Exception):
+    """
+    Raised when a batch as a whole can't be accepted. Carries the HTTP
+    status to answer with.
+    """
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class BatchInput:
+    """
+    One document of a batch: its spooled PDF, or why it was rejected
+    before extraction.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        upload: Optional[SpooledUpload] = None,
+        error: Optional[str] = None,
+    ):
+        self.filename = filename
+        self.upload = upload
+        self.error = error
+
+    def discard(self) -> None:
+        if self.upload is not None:
+            self.upload.discard()
+
+
+def discard_inputs(inputs: List[BatchInput]) -> None:
+    for item in inputs:
+        item.discard()
+
+
+def _is_pdf_member(info: zipfile.ZipInfo) -> bool:
+    path = PurePosixPath(info.filename)
+    return (
+        not info.is_dir()
+        and path.suffix.lower() == ".pdf"
+        # resource forks macOS adds to archives
+        and "__MACOSX" not in path.parts
+        and not path.name.startswith("._")
+    )
+
+
+def expand_zip(
+    archive: SpooledUpload,
+    spool: Callable[[BinaryIO], SpooledUpload],
+    budget_bytes: int = BATCH_MAX_BYTES,
+) -> List[BatchInput]:
+    """
+    Spool every PDF in a zip archive (by its path inside the archive).
+    Blocking. Refuses archives that aren't zips or would unpack to more
+    than `budget_bytes`.
+    """
+    try:
+        zf = zipfile.ZipFile(archive.path)
+    except zipfile.BadZipFile as e:
+        raise InvalidBatch(f"Not a valid zip archive: {e}")
+
+    inputs: List[BatchInput] = []
+    with zf:
+        members = [info for info in zf.infolist() if _is_pdf_member(info)]
+        if not members:
+            raise InvalidBatch("The zip archive contains no PDF files")
+        if sum(info.file_size for info in members) > budget_bytes:
+            raise InvalidBatch(
+                f"The zip archive unpacks to more than {budget_bytes} bytes",
+                status_code=413,
+            )
+        try:
+            for info in members:
+                try:
+                    with zf.open(info) as member:
+                        inputs.append(BatchInput(info.filename, spool(member)))
+                except (zipfile.BadZipFile, NotImplementedError, RuntimeError) as e:
+                    # damaged, encrypted or unsupported member
+                    inputs.append(BatchInput(info.filename, error=f"Unreadable: {e}"))
+        except BaseException:
+            discard_inputs(inputs)
+            raise
+    return inputs
+
+
+def _error_record(index: int, filename: str, status_code: int, detail: str) -> dict:
+    return {
+        "type": "error",
+        "index": index,
+        "filename": filename,
+        "status_code": status_code,
+        "detail": detail,
+    }
+
+
+def _result_record(index: int, result: ExtractionResult) -> dict:
+    return {"type": "result", "index": index, **result.model_dump()}
+
+
+def iter_batch_records(inputs: List[BatchInput]) -> Iterator[dict]:
+    """
+    The records of a batch extraction (see the module docstring).
+    Rejected inputs and documents already in the result cache are
+    answered right away; the rest share one page queue and are reported
+    as they finish, so the results arrive in completion order. Use
+    their "index".
+    """
+    yield {
+        "type": "start",
+        "documents": [
+            {"index": i, "filename": item.filename} for i, item in enumerate(inputs)
+        ],
+    }
+
+    succeeded = failed = 0
+    to_extract: List[int] = []
+    for index, item in enumerate(inputs):
+        if item.error is not None:
+            failed += 1
+            yield _error_record(index, item.filename, 400, item.error)
+            continue
+        cached = cached_result(item.upload.sha256, item.filename)
+        if cached is not None:
+            succeeded += 1
+            yield _result_record(index, cached)
+            continue
+        to_extract.append(index)
+
+    documents = [
+        (str(inputs[i].upload.path), inputs[i].filename) for i in to_extract
+    ]
+    for position, outcome in iter_extracted_documents(documents, page_cache=page_cache):
+        index = to_extract[position]
+        item = inputs[index]
+        if isinstance(outcome, Exception):
+            failed += 1
+            yield _error_record(
+                index, item.filename, 500, f"Extraction failed: {str(outcome)}",
+            )
+            continue
+        store_result(item.upload.sha256, outcome)
+        succeeded += 1
+        yield _result_record(index, outcome)
+
+    yield {
+        "type": "summary",
+        "documents": len(inputs),
+        "succeeded": succeeded,
+        "failed": failed,
+    }
+
+
+def stream_batch(
+    gate: ExtractionGate,
+    inputs: List[BatchInput],
+    media_type: str = NDJSON_MEDIA_TYPE,
+) -> AsyncIterator[bytes]:
+    """
+    The encoded records of `iter_batch_records`, produced on `gate`'s
+    pool as one extraction. The spool files are removed once the worker
+    is done with them.
+    """
+    return stream_records(
+        gate,
+        lambda: iter_batch_records(inputs),
+        media_type,
+        description=f"batch of {len(inputs)} documents",
+        on_done=lambda: discard_inputs(inputs),
+    )
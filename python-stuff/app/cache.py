@@ -0,0 +1,323 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from . import metrics
+from .extractor import (
+    PIPELINE_VERSION,
+    ExtractedPage,
+    ExtractionResult,
+    ProgressCallback,
+    extract_from_pdf_path,
+    spooled_pdf,
+)
+from .fullExtractionClass import PageRegions, get_template_bank
+from .text_layer import PageText
+
+logger = logging.getLogger(__name__)
+
+# In-memory LRU size (entries) and on-disk store location / size budget.
+RESULT_CACHE_MEMORY_ITEMS = int(os.getenv("RESULT_CACHE_MEMORY_ITEMS", "32"))
+RESULT_CACHE_DIR = Path(os.getenv("RESULT_CACHE_DIR", "/tmp/extract_cache"))
+RESULT_CACHE_DISK_BYTES = int(
+    os.getenv("RESULT_CACHE_DISK_BYTES", str(512 * 1024 * 1024))
+)
+
+# Per-page cache: same two-level layout, separate directory / budget.
+PAGE_CACHE_MEMORY_ITEMS = int(os.getenv("PAGE_CACHE_MEMORY_ITEMS", "512"))
+PAGE_CACHE_DIR = Path(os.getenv("PAGE_CACHE_DIR", "/tmp/extract_page_cache"))
+PAGE_CACHE_DISK_BYTES = int(
+    os.getenv("PAGE_CACHE_DISK_BYTES", str(256 * 1024 * 1024))
+)
+
+_HASH_CHUNK = 1024 * 1024
+
+
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def sha256_file(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(_HASH_CHUNK), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def result_cache_key(pdf_sha256: str, template_hash: str) -> str:
+    """
+    A result is only reusable for the same PDF, the same template set and
+    the same pipeline version.
+    """
+    raw = f"{pdf_sha256}:{template_hash}:{PIPELINE_VERSION}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Two-level cache of serialized ExtractionResults: a small in-memory LRU
+    in front of a size-bounded directory of JSON files. The disk store
+    evicts least recently used files (by mtime, refreshed on every hit)
+    once it grows past `disk_bytes`.
+    """
+
+    def __init__(
+        self,
+        directory: Path = RESULT_CACHE_DIR,
+        memory_items: int = RESULT_CACHE_MEMORY_ITEMS,
+        disk_bytes: int = RESULT_CACHE_DISK_BYTES,
+    ):
+        self.directory = Path(directory)
+        self.memory_items = memory_items
+        self.disk_bytes = disk_bytes
+
+        self._memory: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def _remember(self, key: str, payload: str) -> None:
+        # caller holds the lock
+        self._memory[key] = payload
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            payload = self._memory.get(key)
+            if payload is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return payload
+
+        path = self._path(key)
+        try:
+            payload = path.read_text(encoding="utf-8")
+            os.utime(path)  # keep it young for LRU eviction
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.disk_hits += 1
+            self._remember(key, payload)
+        return payload
+
+    def put(self, key: str, payload: str) -> None:
+        with self._lock:
+            self._remember(key, payload)
+            self.stores += 1
+
+        # atomic write, so readers never see half a file
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                fh.write(payload)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except FileNotFoundError:
+                pass
+            raise
+        self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        entries = []
+        total = 0
+        for p in self.directory.glob("*.json"):
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+            total += st.st_size
+
+        if total <= self.disk_bytes:
+            return
+
+        entries.sort()  # oldest first
+        for _, size, p in entries:
+            if total <= self.disk_bytes:
+                break
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                continue
+            total -= size
+            with self._lock:
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "memory_items": len(self._memory),
+            }
+
+
+class PageCache:
+    """
+    Per-page results keyed by the rendered page itself, so a revised PDF
+    only pays matching + OCR for the pages that actually changed.
+
+    Hashing the raster (rather than the page's content stream) also
+    catches changes in shared resources such as fonts or form XObjects.
+    """
+
+    def __init__(self, store: ResultCache):
+        self.store = store
+
+    def key(
+        self,
+        page_img: np.ndarray | PageRegions,
+        template_hash: str,
+        page_text: PageText | None = None,
+    ) -> str:
+        hasher = hashlib.blake2b(digest_size=32)
+        if isinstance(page_img, PageRegions):
+            hasher.update(f"regions:{page_img.shape}".encode("ascii"))
+            for name, (img, x0, y0, scale) in sorted(page_img.regions.items()):
+                hasher.update(
+                    f":{name}:{x0}:{y0}:{scale}:{img.shape}:{img.dtype}".encode("utf-8")
+                )
+                hasher.update(np.ascontiguousarray(img).data)
+        else:
+            hasher.update(f"{page_img.shape}:{page_img.dtype}".encode("ascii"))
+            hasher.update(np.ascontiguousarray(page_img).data)
+        if page_text is not None:
+            # text cells come from here, not from the raster
+            hasher.update(f":text:{page_text.fingerprint()}".encode("ascii"))
+        hasher.update(f":{template_hash}:{PIPELINE_VERSION}".encode("utf-8"))
+        return hasher.hexdigest()
+
+    def get(self, key: str, page_number: int) -> Optional[ExtractedPage]:
+        payload = self.store.get(key)
+        if payload is None:
+            return None
+        page = ExtractedPage.model_validate_json(payload)
+        # identical sheets can sit at different positions in the document
+        page.page_number = page_number
+        return page
+
+    def put(self, key: str, page: ExtractedPage) -> None:
+        self.store.put(key, page.model_dump_json())
+
+    def stats(self) -> dict:
+        return self.store.stats()
+
+
+result_cache = ResultCache()
+page_cache = PageCache(
+    ResultCache(PAGE_CACHE_DIR, PAGE_CACHE_MEMORY_ITEMS, PAGE_CACHE_DISK_BYTES)
+)
+
+
+def _from_cache(key: str, filename: str) -> Optional[ExtractionResult]:
+    payload = result_cache.get(key)
+    if payload is None:
+        return None
+    result = ExtractionResult.model_validate_json(payload)
+    # the same bytes may have been uploaded under a different name
+    result.filename = filename
+    result.cached = True
+    result.recomputed_pages = []
+    return result
+
+
+def cached_result(pdf_sha256: str, filename: str) -> Optional[ExtractionResult]:
+    """
+    The cached ExtractionResult for a PDF under the current template set,
+    if there is one.
+    """
+    key = result_cache_key(pdf_sha256, get_template_bank().digest)
+    result = _from_cache(key, filename)
+    if result is not None:
+        logger.info("Result cache hit for %s (%s)", filename, pdf_sha256[:12])
+        metrics.PAGES.inc(len(result.pages), source="result_cache")
+    return result
+
+
+def store_result(pdf_sha256: str, result: ExtractionResult) -> None:
+    """
+    Keep a finished extraction for the next upload of the same PDF.
+    """
+    # keyed by the templates it was made with: the document may have
+    # been pinned to a newer template set meanwhile
+    key = result_cache_key(pdf_sha256, result.template_hash)
+    result_cache.put(key, result.model_dump_json())
+
+
+def _extract_and_store(
+    pdf_path: str,
+    filename: str,
+    pdf_sha256: str,
+    progress: Optional[ProgressCallback] = None,
+) -> ExtractionResult:
+    result = extract_from_pdf_path(
+        pdf_path, filename, progress=progress, page_cache=page_cache,
+    )
+    store_result(pdf_sha256, result)
+    return result
+
+
+def cached_extract_from_pdf_path(
+    pdf_path: str,
+    filename: str,
+    pdf_sha256: Optional[str] = None,
+    progress: Optional[ProgressCallback] = None,
+) -> ExtractionResult:
+    """
+    `extract_from_pdf_path` behind the shared result cache.
+    """
+    if pdf_sha256 is None:
+        pdf_sha256 = sha256_file(pdf_path)
+
+    result = cached_result(pdf_sha256, filename)
+    if result is not None:
+        if progress is not None:
+            progress(result.total_pages, result.total_pages)
+        return result
+
+    return _extract_and_store(pdf_path, filename, pdf_sha256, progress)
+
+
+def cached_extract_from_pdf_bytes(
+    pdf_bytes: bytes,
+    filename: str,
+) -> ExtractionResult:
+    """
+    `extract_from_pdf_bytes` behind the shared result cache.
+    """
+    pdf_sha256 = sha256_bytes(pdf_bytes)
+
+    result = cached_result(pdf_sha256, filename)
+    if result is not None:
+        return result
+
+    with spooled_pdf(pdf_bytes) as pdf_path:
+        return _extract_and_store(pdf_path, filename, pdf_sha256)
@@ -0,0 +1,107 @@
+"""
+Shared fixtures for the HTTP tests: the FastAPI app with poppler and
+tesseract stubbed out, and its caches, document store, job store and
+debug bundles in a temporary directory.
+
+The fake renderer reads the "PDF" it is given: `fake_pdf(11, 12)` makes
+a file whose pages are the synthetic schedule pages of those seeds (see
+benchmarks/synthetic.py), and `BROKEN_PDF` one that poppler can't open.
+The page classifier runs for real; OCR "reads" every cell as a digest
+of its pixels.
+"""
+import functools
+import hashlib
+
+import cv2
+import pytest
+from fastapi.testclient import TestClient
+from pdf2image.exceptions import PDFPageCountError
+from PIL import Image
+
+from benchmarks.synthetic import make_page
+
+from . import (
+    batch,
+    cache,
+    extractor,
+    fullExtractionClass,
+    main,
+    streaming,
+    text_layer,
+)
+from .admission import ExtractionGate
+from .debug_bundle import DebugBundleStore
+from .documents import DocumentStore
+from .jobs import JobStore
+
+_FAKE_PDF_PREFIX = b"%PDF-1.4 fake pages="
+BROKEN_PDF = b"%PDF-1.4 broken"
+
+
+def fake_pdf(*seeds: int) -> bytes:
+    return _FAKE_PDF_PREFIX + ",".join(str(s) for s in seeds).encode("ascii") + b"\n"
+
+
+@functools.lru_cache(maxsize=None)
+def _page(seed: int) -> Image.Image:
+    page, _ = make_page(seed)
+    return Image.fromarray(cv2.cvtColor(page, cv2.COLOR_BGR2RGB))
+
+
+class _FakeRenderer:
+    def __init__(self):
+        self.documents = 0
+
+    @staticmethod
+    def _seeds(pdf_path) -> list[int]:
+        with open(pdf_path, "rb") as fh:
+            data = fh.read()
+        if not data.startswith(_FAKE_PDF_PREFIX):
+            raise PDFPageCountError("Unable to get page count.")
+        # anything after the first line is padding
+        seeds = data[len(_FAKE_PDF_PREFIX):].split(b"\n", 1)[0]
+        return [int(s) for s in seeds.split(b",")]
+
+    def pdfinfo_from_path(self, pdf_path):
+        self.documents += 1
+        return {"Pages": len(self._seeds(pdf_path))}
+
+    def convert_from_path(self, pdf_path, dpi, first_page, last_page):
+        seeds = self._seeds(pdf_path)[first_page - 1 : last_page]
+        return [_page(seed).copy() for seed in seeds]
+
+
+def _fake_ocr_cells(cells):
+    return {
+        key: hashlib.md5(bw.tobytes()).hexdigest()[:12] for key, bw in cells.items()
+    }
+
+
+@pytest.fixture
+def renderer(tmp_path, monkeypatch) -> _FakeRenderer:
+    renderer = _FakeRenderer()
+    monkeypatch.setattr(extractor, "pdfinfo_from_path", renderer.pdfinfo_from_path)
+    monkeypatch.setattr(extractor, "convert_from_path", renderer.convert_from_path)
+    monkeypatch.setattr(extractor, "EXTRACT_WORKERS", 0)
+    monkeypatch.setattr(text_layer, "TEXT_LAYER", False)
+    monkeypatch.setattr(fullExtractionClass, "ocr_cells", _fake_ocr_cells)
+
+    results = cache.ResultCache(tmp_path / "results")
+    pages = cache.PageCache(cache.ResultCache(tmp_path / "pages"))
+    for module in (cache, main):
+        monkeypatch.setattr(module, "result_cache", results)
+    for module in (cache, batch, streaming, main):
+        monkeypatch.setattr(module, "page_cache", pages)
+    return renderer
+
+
+@pytest.fixture
+def client(renderer, tmp_path, monkeypatch):
+    gate = ExtractionGate()
+    monkeypatch.setattr(main, "extraction_gate", gate)
+    monkeypatch.setattr(main, "document_store", DocumentStore(tmp_path / "documents"))
+    monkeypatch.setattr(main, "debug_store", DebugBundleStore(tmp_path / "debug"))
+    monkeypatch.setattr(main, "UPLOAD_DIR", tmp_path / "uploads")
+    monkeypatch.setattr(main, "job_store", JobStore(tmp_path / "uploads", gate=gate))
+    with TestClient(main.app) as client:
+        yield client
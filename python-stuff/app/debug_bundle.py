@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Where per-request bundles go when written to disk (?debug=dir), how
+# long they are kept, and how often the janitor looks for expired ones.
+DEBUG_DIR = Path(os.getenv("DEBUG_DIR", "/tmp/extract_debug"))
+DEBUG_TTL_SECONDS = float(os.getenv("DEBUG_TTL_SECONDS", str(24 * 3600)))
+DEBUG_CLEANUP_INTERVAL = float(os.getenv("DEBUG_CLEANUP_INTERVAL", "600"))
+# zip bundles (?debug=zip) are built in memory up to this size, and in a
+# temporary file beyond it
+DEBUG_SPOOL_BYTES = int(os.getenv("DEBUG_SPOOL_BYTES", str(16 * 1024 * 1024)))
+
+_ZIP_CHUNK = 64 * 1024
+
+_UNSAFE_CHARS = re.compile(r"[^\w.-]+")
+
+
+def heatmap(res: np.ndarray) -> np.ndarray:
+    """
+    Colour-mapped TM_CCOEFF_NORMED response: scores <= 0 are dark blue,
+    a perfect match is dark red.
+    """
+    scaled = (np.clip(res, 0.0, 1.0) * 255.0).astype(np.uint8)
+    return cv2.applyColorMap(scaled, cv2.COLORMAP_JET)
+
+
+class _ZipSpool:
+    """
+    The zip archive of an in-memory bundle, written as artifacts arrive
+    so only the compressed archive is kept, and spilled to a temporary
+    file once it outgrows DEBUG_SPOOL_BYTES.
+    """
+
+    def __init__(self):
+        self.file = tempfile.SpooledTemporaryFile(max_size=DEBUG_SPOOL_BYTES)
+        self.zip = zipfile.ZipFile(self.file, "w", zipfile.ZIP_DEFLATED)
+        self.lock = threading.Lock()
+
+
+class DebugBundle:
+    """
+    Debug artifacts (crops, binarised strips, match heatmaps, per-page
+    row results) of one extraction request.
+
+    With a `directory` every artifact is written there as soon as it is
+    added; without one they go into a zip archive for `iter_zip`. Nothing
+    in the pipeline touches a bundle unless a request asked for one.
+
+    `page(n)` returns a view that files everything under `page_NNN/`.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[Path] = None,
+        prefix: str = "",
+        _spool: Optional[_ZipSpool] = None,
+    ):
+        self.directory = Path(directory) if directory is not None else None
+        self.prefix = prefix
+        if _spool is None and self.directory is None:
+            _spool = _ZipSpool()
+        self._spool = _spool
+
+    def page(self, page_number: int) -> DebugBundle:
+        return DebugBundle(
+            self.directory,
+            f"{self.prefix}page_{page_number:03d}/",
+            self._spool,
+        )
+
+    # ---------- adding artifacts ----------
+
+    def add_bytes(self, name: str, data: bytes) -> None:
+        name = self.prefix + _UNSAFE_CHARS.sub("_", name)
+        if self.directory is not None:
+            path = self.directory / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(data)
+            return
+        # PNGs are compressed already
+        compress = (
+            zipfile.ZIP_STORED if name.endswith(".png") else zipfile.ZIP_DEFLATED
+        )
+        with self._spool.lock:
+            self._spool.zip.writestr(name, data, compress_type=compress)
+
+    def add_image(self, name: str, img: np.ndarray) -> None:
+        ok, buf = cv2.imencode(".png", img)
+        if not ok:
+            raise RuntimeError(f"Could not encode debug image {name!r}")
+        self.add_bytes(f"{name}.png", buf.tobytes())
+
+    def add_heatmap(self, name: str, res: np.ndarray) -> None:
+        self.add_image(name, heatmap(res))
+
+    def add_json(self, name: str, obj: Any) -> None:
+        data = json.dumps(obj, indent=2, ensure_ascii=False, default=float)
+        self.add_bytes(f"{name}.json", data.encode("utf-8"))
+
+    # ---------- output ----------
+
+    def iter_zip(self) -> Iterator[bytes]:
+        """
+        Finish the archive of an in-memory bundle and yield it in chunks;
+        the bundle is closed afterwards. Blocking reads once it has been
+        spilled to disk: iterate it off the event loop.
+        """
+        spool = self._spool
+        try:
+            with spool.lock:
+                spool.zip.close()
+            spool.file.seek(0)
+            while chunk := spool.file.read(_ZIP_CHUNK):
+                yield chunk
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """
+        Drop the archive of an in-memory bundle (no-op for directories).
+        """
+        if self._spool is not None:
+            with self._spool.lock:
+                self._spool.zip.close()
+                self._spool.file.close()
+
+
+class DebugBundleStore:
+    """
+    The per-request bundle directories under DEBUG_DIR, each named by a
+    random bundle id. Bundles older than the TTL are removed by the same
+    kind of janitor as the DocumentStore's, run when bundles are created.
+    """
+
+    def __init__(
+        self,
+        directory: Path = DEBUG_DIR,
+        ttl_seconds: float = DEBUG_TTL_SECONDS,
+        cleanup_interval: float = DEBUG_CLEANUP_INTERVAL,
+    ):
+        self.directory = Path(directory)
+        self.ttl_seconds = ttl_seconds
+        self.cleanup_interval = cleanup_interval
+        self._last_cleanup = 0.0
+        self._lock = threading.Lock()
+
+    def create(self) -> tuple[str, DebugBundle]:
+        """
+        A new bundle writing to its own directory, and its id. Blocking
+        (it may clean up first): run it off the event loop.
+        """
+        self._maybe_cleanup()
+        bundle_id = uuid.uuid4().hex
+        return bundle_id, DebugBundle(self.directory / bundle_id)
+
+    # ---------- TTL cleanup ----------
+
+    def _maybe_cleanup(self) -> None:
+        now = time.time()
+        with self._lock:
+            if now - self._last_cleanup < self.cleanup_interval:
+                return
+            self._last_cleanup = now
+        try:
+            self.cleanup(now)
+        except Exception:
+            logger.exception("Debug bundle cleanup failed")
+
+    def cleanup(self, now: Optional[float] = None) -> int:
+        """
+        Delete bundle directories last written to before the TTL. Returns
+        the number of bundles removed.
+        """
+        cutoff = (now or time.time()) - self.ttl_seconds
+        if not self.directory.is_dir():
+            return 0
+        removed = 0
+        for path in self.directory.iterdir():
+            try:
+                if path.is_dir() and path.stat().st_mtime < cutoff:
+                    shutil.rmtree(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        if removed:
+            logger.info("Removed %d expired debug bundles", removed)
+        return removed
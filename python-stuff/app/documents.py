@@ -0,0 +1,151 @@
+"""
+Uploaded PDFs on disk.
+
+Uploads are copied to a spool file in chunks and hashed on the way, so
+the request handlers never hold a whole PDF in memory; the rasteriser and
+the text layer read it by path. PDFs the client wants to display are
+kept in the DocumentStore, addressed by their SHA-256, and served by
+GET /documents/{id} with ETag and Range support, so pdf.js can fetch the
+pages it needs instead of the whole file.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+logger = logging.getLogger(__name__)
+
+# Kept documents, how long after their last upload they are kept, and how
+# often the janitor looks for expired ones (spool files a crash left
+# behind go with the same TTL).
+DOCUMENT_DIR = Path(os.getenv("DOCUMENT_DIR", "/tmp/documents"))
+DOCUMENT_TTL_SECONDS = float(os.getenv("DOCUMENT_TTL_SECONDS", str(24 * 3600)))
+DOCUMENT_CLEANUP_INTERVAL = float(os.getenv("DOCUMENT_CLEANUP_INTERVAL", "600"))
+
+_SPOOL_CHUNK = 1024 * 1024
+_DOCUMENT_ID = re.compile(r"[0-9a-f]{64}")
+
+
+class SpooledUpload:
+    """
+    An upload copied to its own file: path, SHA-256 and size. `discard`
+    removes the file unless it was handed to the DocumentStore.
+    """
+
+    def __init__(self, path: Path, sha256: str, size: int):
+        self.path = path
+        self.sha256 = sha256
+        self.size = size
+
+    def discard(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+
+def spool_upload(src: BinaryIO, directory: Path) -> SpooledUpload:
+    """
+    Copy an upload stream into a new file under `directory`, one chunk at
+    a time, hashing it as it goes. Blocking: run it off the event loop.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    fd, name = tempfile.mkstemp(suffix=".pdf", prefix="upload_", dir=directory)
+    path = Path(name)
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            for chunk in iter(lambda: src.read(_SPOOL_CHUNK), b""):
+                hasher.update(chunk)
+                fh.write(chunk)
+                size += len(chunk)
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+    return SpooledUpload(path, hasher.hexdigest(), size)
+
+
+class DocumentStore:
+    """
+    Content-addressed PDF store: a document's id is its SHA-256, so the
+    same file uploaded twice is stored once, and its id doubles as a
+    strong ETag. Spool files live in `spool/` on the same filesystem, so
+    keeping one is a rename.
+    """
+
+    def __init__(
+        self,
+        directory: Path = DOCUMENT_DIR,
+        ttl_seconds: float = DOCUMENT_TTL_SECONDS,
+        cleanup_interval: float = DOCUMENT_CLEANUP_INTERVAL,
+    ):
+        self.directory = directory
+        self.spool_dir = directory / "spool"
+        self.ttl_seconds = ttl_seconds
+        self.cleanup_interval = cleanup_interval
+        self._last_cleanup = 0.0
+        self._lock = threading.Lock()
+
+    def spool(self, src: BinaryIO) -> SpooledUpload:
+        return spool_upload(src, self.spool_dir)
+
+    def keep(self, upload: SpooledUpload) -> str:
+        """
+        Move a spooled upload into the store (or refresh the copy that is
+        already there). Returns the document id.
+        """
+        self._maybe_cleanup()
+        dest = self.directory / f"{upload.sha256}.pdf"
+        if dest.exists():
+            os.utime(dest)
+            upload.discard()
+        else:
+            os.replace(upload.path, dest)
+        return upload.sha256
+
+    def path(self, document_id: str) -> Optional[Path]:
+        if not _DOCUMENT_ID.fullmatch(document_id):
+            return None
+        path = self.directory / f"{document_id}.pdf"
+        return path if path.is_file() else None
+
+    @staticmethod
+    def etag(document_id: str) -> str:
+        return f'"{document_id}"'
+
+    # ---------- TTL cleanup ----------
+
+    def _maybe_cleanup(self) -> None:
+        now = time.time()
+        with self._lock:
+            if now - self._last_cleanup < self.cleanup_interval:
+                return
+            self._last_cleanup = now
+        try:
+            self.cleanup(now)
+        except Exception:
+            logger.exception("Document cleanup failed")
+
+    def cleanup(self, now: Optional[float] = None) -> int:
+        """
+        Delete documents (and stray spool files) not uploaded within the
+        TTL. Returns the number of files removed.
+        """
+        cutoff = (now or time.time()) - self.ttl_seconds
+        removed = 0
+        for pattern in ("*.pdf", "spool/*.pdf"):
+            for path in self.directory.glob(pattern):
+                try:
+                    if path.stat().st_mtime < cutoff:
+                        path.unlink()
+                        removed += 1
+                except FileNotFoundError:
+                    pass
+        if removed:
+            logger.info("Removed %d expired documents", removed)
+        return removed
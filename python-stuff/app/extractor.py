@@ -1,17 +1,87 @@
 from __future__ import annotations
 
 import logging
-from typing import Dict, List
+import math
+import multiprocessing
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
 
 import cv2
 import numpy as np
-from pdf2image import convert_from_bytes
+from pdf2image import convert_from_path, pdfinfo_from_path
 from pydantic import BaseModel
 
-from .fullExtractionClass import classify_page_image
+from . import metrics
+from .debug_bundle import DebugBundle
+from .fullExtractionClass import (
+    INK_MIN_FRACTION,
+    MATCH_MODE,
+    NMS_ACROSS_TEMPLATES,
+    PageRegions,
+    TemplateBank,
+    classify_page_image,
+    get_template_bank,
+    raster_regions,
+)
+from .matching import PYRAMID_LEVELS, PYRAMID_SLACK
+from .ocr import (
+    OCR_BACKEND_ENV,
+    OCR_LANG,
+    OCR_THREADS,
+    get_ocr_backend,
+    limit_tesseract_threads,
+    set_ocr_threads,
+)
+from .text_layer import TEXT_LAYER, PageText, iter_page_texts
 
 logger = logging.getLogger(__name__)
 
+# progress(pages_done, pages_total), called after every finished page
+ProgressCallback = Callable[[int, int], None]
+
+# Rasterisation settings. Pages are rendered RASTER_WINDOW at a time, so
+# peak memory depends on the window size, not on the page count.
+RASTER_DPI = 300
+RASTER_WINDOW = max(1, int(os.getenv("RASTER_WINDOW", "1")))
+
+# What gets rasterised:
+#   "page"    – every page in full at RASTER_DPI
+#   "regions" – only what the classifier reads (the symbol column and the
+#               text columns, over the row bands), cropped by poppler: the
+#               symbols at SYMBOL_DPI, the OCR text at TEXT_DPI
+RASTER_MODES = ("page", "regions")
+RASTER_MODE = os.getenv("RASTER_MODE", "page").strip().lower()
+if RASTER_MODE not in RASTER_MODES:
+    raise RuntimeError(f"RASTER_MODE must be one of {RASTER_MODES}, got {RASTER_MODE!r}")
+SYMBOL_DPI = int(os.getenv("SYMBOL_DPI", str(RASTER_DPI)))
+TEXT_DPI = int(os.getenv("TEXT_DPI", str(RASTER_DPI)))
+# extra layout pixels rendered around every region
+REGION_PAD = 8
+
+# Bump whenever a change alters what the pipeline outputs for the same
+# PDF and template set; cached results from other versions are ignored.
+# Output-affecting settings are part of it too.
+PIPELINE_VERSION = (
+    f"4:{MATCH_MODE}:nms{int(NMS_ACROSS_TEMPLATES)}:text{int(TEXT_LAYER)}"
+    f":ink{INK_MIN_FRACTION:g}:ocr-{OCR_BACKEND_ENV}-{OCR_LANG or 'eng'}"
+)
+if MATCH_MODE == "pyramid":
+    PIPELINE_VERSION += f":pyr{PYRAMID_LEVELS}-{PYRAMID_SLACK:g}"
+if RASTER_MODE == "regions":
+    PIPELINE_VERSION += f":regions{SYMBOL_DPI}-{TEXT_DPI}"
+
+# Page-parallel extraction: number of worker processes (0 or 1 = serial).
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", "0"))
+
 
 class ExtractedRow(BaseModel):
     row_index: int
@@ -21,11 +91,16 @@ class ExtractedRow(BaseModel):
     kuvaus: str
     suoja: str
     kaapeli: str
+    # where the text fields came from: "text_layer" (the PDF's own text),
+    # "ocr", "mixed" or "none" (no text cell was read)
+    text_source: str = "ocr"
 
 
 class ExtractedPage(BaseModel):
     page_number: int
     rows: List[ExtractedRow]
+    # symbol strips / OCR cells the ink prefilter found blank
+    skipped_rois: int = 0
 
 
 class ExtractionResult(BaseModel):
@@ -34,19 +109,61 @@ class ExtractionResult(BaseModel):
     total_pages: int
     total_rows: int
     pages: List[ExtractedPage]
+    template_hash: str = ""
+    cached: bool = False
+    # pages that actually went through matching + OCR (the rest came
+    # from the per-page cache)
+    recomputed_pages: List[int] = []
+    # blank ROIs the ink prefilter skipped, summed over all pages
+    skipped_rois: int = 0
+
+
+# Closing record of a streamed extraction: ExtractionResult without the
+# pages, which were already sent one by one.
+class ExtractionSummary(BaseModel):
+    status: str
+    filename: str
+    total_pages: int
+    total_rows: int
+    template_hash: str = ""
+    cached: bool = False
+    recomputed_pages: List[int] = []
+    skipped_rois: int = 0
 
 
-def extract_page(page_img: np.ndarray, page_number: int) -> ExtractedPage:
+def extract_page(
+    page_img: Union[np.ndarray, PageRegions],
+    page_number: int,
+    bank: Optional[TemplateBank] = None,
+    debug: Optional[DebugBundle] = None,
+    page_text: Optional[PageText] = None,
+) -> ExtractedPage:
     """
     Run symbol + text extraction on a single page image.
 
-    :param page_img: OpenCV BGR image of the page
+    :param page_img: OpenCV BGR image of the page, or its `PageRegions`
     :param page_number: 1-based page index in the PDF
+    :param bank: template bank to match against (defaults to the shared one)
+    :param debug: optional debug bundle; this page's artifacts go under
+        `page_NNN/` in it
+    :param page_text: the page's PDF text layer, if it has a usable one;
+        text cells are then read from it instead of OCR'd
     """
-    row_results = classify_page_image(page_img)
+    page_debug = debug.page(page_number) if debug is not None else None
+    t0 = time.perf_counter()
+    row_results = classify_page_image(page_img, bank, page_debug, page_text)
+    elapsed = time.perf_counter() - t0
+    metrics.STAGE_SECONDS.observe(elapsed, stage="classify")
+    metrics.PAGES.inc(source="computed")
+    logger.debug(
+        "page classified page=%d rows=%d seconds=%.3f",
+        page_number, len(row_results), elapsed,
+    )
 
     rows: List[ExtractedRow] = []
+    skipped_rois = 0
     for r in row_results:
+        skipped_rois += len(r.get("skipped_rois", []))
         # Keep naming flexible: support both "unique_symbols" and "symbols" keys.
         symbols = r.get("unique_symbols") or r.get("symbols") or []
         symbol_scores = r.get("symbol_scores", {})
@@ -60,39 +177,564 @@ def extract_page(page_img: np.ndarray, page_number: int) -> ExtractedPage:
                 kuvaus=r.get("kuvaus", ""),
                 suoja=r.get("suoja", ""),
                 kaapeli=r.get("kaapeli", ""),
+                text_source=r.get("text_source", "ocr"),
             )
         )
 
-    return ExtractedPage(page_number=page_number, rows=rows)
+    return ExtractedPage(
+        page_number=page_number, rows=rows, skipped_rois=skipped_rois,
+    )
 
 
-def extract_from_pdf_bytes(pdf_bytes: bytes, filename: str) -> ExtractionResult:
+@contextmanager
+def spooled_pdf(pdf_bytes: bytes) -> Iterator[str]:
     """
-    Top-level entry used by FastAPI.
+    Write PDF bytes to a temporary file once, so poppler can render
+    individual pages from it without us re-sending the whole document.
+    """
+    fd, path = tempfile.mkstemp(suffix=".pdf", prefix="extract_")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(pdf_bytes)
+        yield path
+    finally:
+        os.unlink(path)
 
-    Takes raw PDF bytes and returns structured extraction result with:
-      - per-page list of rows
-      - per-row list of detected symbols (+ scores)
-      - Kuvausteksti / Suoja / Kaapeli text for each row
+
+def count_pdf_pages(pdf_path: str) -> int:
+    return int(pdfinfo_from_path(pdf_path)["Pages"])
+
+
+def iter_pdf_pages(
+    pdf_path: str,
+    dpi: int = RASTER_DPI,
+    window: int = RASTER_WINDOW,
+    total: Optional[int] = None,
+) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Lazily rasterise a PDF, yielding `(page_number, BGR image)` pairs.
+
+    Only `window` pages are rendered at a time, and the generator drops
+    its own references before yielding the next page, so a page is freed
+    as soon as the caller is done with it. `total` skips the page count
+    lookup when the caller already knows it.
+    """
+    if total is None:
+        total = count_pdf_pages(pdf_path)
+
+    for first in range(1, total + 1, window):
+        last = min(first + window - 1, total)
+        t0 = time.perf_counter()
+        pil_pages = convert_from_path(
+            pdf_path, dpi=dpi, first_page=first, last_page=last,
+        )
+        per_page = (time.perf_counter() - t0) / max(1, len(pil_pages))
+        for _ in range(len(pil_pages)):
+            metrics.STAGE_SECONDS.observe(per_page, stage="rasterize")
+
+        page_number = first
+        while pil_pages:
+            pil_img = pil_pages.pop(0)
+            # pdf2image gives RGB PIL images → convert to OpenCV BGR
+            with metrics.stage("color_convert"):
+                page_bgr = cv2.cvtColor(np.asarray(pil_img), cv2.COLOR_RGB2BGR)
+            del pil_img
+            yield page_number, page_bgr
+            del page_bgr
+            page_number += 1
+
+
+# "Page    3 size: 595.276 x 841.89 pts (A4)" / "Page    3 rot:  90"
+_PDFINFO_PAGE_KEY = re.compile(r"Page\s+(\d+) (size|rot)")
+
+
+def pdf_page_sizes(pdf_path: str, total: int) -> List[Tuple[float, float]]:
+    """
+    (width, height) in points of every page, as rendered (rotation applied).
+    """
+    info = pdfinfo_from_path(pdf_path, first_page=1, last_page=total)
+    sizes: Dict[int, Tuple[float, float]] = {}
+    rotations: Dict[int, int] = {}
+    for key, value in info.items():
+        m = _PDFINFO_PAGE_KEY.fullmatch(key)
+        if m is None:
+            continue
+        page_number = int(m.group(1))
+        if m.group(2) == "size":
+            w, _, h = value.split()[:3]
+            sizes[page_number] = (float(w), float(h))
+        else:
+            rotations[page_number] = int(value) % 360
+
+    result = []
+    for page_number in range(1, total + 1):
+        if page_number not in sizes:
+            raise RuntimeError(f"pdfinfo reported no size for page {page_number}")
+        w, h = sizes[page_number]
+        if rotations.get(page_number, 0) in (90, 270):
+            w, h = h, w
+        result.append((w, h))
+    return result
+
+
+def render_region(
+    pdf_path: str,
+    page_number: int,
+    dpi: int,
+    x: int, y: int, w: int, h: int,
+) -> np.ndarray:
+    """
+    Rasterise only the (x, y, w, h) pixel box of one page at `dpi`, as a
+    grayscale image (poppler's crop-box rendering).
+    """
+    cmd = [
+        "pdftoppm", "-gray",
+        "-f", str(page_number), "-l", str(page_number),
+        "-r", str(dpi),
+        "-x", str(x), "-y", str(y), "-W", str(w), "-H", str(h),
+        pdf_path,
+    ]
+    try:
+        proc = subprocess.run(cmd, capture_output=True)
+    except OSError as e:
+        raise RuntimeError("pdftoppm not found. Is poppler installed and in PATH?") from e
+    if proc.returncode != 0:
+        raise RuntimeError(
+            f"pdftoppm failed on page {page_number}: "
+            f"{proc.stderr.decode('utf-8', 'ignore').strip()}"
+        )
+    img = cv2.imdecode(np.frombuffer(proc.stdout, np.uint8), cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        raise RuntimeError(f"pdftoppm returned no image for page {page_number}")
+    return img
+
+
+def iter_pdf_regions(
+    pdf_path: str,
+    total: Optional[int] = None,
+    symbol_dpi: int = SYMBOL_DPI,
+    text_dpi: int = TEXT_DPI,
+) -> Iterator[Tuple[int, PageRegions]]:
+    """
+    Like `iter_pdf_pages`, but rasterises only the regions the classifier
+    reads (see RASTER_MODE), yielding `(page_number, PageRegions)`.
+
+    Coordinates stay in layout pixels, i.e. those of the page rendered in
+    full at RASTER_DPI, so row bands and columns come out the same as in
+    "page" mode.
+    """
+    if total is None:
+        total = count_pdf_pages(pdf_path)
+    dpis = {"symbol": symbol_dpi, "text": text_dpi}
+    regions = raster_regions()
+
+    for page_number, (w_pt, h_pt) in enumerate(
+        pdf_page_sizes(pdf_path, total), start=1,
+    ):
+        # the layout size pdftoppm would render the full page at
+        width = math.ceil(w_pt * RASTER_DPI / 72.0)
+        height = math.ceil(h_pt * RASTER_DPI / 72.0)
+
+        t0 = time.perf_counter()
+        rendered = {}
+        for name, (fx1, fy1, fx2, fy2) in regions.items():
+            dpi = dpis.get(name, RASTER_DPI)
+            scale = dpi / RASTER_DPI
+            x1 = max(0, int(fx1 * width) - REGION_PAD)
+            y1 = max(0, int(fy1 * height) - REGION_PAD)
+            x2 = min(width, math.ceil(fx2 * width) + REGION_PAD)
+            y2 = min(height, math.ceil(fy2 * height) + REGION_PAD)
+
+            # crop box in the region's own pixels
+            bx, by = int(x1 * scale), int(y1 * scale)
+            bw, bh = math.ceil(x2 * scale) - bx, math.ceil(y2 * scale) - by
+            img = render_region(pdf_path, page_number, dpi, bx, by, bw, bh)
+            rendered[name] = (img, bx / scale, by / scale, scale)
+        metrics.STAGE_SECONDS.observe(time.perf_counter() - t0, stage="rasterize")
+
+        yield page_number, PageRegions((height, width), rendered)
+        del rendered
+
+
+def iter_rendered_pages(
+    pdf_path: str,
+    total: Optional[int] = None,
+) -> Iterator[Tuple[int, Union[np.ndarray, PageRegions], Optional[PageText]]]:
+    """
+    The pages of a PDF as RASTER_MODE renders them, each with its text
+    layer (None when it has no usable one, or TEXT_LAYER is off).
     """
+    if total is None:
+        total = count_pdf_pages(pdf_path)
+    if RASTER_MODE == "regions":
+        rendered = iter_pdf_regions(pdf_path, total=total)
+    else:
+        rendered = iter_pdf_pages(pdf_path, total=total)
+
+    texts = iter_page_texts(pdf_path, total)
     try:
-        images = convert_from_bytes(pdf_bytes, dpi=300)
+        for (page_number, page_img), page_text in zip(rendered, texts):
+            yield page_number, page_img, page_text
+            del page_img
+    finally:
+        rendered.close()
+        texts.close()
+
+
+# ---------- page-parallel extraction ----------
+
+_page_pool: Optional[ProcessPoolExecutor] = None
+_page_pool_workers = 0
+_page_pool_lock = threading.Lock()
+
+
+def _init_page_worker(workers: int) -> None:
+    """
+    Runs once in every worker process: build this process' own template
+    bank and OCR engine up front, keep OpenCV single-threaded since the
+    parallelism comes from the processes, and take this worker's share
+    of the OCR thread budget.
+    """
+    cv2.setNumThreads(1)
+    set_ocr_threads(OCR_THREADS // workers)
+    limit_tesseract_threads()
+    get_template_bank()
+    get_ocr_backend()
+
+
+def get_page_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Process-wide pool of page workers, kept alive across requests so the
+    per-worker template bank and OCR engine are only built once.
+
+    The pool is sized by the first caller and then shared as it is:
+    other requests may have pages on it, so it is never shut down to
+    resize it (only `shutdown_page_pool` does that).
+    """
+    global _page_pool, _page_pool_workers
+
+    with _page_pool_lock:
+        if _page_pool is None:
+            _page_pool = ProcessPoolExecutor(
+                max_workers=workers,
+                # spawn: the API process has threads, don't fork them
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_page_worker,
+                initargs=(workers,),
+            )
+            _page_pool_workers = workers
+        elif workers != _page_pool_workers:
+            logger.debug(
+                "Page pool already has %d workers, not resizing to %d",
+                _page_pool_workers, workers,
+            )
+        return _page_pool
+
+
+def shutdown_page_pool() -> None:
+    global _page_pool, _page_pool_workers
+
+    with _page_pool_lock:
+        if _page_pool is not None:
+            _page_pool.shutdown(wait=True, cancel_futures=True)
+        _page_pool = None
+        _page_pool_workers = 0
+
+
+# serialises the pre-3.13 resource tracker patch in `_attach_shared_memory`
+_attach_lock = threading.Lock()
+
+
+def _attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """
+    Attach to a segment owned by the parent. Before Python 3.13 attaching
+    also registers the segment with the resource tracker, which would then
+    unlink it (and warn) when the worker exits, so skip that registration.
+    There is no `track=False` yet, so `resource_tracker.register` is
+    patched out for the duration, under a lock, as the patch is global.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+
+    with _attach_lock:
+        register = resource_tracker.register
+        resource_tracker.register = lambda *args, **kwargs: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+def _extract_shared_page(
+    shm_name: str,
+    shape: Tuple[int, ...],
+    dtype: str,
+    page_number: int,
+    page_text: Optional[PageText] = None,
+) -> Tuple[ExtractedPage, dict]:
+    """
+    Worker side: classify a page image that lives in shared memory.
+    Returns the page and this worker's metric samples since the last
+    page, for the parent's registry.
+    """
+    shm = _attach_shared_memory(shm_name)
+    try:
+        page_img = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        page = extract_page(page_img, page_number, page_text=page_text)
+        del page_img  # release the buffer before closing the segment
+        return page, metrics.REGISTRY.drain()
+    finally:
+        shm.close()
+
+
+def _extract_worker_page(
+    page_img: PageRegions,
+    page_number: int,
+    page_text: Optional[PageText] = None,
+) -> Tuple[ExtractedPage, dict]:
+    """
+    Worker side: classify a region-rendered page (pickled as it is).
+    """
+    page = extract_page(page_img, page_number, page_text=page_text)
+    return page, metrics.REGISTRY.drain()
+
+
+def _release_shared_memory(shm: Optional[shared_memory.SharedMemory]) -> None:
+    if shm is None:
+        return
+    shm.close()
+    shm.unlink()
+
+
+def _submit_shared_page(
+    pool: ProcessPoolExecutor,
+    page_bgr: np.ndarray,
+    page_number: int,
+    page_text: Optional[PageText] = None,
+):
+    """
+    Copy a page image into a new shared memory segment and submit it.
+    Returns (future, segment); the caller releases the segment.
+    """
+    shm = shared_memory.SharedMemory(create=True, size=page_bgr.nbytes)
+    shared = np.ndarray(page_bgr.shape, dtype=page_bgr.dtype, buffer=shm.buf)
+    shared[:] = page_bgr
+    shape, dtype = page_bgr.shape, page_bgr.dtype.str
+    del shared
+
+    try:
+        fut = pool.submit(
+            _extract_shared_page, shm.name, shape, dtype, page_number, page_text,
+        )
     except Exception:
-        logger.exception("Failed to convert PDF %s to images", filename)
+        _release_shared_memory(shm)
         raise
+    return fut, shm
+
+
+def _submit_page(
+    pool: ProcessPoolExecutor,
+    page_img: Union[np.ndarray, PageRegions],
+    page_number: int,
+    page_text: Optional[PageText] = None,
+):
+    """
+    Submit a rendered page to the worker pool: full pages through shared
+    memory, region-rendered pages (a few small strips) pickled as they
+    are. Returns (future, segment or None); the caller releases the
+    segment.
+    """
+    if isinstance(page_img, PageRegions):
+        fut = pool.submit(_extract_worker_page, page_img, page_number, page_text)
+        return fut, None
+    return _submit_shared_page(pool, page_img, page_number, page_text)
 
+
+def _cached_page(
+    page_cache,
+    page_bgr: Union[np.ndarray, PageRegions],
+    page_number: int,
+    template_hash: str,
+    page_text: Optional[PageText] = None,
+) -> Tuple[Optional[str], Optional[ExtractedPage]]:
+    """
+    Look a rendered page (and its text layer) up in `page_cache` (see
+    `cache.PageCache`). Returns (key, page); the key is None when there
+    is no cache.
+    """
+    if page_cache is None:
+        return None, None
+    key = page_cache.key(page_bgr, template_hash, page_text)
+    page = page_cache.get(key, page_number)
+    if page is not None:
+        metrics.PAGES.inc(source="page_cache")
+    return key, page
+
+
+def _iter_pages_parallel(
+    pdf_path: str,
+    workers: int,
+    total: int,
+    template_hash: str,
+    recomputed: List[int],
+    page_cache=None,
+) -> Iterator[ExtractedPage]:
+    """
+    Render pages in this process and fan them out to the worker pool.
+
+    Each rendered page is copied once into a shared memory segment and
+    only its name is pickled; region-rendered pages (a few small strips)
+    are pickled as they are. At most `2 * workers` pages are in flight,
+    so memory stays bounded like in the serial path. Pages are yielded in
+    completion order; numbers of pages not served by `page_cache` are
+    appended to `recomputed`. Closing the generator early cancels the
+    pages still in flight.
+    """
+    pool = get_page_pool(workers)
+    max_in_flight = 2 * workers
+    pending: Dict = {}
+
+    def collect(done) -> Iterator[ExtractedPage]:
+        for fut in done:
+            shm, key = pending.pop(fut)
+            try:
+                page, samples = fut.result()
+            finally:
+                _release_shared_memory(shm)
+            metrics.REGISTRY.merge(samples)
+            recomputed.append(page.page_number)
+            if key is not None:
+                page_cache.put(key, page)
+            yield page
+
+    try:
+        for page_number, page_bgr, page_text in iter_rendered_pages(
+            pdf_path, total=total,
+        ):
+            key, cached = _cached_page(
+                page_cache, page_bgr, page_number, template_hash, page_text,
+            )
+            if cached is not None:
+                del page_bgr
+                yield cached
+                continue
+
+            fut, shm = _submit_page(pool, page_bgr, page_number, page_text)
+            del page_bgr
+            pending[fut] = (shm, key)
+
+            if len(pending) >= max_in_flight:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                yield from collect(done)
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            yield from collect(done)
+    finally:
+        # only reached with entries left if something failed
+        for fut, (shm, _) in pending.items():
+            fut.cancel()
+            _release_shared_memory(shm)
+
+
+def iter_extracted_pages(
+    pdf_path: str,
+    bank: TemplateBank,
+    total: int,
+    workers: Optional[int] = None,
+    page_cache=None,
+    debug: Optional[DebugBundle] = None,
+    recomputed: Optional[List[int]] = None,
+) -> Iterator[ExtractedPage]:
+    """
+    Yield every page of a PDF on disk as soon as it is classified.
+
+    Serially pages come in page order; with `workers` > 1 in completion
+    order, so use `page_number`. Numbers of pages that were actually
+    processed (not served by `page_cache`) are appended to `recomputed`.
+    See `extract_from_pdf_path` for the other parameters.
+    """
+    if workers is None:
+        workers = EXTRACT_WORKERS
+    if debug is not None:
+        workers, page_cache = 0, None
+    if recomputed is None:
+        recomputed = []
+
+    if workers > 1:
+        yield from _iter_pages_parallel(
+            pdf_path, workers, total, bank.digest, recomputed, page_cache,
+        )
+        return
+
+    for idx, page_bgr, page_text in iter_rendered_pages(pdf_path, total=total):
+        key, page = _cached_page(page_cache, page_bgr, idx, bank.digest, page_text)
+        if page is None:
+            page = extract_page(page_bgr, idx, bank, debug, page_text)
+            recomputed.append(idx)
+            if key is not None:
+                page_cache.put(key, page)
+        del page_bgr
+        yield page
+
+
+def extract_from_pdf_path(
+    pdf_path: str,
+    filename: str,
+    workers: Optional[int] = None,
+    progress: Optional[ProgressCallback] = None,
+    page_cache=None,
+    debug: Optional[DebugBundle] = None,
+) -> ExtractionResult:
+    """
+    Rasterise and classify a PDF on disk one page at a time.
+
+    :param workers: worker processes for page-parallel extraction;
+        defaults to EXTRACT_WORKERS, 0 or 1 runs serially in-process
+    :param progress: called with (pages_done, pages_total) after each page
+    :param page_cache: optional `cache.PageCache`; pages whose rendering
+        is already cached skip matching and OCR entirely
+    :param debug: optional debug bundle to collect every page's artifacts
+        in; debug runs are serial and bypass the page cache, so every
+        page is actually processed
+    """
+    # One template set for the whole document, even if TEMPLATE_DIR
+    # is reloaded while we are still working on it. (Workers use their
+    # own bank, which is reloaded the same way.)
+    bank = get_template_bank()
     pages: List[ExtractedPage] = []
+    recomputed: List[int] = []
+
+    try:
+        total = count_pdf_pages(pdf_path)
+        if progress is not None:
+            progress(0, total)
+
+        for page in iter_extracted_pages(
+            pdf_path, bank, total, workers, page_cache, debug, recomputed,
+        ):
+            pages.append(page)
+            if progress is not None:
+                progress(len(pages), total)
+    except Exception:
+        logger.exception("Failed to extract PDF %s", filename)
+        raise
 
-    for idx, pil_img in enumerate(images, start=1):
-        # pdf2image gives RGB PIL images → convert to OpenCV BGR
-        page_rgb = np.array(pil_img)
-        page_bgr = cv2.cvtColor(page_rgb, cv2.COLOR_RGB2BGR)
+    return _build_result(filename, pages, recomputed, bank)
 
-        page = extract_page(page_bgr, idx)
-        pages.append(page)
+
+def _build_result(
+    filename: str,
+    pages: List[ExtractedPage],
+    recomputed: List[int],
+    bank: TemplateBank,
+) -> ExtractionResult:
+    pages.sort(key=lambda p: p.page_number)
+    recomputed.sort()
 
     total_pages = len(pages)
     total_rows = sum(len(p.rows) for p in pages)
+    skipped_rois = sum(p.skipped_rois for p in pages)
 
     return ExtractionResult(
         status="ok",
@@ -100,4 +742,204 @@ def extract_from_pdf_bytes(pdf_bytes: bytes, filename: str) -> ExtractionResult:
         total_pages=total_pages,
         total_rows=total_rows,
         pages=pages,
+        template_hash=bank.digest,
+        recomputed_pages=recomputed,
+        skipped_rois=skipped_rois,
     )
+
+
+# ---------- multi-document extraction ----------
+
+class _DocumentRun:
+    """
+    Scheduling state of one document of a batch.
+    """
+
+    def __init__(self, index: int, pdf_path: str, filename: str, total: int):
+        self.index = index
+        self.pdf_path = pdf_path
+        self.filename = filename
+        self.total = total
+        self.rendered: Optional[Iterator] = None
+        self.submitted = 0
+        self.pages: List[ExtractedPage] = []
+        self.recomputed: List[int] = []
+        self.failed = False
+
+    @property
+    def remaining(self) -> int:
+        """
+        Pages not handed out yet.
+        """
+        return self.total - self.submitted
+
+    @property
+    def complete(self) -> bool:
+        return len(self.pages) == self.total
+
+    def next_page(self) -> Tuple[int, Union[np.ndarray, PageRegions], Optional[PageText]]:
+        if self.rendered is None:
+            self.rendered = iter_rendered_pages(self.pdf_path, total=self.total)
+        try:
+            page = next(self.rendered)
+        except StopIteration:
+            raise RuntimeError(
+                f"Rendered only {self.submitted} of {self.total} pages"
+            ) from None
+        self.submitted += 1
+        return page
+
+    def close(self) -> None:
+        if self.rendered is not None:
+            self.rendered.close()
+            self.rendered = None
+
+
+def _next_run(runs: List[_DocumentRun]) -> Optional[_DocumentRun]:
+    """
+    The document to take the next page from: the one with the fewest
+    pages left to hand out, so short documents finish first instead of
+    waiting behind long ones (ties in input order).
+    """
+    open_runs = [r for r in runs if not r.failed and r.remaining > 0]
+    if not open_runs:
+        return None
+    return min(open_runs, key=lambda r: (r.remaining, r.index))
+
+
+def iter_extracted_documents(
+    documents: List[Tuple[str, str]],
+    workers: Optional[int] = None,
+    page_cache=None,
+) -> Iterator[Tuple[int, Union[ExtractionResult, Exception]]]:
+    """
+    Extract several PDFs on disk, given as (pdf_path, filename), as one
+    stream of pages.
+
+    All pages share one queue: with `workers` > 1 (default
+    EXTRACT_WORKERS) up to `2 * workers` pages of any document are in
+    flight on the page pool, otherwise they are extracted in-process.
+    Pages are taken from the document with the fewest pages left, so a
+    2-page file isn't stuck behind a 60-page one.
+
+    Yields (index into `documents`, ExtractionResult) as each document
+    completes, or (index, exception) when one fails; a failed document
+    doesn't stop the others.
+    """
+    if workers is None:
+        workers = EXTRACT_WORKERS
+    bank = get_template_bank()
+
+    runs: List[_DocumentRun] = []
+    for index, (pdf_path, filename) in enumerate(documents):
+        try:
+            total = count_pdf_pages(pdf_path)
+        except Exception as e:
+            yield index, e
+            continue
+        run = _DocumentRun(index, pdf_path, filename, total)
+        if run.complete:
+            yield index, _build_result(filename, run.pages, run.recomputed, bank)
+            continue
+        runs.append(run)
+
+    pool = get_page_pool(workers) if workers > 1 else None
+    max_in_flight = 2 * workers
+    pending: Dict = {}
+
+    def fail(run: _DocumentRun, error: Exception):
+        logger.error("Failed to extract PDF %s: %s", run.filename, error)
+        run.failed = True
+        run.close()
+        yield run.index, error
+
+    def finish(run: _DocumentRun, page: ExtractedPage):
+        run.pages.append(page)
+        if run.complete:
+            run.close()
+            yield run.index, _build_result(
+                run.filename, run.pages, run.recomputed, bank,
+            )
+
+    def collect(done):
+        for fut in done:
+            run, shm, key = pending.pop(fut)
+            try:
+                page, samples = fut.result()
+            except Exception as e:
+                if not run.failed:
+                    yield from fail(run, e)
+                continue
+            finally:
+                _release_shared_memory(shm)
+            metrics.REGISTRY.merge(samples)
+            if run.failed:
+                continue
+            run.recomputed.append(page.page_number)
+            if key is not None:
+                page_cache.put(key, page)
+            yield from finish(run, page)
+
+    try:
+        while True:
+            run = _next_run(runs)
+            if run is None:
+                break
+            try:
+                page_number, page_img, page_text = run.next_page()
+                key, page = _cached_page(
+                    page_cache, page_img, page_number, bank.digest, page_text,
+                )
+                if page is None and pool is None:
+                    page = extract_page(page_img, page_number, bank, None, page_text)
+                    run.recomputed.append(page_number)
+                    if key is not None:
+                        page_cache.put(key, page)
+            except Exception as e:
+                yield from fail(run, e)
+                continue
+
+            if page is not None:
+                del page_img
+                yield from finish(run, page)
+                continue
+
+            fut, shm = _submit_page(pool, page_img, page_number, page_text)
+            del page_img
+            pending[fut] = (run, shm, key)
+
+            if len(pending) >= max_in_flight:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                yield from collect(done)
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            yield from collect(done)
+    finally:
+        # only reached with entries left if the consumer stopped early
+        for fut, (_, shm, _) in pending.items():
+            fut.cancel()
+            _release_shared_memory(shm)
+        for run in runs:
+            run.close()
+
+
+def extract_from_pdf_bytes(
+    pdf_bytes: bytes,
+    filename: str,
+    workers: Optional[int] = None,
+    debug: Optional[DebugBundle] = None,
+) -> ExtractionResult:
+    """
+    Top-level entry used by FastAPI.
+
+    Takes raw PDF bytes and returns structured extraction result with:
+      - per-page list of rows
+      - per-row list of detected symbols (+ scores)
+      - Kuvausteksti / Suoja / Kaapeli text for each row
+
+    `workers` > 1 spreads the pages over a process pool (see
+    `extract_from_pdf_path`); the result is identical to the serial path.
+    """
+    with spooled_pdf(pdf_bytes) as pdf_path:
+        return extract_from_pdf_path(pdf_path, filename, workers, debug=debug)
@@ -0,0 +1,200 @@
+"""
+Response formats for an ExtractionResult, chosen from the request's
+Accept header:
+
+  application/json                          the pydantic model as it is
+                                            (default; what the frontend
+                                            reads)
+  application/vnd.extraction.columnar+json  the columnar layout below
+  application/msgpack                       the same columnar layout as
+                                            MessagePack (needs `msgpack`)
+
+The columnar layout stores one array per field instead of one object per
+row, so field names appear once per response rather than once per row,
+and symbol names are interned as indices into `symbol_table`:
+
+  {"format": "columnar/1", <ExtractionResult fields except pages>,
+   "symbol_table": ["name", ...],
+   "pages": {"page_number": [...], "skipped_rois": [...],
+             "row_count": [...]},
+   "rows":  {"row_index": [...], "nro": [...], "kuvaus": [...],
+             "suoja": [...], "kaapeli": [...], "text_source": [...],
+             "symbols": [[symbol index, ...], ...],
+             "scores":  [[score, ...], ...],
+             "scored":  [null | [symbol index, ...], ...]}}
+
+Rows are in page order; the first pages.row_count[0] rows belong to the
+first page, and so on. A row's `scores` line up with its `symbols`.
+`scored` is only non-null when the row's symbol_scores cover other
+symbols, and then lists the indices the scores belong to.
+`from_columnar` turns the layout back into an ExtractionResult.
+"""
+from __future__ import annotations
+
+import json
+from typing import Optional, Union
+
+from .extractor import ExtractedPage, ExtractedRow, ExtractionResult
+
+try:  # optional: faster encoding of the columnar JSON
+    import orjson
+except ImportError:
+    orjson = None
+
+try:  # optional: enables application/msgpack
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_MEDIA_TYPE = "application/json"
+COLUMNAR_MEDIA_TYPE = "application/vnd.extraction.columnar+json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+# names clients use for MessagePack besides the registered one
+_MEDIA_TYPE_ALIASES = {"application/x-msgpack": MSGPACK_MEDIA_TYPE}
+
+COLUMNAR_FORMAT = "columnar/1"
+
+_ROW_TEXT_FIELDS = ("nro", "kuvaus", "suoja", "kaapeli", "text_source")
+
+
+def available_media_types() -> tuple[str, ...]:
+    types = (JSON_MEDIA_TYPE, COLUMNAR_MEDIA_TYPE)
+    if msgpack is not None:
+        types += (MSGPACK_MEDIA_TYPE,)
+    return types
+
+
+def negotiate(accept: Optional[str]) -> Optional[str]:
+    """
+    The media type to answer an Accept header with: its most preferred
+    available type, JSON for no header or a wildcard, None when nothing
+    it accepts is available (-> 406).
+    """
+    if not accept or not accept.strip():
+        return JSON_MEDIA_TYPE
+
+    ranges = []
+    refused = set()
+    for position, entry in enumerate(accept.split(",")):
+        media_range, *params = (part.strip() for part in entry.split(";"))
+        media_range = media_range.lower()
+        media_range = _MEDIA_TYPE_ALIASES.get(media_range, media_range)
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q <= 0:
+            refused.add(media_range)
+        elif media_range:
+            ranges.append((-q, position, media_range))
+
+    available = [t for t in available_media_types() if t not in refused]
+    for _, _, media_range in sorted(ranges):
+        if media_range in ("*/*", "application/*"):
+            return available[0] if available else None
+        if media_range in available:
+            return media_range
+    return None
+
+
+# ---------- columnar layout ----------
+
+def to_columnar(result: ExtractionResult) -> dict:
+    """
+    The columnar layout of `result` (see the module docstring).
+    """
+    symbol_table: dict[str, int] = {}
+
+    def intern(name: str) -> int:
+        return symbol_table.setdefault(name, len(symbol_table))
+
+    pages = {"page_number": [], "skipped_rois": [], "row_count": []}
+    rows = {
+        "row_index": [],
+        **{field: [] for field in _ROW_TEXT_FIELDS},
+        "symbols": [],
+        "scores": [],
+        "scored": [],
+    }
+    for page in result.pages:
+        pages["page_number"].append(page.page_number)
+        pages["skipped_rois"].append(page.skipped_rois)
+        pages["row_count"].append(len(page.rows))
+        for row in page.rows:
+            rows["row_index"].append(row.row_index)
+            for field in _ROW_TEXT_FIELDS:
+                rows[field].append(getattr(row, field))
+            rows["symbols"].append([intern(s) for s in row.symbols])
+
+            scores = row.symbol_scores
+            if scores.keys() == set(row.symbols):
+                rows["scores"].append([scores[s] for s in row.symbols])
+                rows["scored"].append(None)
+            else:
+                rows["scores"].append(list(scores.values()))
+                rows["scored"].append([intern(s) for s in scores])
+
+    return {
+        "format": COLUMNAR_FORMAT,
+        **result.model_dump(exclude={"pages"}),
+        "symbol_table": list(symbol_table),
+        "pages": pages,
+        "rows": rows,
+    }
+
+
+def from_columnar(doc: dict) -> ExtractionResult:
+    """
+    Inverse of `to_columnar`.
+    """
+    if doc.get("format") != COLUMNAR_FORMAT:
+        raise ValueError(f"Not a {COLUMNAR_FORMAT} document: {doc.get('format')!r}")
+
+    table = doc["symbol_table"]
+    rows, pages = doc["rows"], doc["pages"]
+
+    extracted_pages = []
+    start = 0
+    for page_number, skipped, count in zip(
+        pages["page_number"], pages["skipped_rois"], pages["row_count"],
+    ):
+        page_rows = []
+        for i in range(start, start + count):
+            symbols = [table[j] for j in rows["symbols"][i]]
+            scored = rows["scored"][i]
+            names = symbols if scored is None else [table[j] for j in scored]
+            page_rows.append(ExtractedRow(
+                row_index=rows["row_index"][i],
+                symbols=symbols,
+                symbol_scores=dict(zip(names, rows["scores"][i])),
+                **{field: rows[field][i] for field in _ROW_TEXT_FIELDS},
+            ))
+        start += count
+        extracted_pages.append(ExtractedPage(
+            page_number=page_number, rows=page_rows, skipped_rois=skipped,
+        ))
+
+    header = {
+        k: v for k, v in doc.items()
+        if k not in ("format", "symbol_table", "pages", "rows")
+    }
+    return ExtractionResult(**header, pages=extracted_pages)
+
+
+def encode_result(result: ExtractionResult, media_type: str) -> Union[str, bytes]:
+    """
+    `result` serialised as `media_type` (one of `available_media_types`).
+    """
+    if media_type == JSON_MEDIA_TYPE:
+        return result.model_dump_json()
+
+    doc = to_columnar(result)
+    if media_type == MSGPACK_MEDIA_TYPE:
+        return msgpack.packb(doc, use_bin_type=True)
+    if orjson is not None:
+        return orjson.dumps(doc)
+    return json.dumps(doc, ensure_ascii=False, separators=(",", ":"))
@@ -1,9 +1,20 @@
 from pathlib import Path
 from collections import defaultdict
+import hashlib
+import logging
 import os
+import threading
+import time
 import cv2
 import numpy as np
-import pytesseract
+
+from . import metrics
+from .debug_bundle import DebugBundle
+from .matching import batched_fft_responses, pyramid_response
+from .ocr import binarize_ocr_cell, ocr_cell, ocr_cells
+from .text_layer import PageText
+
+logger = logging.getLogger(__name__)
 
 # ========= CONFIG =========
 PAGE_IMG = r"debug_pages\page_006.png"
@@ -58,8 +69,20 @@ REF_ROW_BANDS: list[tuple[int, int]] = [
     (1940, 2095), # R11
 ]
 
-# Global container with “usable” rows (only rows with symbols)
-usable_rows: dict[int, dict] = {}
+# Column bands as (x1_frac, x2_frac) of the page width, keyed by field.
+COLUMN_FRACS: dict[str, tuple[float, float]] = {
+    "symbol": (SYMBOL_X1_FRAC, SYMBOL_X2_FRAC),
+    "suoja": (SUOJA_X1_FRAC, SUOJA_X2_FRAC),
+    "kuvaus": (kuvaus_x1_FRAC, kuvaus_x2_FRAC),
+    "kaapeli": (kaapeli_x1_FRAC, kaapeli_x2_FRAC),
+    "nro": (nro_x1_FRAC, nro_x2_FRAC),
+}
+# OCR'd text columns, in the order they are read for every row
+OCR_FIELDS: tuple[str, ...] = ("suoja", "kuvaus", "kaapeli", "nro")
+
+# the symbol strip is trimmed a little inside each row band
+ROW_MARGIN_TOP = 4
+ROW_MARGIN_BOTTOM = 2
 
 # height we normalise all symbol strips to (kept for reference / debugging)
 TARGET_H = 91
@@ -67,17 +90,51 @@ TARGET_H = 91
 MIN_BLOB_AREA = 30
 # template-matching threshold; if best score is below this → "unknown"
 MATCH_THRESH = 0.5
-
-# Point to your local Tesseract installation
-TESSERACT_CMD_ENV = os.getenv("TESSERACT_CMD")  # optional override
-
-if TESSERACT_CMD_ENV:
-    pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD_ENV
-elif os.name == "nt":
-    win_default = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
-    if os.path.exists(win_default):
-        pytesseract.pytesseract.tesseract_cmd = win_default
-    # else: fall back to whatever is in PATH
+# a symbol only counts for a row if it matched at least this well
+ROW_SYMBOL_THRESH = 0.80
+
+# How response maps are computed (see `matching.py`):
+#   "exhaustive" – full-resolution matchTemplate per template (reference)
+#   "pyramid"    – coarse candidates on a downsampled strip, re-scored
+#                  at full resolution only around them
+#   "fft"        – all templates correlated in one batched frequency-
+#                  domain pass sharing the strip's spectrum
+MATCH_MODES = ("exhaustive", "pyramid", "fft")
+MATCH_MODE = os.getenv("MATCH_MODE", "exhaustive").strip().lower()
+if MATCH_MODE not in MATCH_MODES:
+    raise RuntimeError(f"MATCH_MODE must be one of {MATCH_MODES}, got {MATCH_MODE!r}")
+
+# Ink prefilter: a symbol strip / OCR cell whose share of ink pixels is
+# below INK_MIN_FRACTION is treated as blank and skipped (0 disables it).
+# INK_INSET pixels are ignored along every edge, so the table rules that
+# run through the band edges don't count as content.
+INK_MIN_FRACTION = float(os.getenv("INK_MIN_FRACTION", "0.001"))
+INK_INSET = 8
+
+# Let a strong hit suppress overlapping hits of *other* templates as well
+# (off: overlapping symbols are left to MUTUALLY_EXCLUSIVE_GROUPS).
+NMS_ACROSS_TEMPLATES = os.getenv("NMS_ACROSS_TEMPLATES", "0") != "0"
+
+# Groups of mutually-exclusive symbols.
+# Within each group, keep only the one with highest score.
+MUTUALLY_EXCLUSIVE_GROUPS: list[list[str]] = [
+    # Existing group: only one of these
+    ["JOHDONSUOJA 1-NAP", "JOHDONSUOJA 3-NAP"],
+
+    ["JOHDONSUOJA 1-NAP", "YHDISTELMASUOJA-2"],
+
+    # Group 2: YHDISTELMASUOJA / VIKAVIRTASUOJA variants
+    ["YHDISTELMASUOJA", "YHDISTELMASUOJA-2",
+     "VIKAVIRTASUOJA", "VIKAVIRTASUOJA-2"],
+
+    # Group 3: 3-phase fuse variants
+    ["3-VAIHE KAHVAROKEALUSTA",
+     "3-VAIHEINEN_TULPPAVAROKE",
+     "3-VAIHEINEN_TULPPAVAROKE-2"],
+
+    # Group 4: contactors
+    ["1-NAP KONTAKTORI", "3-NAP KONTAKTORI"],
+]
 
 
 def compute_column_ranges(page_width: int):
@@ -142,17 +199,14 @@ def binarize_and_clean(img: np.ndarray) -> np.ndarray:
         cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU,
     )
 
-    num_labels, labels, stats, _ = cv2.connectedComponentsWithStats(
+    _, labels, stats, _ = cv2.connectedComponentsWithStats(
         bw, connectivity=8,
     )
-    cleaned = np.zeros_like(bw)
-
-    for lab in range(1, num_labels):  # skip background 0
-        area = stats[lab, cv2.CC_STAT_AREA]
-        if area >= MIN_BLOB_AREA:
-            cleaned[labels == lab] = 255
 
-    return cleaned
+    # keep/drop lookup per label, applied to the label image in one pass
+    keep = np.where(stats[:, cv2.CC_STAT_AREA] >= MIN_BLOB_AREA, 255, 0)
+    keep[0] = 0  # background
+    return keep.astype(np.uint8)[labels]
 
 
 def prep_template_2d(img: np.ndarray) -> np.ndarray:
@@ -178,15 +232,142 @@ def prep_template_2d(img: np.ndarray) -> np.ndarray:
 def load_symbol_templates_for_matching_2d() -> dict[str, np.ndarray]:
     """
     Load templates from TEMPLATE_DIR, prepared for 2D matching.
+    Served from the process-wide template bank (see `get_template_bank`).
+    """
+    return dict(get_template_bank().templates)
+
+
+# ---------- process-wide template bank ----------
+
+class TemplateBank:
+    """
+    Prepared 2D templates for one version of TEMPLATE_DIR.
+
+    `digest` is a SHA-256 over the template file names and bytes, so an
+    extraction result can say exactly which template set produced it.
+    `signature` is the cheap (mtime, size) fingerprint used to detect
+    changes on disk without re-reading the PNGs. `sources` are the
+    grayscale template drawings, kept for `scaled`.
     """
+
+    def __init__(
+        self,
+        templates: dict[str, np.ndarray],
+        digest: str,
+        signature: tuple,
+        sources: dict[str, np.ndarray] | None = None,
+    ):
+        self.templates = templates
+        self.digest = digest
+        self.signature = signature
+        self.sources = sources or {}
+        self._scaled: dict[float, "TemplateBank"] = {}
+        self._scaled_lock = threading.Lock()
+
+    @property
+    def names(self) -> list[str]:
+        return list(self.templates.keys())
+
+    def scaled(self, scale: float) -> "TemplateBank":
+        """
+        The same templates for symbol strips rendered at `scale` times
+        the DPI the templates were drawn at. The drawings are resized
+        before they are prepared, like the page itself is rendered
+        smaller. Built once per scale; digest and signature are this
+        bank's.
+        """
+        scale = round(scale, 4)
+        if scale == 1.0:
+            return self
+
+        with self._scaled_lock:
+            bank = self._scaled.get(scale)
+            if bank is None:
+                interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+                templates = {}
+                for name, src in self.sources.items():
+                    h, w = src.shape[:2]
+                    size = (max(1, round(w * scale)), max(1, round(h * scale)))
+                    templates[name] = prep_template_2d(
+                        cv2.resize(src, size, interpolation=interpolation)
+                    )
+                bank = TemplateBank(templates, self.digest, self.signature)
+                self._scaled[scale] = bank
+        return bank
+
+
+_template_bank: TemplateBank | None = None
+_template_bank_lock = threading.Lock()
+
+
+def _template_dir_signature(template_dir: Path) -> tuple:
+    """
+    Fingerprint of the template directory: its own mtime plus the
+    name / mtime / size of every PNG in it. Only `stat` calls, no reads.
+    """
+    try:
+        dir_mtime = template_dir.stat().st_mtime_ns
+    except FileNotFoundError:
+        return ()
+
+    files = []
+    for p in sorted(template_dir.glob("*.png")):
+        st = p.stat()
+        files.append((p.name, st.st_mtime_ns, st.st_size))
+    return (dir_mtime, tuple(files))
+
+
+def build_template_bank(template_dir: Path = TEMPLATE_DIR) -> TemplateBank:
+    """
+    Read every PNG in `template_dir` once, prepare it for 2D matching and
+    hash the raw bytes of the whole set.
+    """
+    t0 = time.perf_counter()
+    signature = _template_dir_signature(template_dir)
+    hasher = hashlib.sha256()
     templates: dict[str, np.ndarray] = {}
-    for p in TEMPLATE_DIR.glob("*.png"):
-        img_gray = cv2.imread(str(p), cv2.IMREAD_GRAYSCALE)
+    sources: dict[str, np.ndarray] = {}
+
+    for p in sorted(template_dir.glob("*.png")):
+        raw = p.read_bytes()
+        img_gray = cv2.imdecode(
+            np.frombuffer(raw, np.uint8), cv2.IMREAD_GRAYSCALE,
+        )
         if img_gray is None:
             continue
-        tpl = prep_template_2d(img_gray)
-        templates[p.stem] = tpl
-    return templates
+        hasher.update(p.name.encode("utf-8"))
+        hasher.update(raw)
+        templates[p.stem] = prep_template_2d(img_gray)
+        sources[p.stem] = img_gray
+
+    bank = TemplateBank(templates, hasher.hexdigest(), signature, sources)
+    elapsed = time.perf_counter() - t0
+    metrics.STAGE_SECONDS.observe(elapsed, stage="template_load")
+    logger.info(
+        "templates loaded count=%d digest=%s seconds=%.3f names=%s",
+        len(bank.names), bank.digest[:12], elapsed, bank.names,
+    )
+    return bank
+
+
+def get_template_bank() -> TemplateBank:
+    """
+    Return the shared template bank, (re)building it when TEMPLATE_DIR
+    changed on disk since the last build. Safe to call from many threads.
+    """
+    global _template_bank
+
+    signature = _template_dir_signature(TEMPLATE_DIR)
+    bank = _template_bank
+    if bank is not None and bank.signature == signature:
+        return bank
+
+    with _template_bank_lock:
+        bank = _template_bank
+        if bank is None or bank.signature != signature:
+            bank = build_template_bank(TEMPLATE_DIR)
+            _template_bank = bank
+    return bank
 
 
 def prep_row_roi_2d(row_roi_bgr: np.ndarray) -> np.ndarray:
@@ -205,14 +386,136 @@ def prep_row_roi_2d(row_roi_bgr: np.ndarray) -> np.ndarray:
     return bw
 
 
+def ink_integral(img: np.ndarray) -> np.ndarray:
+    """
+    Integral image of a page's ink mask (Otsu, ink = 1), so the amount of
+    ink in any rectangle costs four lookups.
+    """
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    _, ink = cv2.threshold(
+        gray, 0, 1,
+        cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU,
+    )
+    return cv2.integral(ink)
+
+
+def ink_fraction(
+    ii: np.ndarray,
+    x1: int, y1: int, x2: int, y2: int,
+    inset: int = INK_INSET,
+) -> float:
+    """
+    Share of ink pixels in [y1:y2, x1:x2], `inset` pixels in from every
+    edge (if the region is large enough for that).
+    """
+    h, w = ii.shape[0] - 1, ii.shape[1] - 1
+    x1, x2 = max(0, x1), min(w, x2)
+    y1, y2 = max(0, y1), min(h, y2)
+    if x2 - x1 > 2 * inset and y2 - y1 > 2 * inset:
+        x1, y1, x2, y2 = x1 + inset, y1 + inset, x2 - inset, y2 - inset
+    area = (x2 - x1) * (y2 - y1)
+    if area <= 0:
+        return 0.0
+    ink = ii[y2, x2] - ii[y1, x2] - ii[y2, x1] + ii[y1, x1]
+    return float(ink) / area
+
+
+# 3×3 neighbourhood offsets for the local-maximum test on response maps
+_PEAK_DY, _PEAK_DX = (a.ravel() for a in np.mgrid[-1:2, -1:2])
+_NO_PEAKS = (np.empty(0, np.intp), np.empty(0, np.intp), np.empty(0, np.float32))
+
+
+def _response_peaks(
+    res: np.ndarray,
+    thresh: float,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    All local maxima of a response map scoring at least `thresh`, in one
+    pass: threshold the map, then apply a 3×3 max filter (dilation) at
+    the surviving positions only, which gives the same answer as dilating
+    the whole map. Plateaus keep every pixel; NMS sorts them out.
+    Returns (ys, xs, scores) in row-major order.
+    """
+    if cv2.minMaxLoc(res)[1] < thresh:
+        # most templates don't occur in a given row at all
+        return _NO_PEAKS
+
+    # flat indices: np.nonzero on 2D maps is several times slower
+    h, w = res.shape
+    flat = np.flatnonzero(res >= thresh)
+    ys, xs = np.divmod(flat, w)
+    scores = res[ys, xs]
+
+    # clamped to the map: a repeated edge pixel can't change the max
+    ny = np.minimum(np.maximum(ys[:, None] + _PEAK_DY, 0), h - 1)
+    nx = np.minimum(np.maximum(xs[:, None] + _PEAK_DX, 0), w - 1)
+    is_peak = scores >= res[ny, nx].max(axis=1)
+    return ys[is_peak], xs[is_peak], scores[is_peak]
+
+
+def _non_max_suppression(
+    xs: np.ndarray,
+    ys: np.ndarray,
+    widths: np.ndarray,
+    heights: np.ndarray,
+    scores: np.ndarray,
+    labels: np.ndarray,
+    nms_margin: int,
+    across_templates: bool = False,
+) -> np.ndarray:
+    """
+    Greedy NMS over the peaks of all templates of a row at once.
+
+    Best score first, a kept peak suppresses the peaks of the same
+    template whose position falls in its box grown by `nms_margin` (the
+    area a greedy minMaxLoc search would blank). With `across_templates`,
+    it also suppresses other templates' peaks centred in that box.
+
+    Returns the indices of the kept peaks, best first.
+    """
+    # stable: equal scores keep row-major order, like cv2.minMaxLoc
+    order = np.argsort(-scores, kind="stable")
+    xs, ys = xs[order], ys[order]
+    widths, heights, labels = widths[order], heights[order], labels[order]
+    cxs = xs + widths / 2.0
+    cys = ys + heights / 2.0
+
+    alive = np.ones(len(order), bool)
+    keep = []
+    for i in range(len(order)):
+        if not alive[i]:
+            continue
+        keep.append(i)
+
+        x0, y0 = xs[i] - nms_margin, ys[i] - nms_margin
+        x1 = xs[i] + widths[i] + nms_margin
+        y1 = ys[i] + heights[i] + nms_margin
+        same = labels == labels[i]
+        hit = same & (xs >= x0) & (xs < x1) & (ys >= y0) & (ys < y1)
+        if across_templates:
+            hit |= ~same & (cxs >= x0) & (cxs < x1) & (cys >= y0) & (cys < y1)
+        alive &= ~hit
+
+    return order[keep]
+
+
 def match_templates_in_row_multi_2d(
     row_roi_bgr: np.ndarray,
     templates: dict[str, np.ndarray],
     thresh: float = MATCH_THRESH,
     nms_margin: int = 3,
+    mode: str | None = None,
+    across_templates: bool | None = None,
+    heatmaps: dict[str, np.ndarray] | None = None,
 ):
     """
     2D template matching on one row ROI.
+    `mode` picks how the response maps are computed (default MATCH_MODE).
+    Peaks of every template are collected in one pass per map and thinned
+    by a single NMS over the whole row; `across_templates` (default
+    NMS_ACROSS_TEMPLATES) lets overlapping hits of different templates
+    suppress each other too. If `heatmaps` is given, every template's
+    response map is stored in it (for debugging).
 
     Returns list of hits:
       [
@@ -225,43 +528,71 @@ def match_templates_in_row_multi_2d(
         }, ...
       ]
     """
+    mode = mode or MATCH_MODE
+    if across_templates is None:
+        across_templates = NMS_ACROSS_TEMPLATES
     bw_row = prep_row_roi_2d(row_roi_bgr)
     H, W = bw_row.shape
 
-    detections = []
-
-    for name, tpl in templates.items():
+    templates = {
+        name: tpl for name, tpl in templates.items()
+        if tpl.shape[0] <= H and tpl.shape[1] <= W
+    }
+    if mode == "fft":
+        responses = batched_fft_responses(bw_row, templates)
+
+    names = list(templates)
+    peaks = []
+    for label, (name, tpl) in enumerate(templates.items()):
+        t0 = time.perf_counter()
         th, tw = tpl.shape
-        if th > H or tw > W:
-            continue
 
         # 2D NCC
-        res = cv2.matchTemplate(bw_row, tpl, cv2.TM_CCOEFF_NORMED)
-
-        while True:
-            _, max_val, _, max_loc = cv2.minMaxLoc(res)
-            if max_val < thresh:
-                break
-
-            x, y = max_loc
-            detections.append(
-                {
-                    "name": name,
-                    "score": float(max_val),
-                    "x": int(x),
-                    "y": int(y),
-                    "x_center": x + tw / 2.0,
-                    "width": tw,
-                    "height": th,
-                }
-            )
+        if mode == "fft":
+            res = responses[name]
+        elif mode == "pyramid":
+            res = pyramid_response(bw_row, tpl, thresh)
+        else:
+            res = cv2.matchTemplate(bw_row, tpl, cv2.TM_CCOEFF_NORMED)
+
+        if heatmaps is not None:
+            heatmaps[name] = res
+
+        ys, xs, scores = _response_peaks(res, thresh)
+        if len(scores):
+            peaks.append((xs, ys, scores, label, tw, th))
+        metrics.TEMPLATE_MATCH_SECONDS.observe(
+            time.perf_counter() - t0, template=name,
+        )
+
+    if not peaks:
+        return []
+
+    xs = np.concatenate([p[0] for p in peaks])
+    ys = np.concatenate([p[1] for p in peaks])
+    scores = np.concatenate([p[2] for p in peaks])
+    counts = [len(p[2]) for p in peaks]
+    labels = np.repeat([p[3] for p in peaks], counts)
+    widths = np.repeat([p[4] for p in peaks], counts)
+    heights = np.repeat([p[5] for p in peaks], counts)
+
+    kept = _non_max_suppression(
+        xs, ys, widths, heights, scores, labels, nms_margin,
+        across_templates,
+    )
 
-            # non-max suppression: kill a small area around this match
-            x0 = max(0, x - nms_margin)
-            y0 = max(0, y - nms_margin)
-            x1 = min(res.shape[1], x + tw + nms_margin)
-            y1 = min(res.shape[0], y + th + nms_margin)
-            res[y0:y1, x0:x1] = -1.0  # below any realistic NCC
+    detections = [
+        {
+            "name": names[labels[i]],
+            "score": float(scores[i]),
+            "x": int(xs[i]),
+            "y": int(ys[i]),
+            "x_center": float(xs[i] + widths[i] / 2.0),
+            "width": int(widths[i]),
+            "height": int(heights[i]),
+        }
+        for i in kept
+    ]
 
     # left→right order
     detections.sort(key=lambda d: d["x_center"])
@@ -271,198 +602,454 @@ def match_templates_in_row_multi_2d(
 def ocr_suoja(roi: np.ndarray) -> str:
     """
     OCR helper for Suoja / Kuvausteksti / Kaapeli cells.
-    Currently uses a simple Otsu binarisation and default Tesseract config.
+    Currently uses a simple Otsu binarisation and default Tesseract config,
+    run through the backend selected by OCR_BACKEND (see `ocr.py`).
+    The page classifier batches its cells through `ocr.ocr_cells` instead.
     """
-    gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
-    _, bw = cv2.threshold(
-        gray, 0, 255,
-        cv2.THRESH_BINARY + cv2.THRESH_OTSU,
-    )
-    text = pytesseract.image_to_string(bw)
-    return text.strip()
+    return ocr_cell(binarize_ocr_cell(roi))
 
 
-# ---------- core page classification ----------
+# ---------- region-rendered pages ----------
 
-def _classify_page_core(img: np.ndarray):
+class PageRegions:
     """
-    Core implementation that works directly on a BGR page image.
+    A page rasterised as a few separate regions instead of one bitmap
+    (see RASTER_MODE in `extractor.py`).
 
-    Returns a list of per-row dictionaries with:
-      - row_index
-      - unique_symbols (alphabetical list)
-      - symbol_scores (best score per symbol)
-      - kuvaus, suoja, kaapeli
-      - symbols_raw, strong_symbols, y1, y2 (for debugging)
-    """
-    global usable_rows
-    usable_rows.clear()
+    `shape` is (height, width) of the whole page in layout pixels, the
+    coordinate system row bands and column ranges are computed in. Every
+    region is `name -> (image, x0, y0, scale)`: its top-left corner in
+    layout pixels and its resolution relative to the layout, so a region
+    rendered at twice the layout DPI has scale 2.0.
 
-    if img is None:
-        raise RuntimeError("classify_page: received empty image")
+    `whole(img)` wraps an ordinary page image (one region, scale 1), so
+    `PageClassifier.classify` reads both kinds of page the same way.
+    """
 
-    h, w = img.shape[:2]
-    print("Page shape:", img.shape)
+    def __init__(
+        self,
+        shape: tuple[int, int],
+        regions: dict[str, tuple[np.ndarray, float, float, float]],
+    ):
+        self.shape = (int(shape[0]), int(shape[1]))
+        self.regions = regions
+        self._integrals: dict[str, np.ndarray] = {}
+
+    @classmethod
+    def whole(cls, img: np.ndarray) -> "PageRegions":
+        return cls(img.shape[:2], {"page": (img, 0, 0, 1.0)})
+
+    @property
+    def nbytes(self) -> int:
+        return sum(img.nbytes for img, _, _, _ in self.regions.values())
+
+    def __getstate__(self) -> dict:
+        # ink integrals are rebuilt on demand, don't ship them
+        return {"shape": self.shape, "regions": self.regions}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(state["shape"], state["regions"])
+
+    def _region(self, x1: int, y1: int, x2: int, y2: int) -> str:
+        """
+        Name of the region that covers most of [y1:y2, x1:x2].
+        """
+        def overlap(name: str) -> float:
+            img, x0, y0, scale = self.regions[name]
+            h, w = img.shape[:2]
+            ox = min(x2, x0 + w / scale) - max(x1, x0)
+            oy = min(y2, y0 + h / scale) - max(y1, y0)
+            return max(ox, 0.0) * max(oy, 0.0)
+
+        return max(self.regions, key=overlap)
+
+    def crop(
+        self, x1: int, y1: int, x2: int, y2: int,
+    ) -> tuple[np.ndarray, float]:
+        """
+        [y1:y2, x1:x2] (layout pixels) at the resolution it was rendered
+        at. Returns (image, scale).
+        """
+        img, x0, y0, scale = self.regions[self._region(x1, y1, x2, y2)]
+        if scale == 1.0 and x0 == 0 and y0 == 0:
+            return img[y1:y2, x1:x2], scale
+        return img[
+            max(0, round((y1 - y0) * scale)) : max(0, round((y2 - y0) * scale)),
+            max(0, round((x1 - x0) * scale)) : max(0, round((x2 - x0) * scale)),
+        ], scale
+
+    def ink_fraction(self, x1: int, y1: int, x2: int, y2: int) -> float:
+        """
+        `ink_fraction` of [y1:y2, x1:x2] (layout pixels). Each region is
+        binarised once, the first time it is asked about.
+        """
+        name = self._region(x1, y1, x2, y2)
+        img, x0, y0, scale = self.regions[name]
+        ii = self._integrals.get(name)
+        if ii is None:
+            ii = self._integrals[name] = ink_integral(img)
+        return ink_fraction(
+            ii,
+            round((x1 - x0) * scale), round((y1 - y0) * scale),
+            round((x2 - x0) * scale), round((y2 - y0) * scale),
+            inset=round(INK_INSET * scale),
+        )
 
-    (
-        symbol_x1,
-        symbol_x2,
-        suoja_x1,
-        suoja_x2,
-        kuvaus_x1,
-        kuvaus_x2,
-        kaapeli_x1,
-        kaapeli_x2,
-        nro_x1,
-        nro_x2
-    ) = compute_column_ranges(w)
 
-    templates = load_symbol_templates_for_matching_2d()
-    print("Loaded templates:", list(templates.keys()))
+# ---------- core page classification ----------
 
-    row_bands = compute_fixed_row_bands(h)
-    print("Using fixed row bands:", row_bands)
+class PageClassifier:
+    """
+    Classifies the 11 fixed rows of a schedule page.
 
-    debug_dir = Path("debug_syms")
-    debug_dir.mkdir(exist_ok=True)
+    All configuration (thresholds, column fractions, row bands, template
+    bank) is fixed at construction and `classify` keeps its working state
+    in locals, so one instance can serve many threads at once.
 
-    results: list[dict] = []
+    `bank=None` means "use the shared template bank", which picks up
+    template changes on disk; pass a bank to pin a specific template set.
+    """
 
-    for idx, (y1, y2) in enumerate(row_bands, start=1):
-        ROW_MARGIN_TOP = 4
-        ROW_MARGIN_BOTTOM = 2
+    def __init__(
+        self,
+        bank: TemplateBank | None = None,
+        match_thresh: float = MATCH_THRESH,
+        row_symbol_thresh: float = ROW_SYMBOL_THRESH,
+        column_fracs: dict[str, tuple[float, float]] | None = None,
+        ref_row_bands: list[tuple[int, int]] | None = None,
+        ref_page_height: float = REF_PAGE_HEIGHT,
+        exclusive_groups: list[list[str]] | None = None,
+        debug_dir: Path | None = None,
+        match_mode: str | None = None,
+        ink_min_fraction: float = INK_MIN_FRACTION,
+    ):
+        self._bank = bank
+        self.match_thresh = match_thresh
+        self.row_symbol_thresh = row_symbol_thresh
+        self.column_fracs = dict(column_fracs or COLUMN_FRACS)
+        self.ref_row_bands = list(ref_row_bands or REF_ROW_BANDS)
+        self.ref_page_height = float(ref_page_height)
+        self.exclusive_groups = [
+            list(g) for g in (exclusive_groups or MUTUALLY_EXCLUSIVE_GROUPS)
+        ]
+        self.debug_dir = debug_dir
+        self.match_mode = match_mode or MATCH_MODE
+        self.ink_min_fraction = ink_min_fraction
+
+    @property
+    def bank(self) -> TemplateBank:
+        return self._bank if self._bank is not None else get_template_bank()
+
+    def column_ranges(self, page_width: int) -> dict[str, tuple[int, int]]:
+        """
+        Concrete (x1, x2) pixel range of every column for a page width.
+        """
+        return {
+            field: (
+                int(round(x1_frac * page_width)),
+                int(round(x2_frac * page_width)),
+            )
+            for field, (x1_frac, x2_frac) in self.column_fracs.items()
+        }
 
-        sy1 = max(y1 + ROW_MARGIN_TOP, 0)
-        sy2 = min(y2 - ROW_MARGIN_BOTTOM, h)
+    def row_bands(self, page_height: int) -> list[tuple[int, int]]:
+        """
+        Scale the reference row bands to the actual page height.
+        """
+        scale = float(page_height) / self.ref_page_height
+        return [
+            (int(round(y1_ref * scale)), int(round(y2_ref * scale)))
+            for y1_ref, y2_ref in self.ref_row_bands
+        ]
+
+    def raster_regions(self) -> dict[str, tuple[float, float, float, float]]:
+        """
+        The parts of a page `classify` reads, as (x1, y1, x2, y2)
+        fractions of the page size: the symbol column, and the span of
+        the OCR columns, both over the height of the row bands.
+        """
+        y1 = min(y for y, _ in self.ref_row_bands) / self.ref_page_height
+        y2 = max(y for _, y in self.ref_row_bands) / self.ref_page_height
+        symbol_x1, symbol_x2 = self.column_fracs["symbol"]
+        text = [self.column_fracs[field] for field in OCR_FIELDS]
+        return {
+            "symbol": (symbol_x1, y1, symbol_x2, y2),
+            "text": (min(x for x, _ in text), y1, max(x for _, x in text), y2),
+        }
 
-        symbols = []
-        strong_symbols = []
-        unique_symbols: list[str] = []
-        symbol_scores: dict[str, float] = {}
-        kuvaus_text = ""
-        suoja_text = ""
-        kaapeli_text = ""
-        nro_text = ""
+    def resolve_symbols(
+        self,
+        symbols: list[dict],
+    ) -> tuple[list[dict], dict[str, float]]:
+        """
+        Keep strong detections, reduce them to the best score per symbol
+        and resolve mutually-exclusive groups.
+
+        Returns (strong_symbols, symbol_scores).
+        """
+        strong_symbols = [
+            d for d in symbols if d["score"] >= self.row_symbol_thresh
+        ]
+
+        name_best_score: dict[str, float] = defaultdict(float)
+        for det in strong_symbols:
+            name = det["name"]
+            score = float(det["score"])
+            if score > name_best_score[name]:
+                name_best_score[name] = score
+
+        for group in self.exclusive_groups:
+            # collect those that actually appeared in this row
+            present = [(name, name_best_score[name])
+                       for name in group
+                       if name in name_best_score]
+
+            if len(present) <= 1:
+                continue  # nothing to resolve
+
+            # keep the one with highest score
+            best_name, _ = max(present, key=lambda x: x[1])
+            for name, _ in present:
+                if name != best_name:
+                    del name_best_score[name]
+
+        return strong_symbols, dict(name_best_score)
+
+    def classify(
+        self,
+        img: np.ndarray | PageRegions,
+        debug_dir: Path | None = None,
+        debug: DebugBundle | None = None,
+        page_text: PageText | None = None,
+    ) -> list[dict]:
+        """
+        Classify a BGR page image, or a page rendered as `PageRegions`
+        (symbol strips rendered at another DPI are matched against
+        accordingly scaled templates).
+
+        With the page's `page_text` (its PDF text layer), text cells are
+        read from there; only cells it has no words for are OCR'd.
+
+        Returns a list of per-row dictionaries with:
+          - row_index
+          - unique_symbols (alphabetical list)
+          - symbol_scores (best score per symbol)
+          - kuvaus, suoja, kaapeli, nro
+          - skipped_rois (ROIs the ink prefilter found blank: "symbol"
+            and/or OCR field names)
+          - text_sources ("text_layer" or "ocr" per text cell that was
+            read) and text_source, their summary for the row:
+            "text_layer", "ocr", "mixed" or "none"
+          - symbols_raw, strong_symbols, y1, y2 (for debugging)
+
+        `debug` collects the symbol strip and OCR cell crops of every row,
+        their binarised versions, the match heatmap of every template and
+        the row results. `debug_dir` (or the instance's) is shorthand for a
+        bundle written to that directory. Without either, nothing is
+        encoded or written.
+        """
+        if img is None:
+            raise RuntimeError("classify_page: received empty image")
+
+        h, w = img.shape[:2]
+        logger.debug("page shape=%s", img.shape)
+        page = img if isinstance(img, PageRegions) else PageRegions.whole(img)
+
+        columns = self.column_ranges(w)
+        symbol_x1, symbol_x2 = columns["symbol"]
+        bank = self.bank
+
+        row_bands = self.row_bands(h)
+        logger.debug("row bands=%s", row_bands)
+
+        debug_dir = debug_dir or self.debug_dir
+        if debug is None and debug_dir is not None:
+            debug = DebugBundle(Path(debug_dir))
+
+        # one binarisation per page (region); blank ROIs skip matching / OCR
+        prefilter = self.ink_min_fraction > 0
+
+        def is_blank(x1: int, y1: int, x2: int, y2: int) -> bool:
+            return prefilter and (
+                page.ink_fraction(x1, y1, x2, y2) < self.ink_min_fraction
+            )
 
-        if sy2 > sy1:
-            # --- SYMBOLS ---
-            sym_roi = img[sy1:sy2, symbol_x1:symbol_x2]
-            cv2.imwrite(str(debug_dir / f"row{idx:02d}_sym_raw.png"), sym_roi)
+        results: list[dict] = []
+        # every OCR cell on the page, keyed by (row_index, field);
+        # recognised in one batch after all rows have been matched
+        ocr_batch: dict[tuple[int, str], np.ndarray] = {}
+        # cells read from the text layer instead, same keys
+        layer_texts: dict[tuple[int, str], str] = {}
+
+        for idx, (y1, y2) in enumerate(row_bands, start=1):
+            sy1 = max(y1 + ROW_MARGIN_TOP, 0)
+            sy2 = min(y2 - ROW_MARGIN_BOTTOM, h)
+
+            symbols = []
+            strong_symbols = []
+            symbol_scores: dict[str, float] = {}
+            skipped: list[str] = []
+            text_sources: dict[str, str] = {}
+
+            if sy2 > sy1:
+                # --- SYMBOLS ---
+                sym_roi, sym_scale = page.crop(symbol_x1, sy1, symbol_x2, sy2)
+                if debug is not None:
+                    debug.add_image(f"row{idx:02d}_sym_raw", sym_roi)
+
+                if is_blank(symbol_x1, sy1, symbol_x2, sy2):
+                    skipped.append("symbol")
+                else:
+                    heatmaps = {} if debug is not None else None
+                    with metrics.stage("match"):
+                        symbols = match_templates_in_row_multi_2d(
+                            sym_roi, bank.scaled(sym_scale).templates,
+                            self.match_thresh,
+                            mode=self.match_mode,
+                            heatmaps=heatmaps,
+                        )
+                    if debug is not None:
+                        debug.add_image(
+                            f"row{idx:02d}_sym_bw", prep_row_roi_2d(sym_roi),
+                        )
+                        for name, res in heatmaps.items():
+                            debug.add_heatmap(f"row{idx:02d}_heat_{name}", res)
+
+                # --- OCR CELLS (same y band, different x columns) ---
+                for field in OCR_FIELDS:
+                    x1, x2 = columns[field]
+                    if page_text is not None:
+                        text = page_text.text_in(x1 / w, y1 / h, x2 / w, y2 / h)
+                        if text:
+                            layer_texts[(idx, field)] = text
+                            text_sources[field] = "text_layer"
+                            continue
+
+                    cell_roi, _ = page.crop(x1, y1, x2, y2)
+                    if debug is not None:
+                        debug.add_image(f"row{idx:02d}_{field}_raw", cell_roi)
+                    if is_blank(x1, y1, x2, y2):
+                        skipped.append(field)
+                        continue
+                    cell = binarize_ocr_cell(cell_roi)
+                    ocr_batch[(idx, field)] = cell
+                    text_sources[field] = "ocr"
+                    if debug is not None:
+                        debug.add_image(f"row{idx:02d}_{field}_bw", cell)
+
+                # --- FILTER + PER-SYMBOL BEST SCORE ---
+                strong_symbols, symbol_scores = self.resolve_symbols(symbols)
+
+            results.append({
+                "row_index": idx,
+                "y1": int(y1),
+                "y2": int(y2),
+                "symbols_raw": symbols,
+                "strong_symbols": strong_symbols,
+                "unique_symbols": sorted(symbol_scores.keys()),
+                "symbol_scores": symbol_scores,
+                "skipped_rois": skipped,
+                "text_sources": text_sources,
+                "text_source": _text_source(text_sources),
+                # text fields are filled in after the page-wide OCR batch
+                "kuvaus": "",
+                "suoja": "",
+                "kaapeli": "",
+                "nro": ""
+            })
+
+        skipped_total = sum(len(r["skipped_rois"]) for r in results)
+        metrics.ROWS.inc(len(results))
+        metrics.SKIPPED_ROIS.inc(skipped_total)
+        metrics.TEXT_CELLS.inc(len(ocr_batch), source="ocr")
+        metrics.TEXT_CELLS.inc(len(layer_texts), source="text_layer")
+        logger.debug(
+            "rows=%d skipped_rois=%d ocr_cells=%d text_layer_cells=%d",
+            len(results), skipped_total, len(ocr_batch), len(layer_texts),
+        )
+
+        # --- OCR: one batch for the whole page, mapped back per row ---
+        t0 = time.perf_counter()
+        texts = {**ocr_cells(ocr_batch), **layer_texts}
+        if ocr_batch:
+            metrics.STAGE_SECONDS.observe(time.perf_counter() - t0, stage="ocr")
+            metrics.OCR_BATCH_CELLS.observe(len(ocr_batch))
+        for row_result in results:
+            idx = row_result["row_index"]
+            for field in OCR_FIELDS:
+                row_result[field] = texts.get((idx, field), "")
+
+        if debug is not None:
+            debug.add_json("rows", results)
+
+        return results
+
+
+def _text_source(text_sources: dict[str, str]) -> str:
+    """
+    One word for where a row's text came from.
+    """
+    used = set(text_sources.values())
+    if not used:
+        return "none"
+    return used.pop() if len(used) == 1 else "mixed"
 
-            symbols = match_templates_in_row_multi_2d(
-                sym_roi, templates, MATCH_THRESH
-            )
 
-            # --- OCR CELLS (same y band, different x columns) ---
-            suoja_roi = img[y1:y2, suoja_x1:suoja_x2]
-            suoja_text = ocr_suoja(suoja_roi)
-
-            kuvaus_roi = img[y1:y2, kuvaus_x1:kuvaus_x2]
-            kuvaus_text = ocr_suoja(kuvaus_roi)
-
-            kaapeli_roi = img[y1:y2, kaapeli_x1:kaapeli_x2]
-            kaapeli_text = ocr_suoja(kaapeli_roi)
-
-            nro_roi = img[y1:y2, nro_x1:nro_x2]
-            nro_text = ocr_suoja(nro_roi)
-            # --- FILTER + PER-SYMBOL BEST SCORE ---
-            ROW_SYMBOL_THRESH = 0.80
-            strong_symbols = [
-                d for d in symbols if d["score"] >= ROW_SYMBOL_THRESH
-            ]
-
-            name_best_score: dict[str, float] = defaultdict(float)
-            for det in strong_symbols:
-                name = det["name"]
-                score = float(det["score"])
-                if score > name_best_score[name]:
-                    name_best_score[name] = score
-
-            # After filling name_best_score from strong_symbols:
-
-            # Define groups of mutually-exclusive symbols.
-            # Within each group, keep only the one with highest score.
-            mutually_exclusive_groups = [
-                # Existing group: only one of these
-                ["JOHDONSUOJA 1-NAP", "JOHDONSUOJA 3-NAP"],
-
-                ["JOHDONSUOJA 1-NAP", "YHDISTELMASUOJA-2"],
-
-                # Group 2: YHDISTELMASUOJA / VIKAVIRTASUOJA variants
-                ["YHDISTELMASUOJA", "YHDISTELMASUOJA-2",
-                 "VIKAVIRTASUOJA", "VIKAVIRTASUOJA-2"],
-
-                # Group 3: 3-phase fuse variants
-                ["3-VAIHE KAHVAROKEALUSTA",
-                 "3-VAIHEINEN_TULPPAVAROKE",
-                 "3-VAIHEINEN_TULPPAVAROKE-2"],
-
-                # Group 4: contactors
-                ["1-NAP KONTAKTORI", "3-NAP KONTAKTORI"],
-            ]
-
-            for group in mutually_exclusive_groups:
-                # collect those that actually appeared in this row
-                present = [(name, name_best_score[name])
-                           for name in group
-                           if name in name_best_score]
-
-                if len(present) <= 1:
-                    continue  # nothing to resolve
-
-                # keep the one with highest score
-                best_name, _ = max(present, key=lambda x: x[1])
-                for name, _ in present:
-                    if name != best_name:
-                        del name_best_score[name]
-
-            symbol_scores = dict(name_best_score)
-            unique_symbols = sorted(name_best_score.keys())
-
-        row_result = {
-            "row_index": idx,
-            "y1": int(y1),
-            "y2": int(y2),
-            "symbols_raw": symbols,
-            "strong_symbols": strong_symbols,
-            "unique_symbols": unique_symbols,
-            "symbol_scores": symbol_scores,
-            "kuvaus": kuvaus_text,
-            "suoja": suoja_text,
-            "kaapeli": kaapeli_text,
-            "nro": nro_text
+def select_usable_rows(results: list[dict]) -> dict[int, dict]:
+    """
+    The "usable" rows of a classified page (only rows with symbols),
+    keyed by row index – the compact form used for export / debugging.
+    """
+    return {
+        r["row_index"]: {
+            "symbols": r["unique_symbols"],
+            "symbol_scores": r["symbol_scores"],
+            "kuvaus": r["kuvaus"],
+            "suoja": r["suoja"],
+            "kaapeli": r["kaapeli"],
+            "nro": r["nro"]
         }
-        results.append(row_result)
+        for r in results
+        if r["unique_symbols"]
+    }
 
-        # Only rows with at least one symbol go into usable_rows
-        if unique_symbols:
-            usable_rows[idx] = {
-                "symbols": unique_symbols,
-                "symbol_scores": symbol_scores,
-                "kuvaus": kuvaus_text,
-                "suoja": suoja_text,
-                "kaapeli": kaapeli_text,
-                "nro": nro_text
-            }
 
-    return results
+# Shared default instance; safe to use from any number of threads.
+_default_classifier = PageClassifier()
 
 
-def classify_page(page_path: str):
+def classify_page(page_path: str, debug_dir: Path | None = Path("debug_syms")):
     """
     Convenience wrapper: load a page from disk and classify all 11 rows.
+    Writes the debug bundle (crops, binarised strips, heatmaps) to
+    `debug_dir` (pass None to skip).
     """
     img = cv2.imread(str(page_path))
     if img is None:
         raise RuntimeError(f"Could not read page image: {page_path}")
-    return _classify_page_core(img)
+    return _default_classifier.classify(img, debug_dir)
 
 
-def classify_page_image(page_image: np.ndarray):
+def raster_regions() -> dict[str, tuple[float, float, float, float]]:
+    """
+    Page regions the default classifier reads (see
+    `PageClassifier.raster_regions`).
+    """
+    return _default_classifier.raster_regions()
+
+
+def classify_page_image(
+    page_image: np.ndarray | PageRegions,
+    bank: TemplateBank | None = None,
+    debug: DebugBundle | None = None,
+    page_text: PageText | None = None,
+):
     """
-    Entry point used by `extractor.py` – works on an in-memory BGR image.
+    Entry point used by `extractor.py` – works on an in-memory BGR image
+    or a region-rendered page, plus the page's text layer if it has one.
     """
-    return _classify_page_core(page_image)
+    classifier = _default_classifier if bank is None else PageClassifier(bank=bank)
+    return classifier.classify(page_image, debug=debug, page_text=page_text)
 
 
 if __name__ == "__main__":
@@ -480,5 +1067,5 @@ if __name__ == "__main__":
         #)
 
     print("\nUsable rows dict (for export):")
-    for idx, data in usable_rows.items():
+    for idx, data in select_usable_rows(rows).items():
         print(idx, "->", data)
@@ -0,0 +1,280 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+from .admission import ExtractionGate
+from .cache import cached_extract_from_pdf_path
+from .extractor import ExtractionResult
+
+logger = logging.getLogger(__name__)
+
+# Background workers consuming uploaded files, how long finished jobs
+# (and their files) are kept, and how often the janitor looks for them.
+JOB_WORKERS = max(1, int(os.getenv("JOB_WORKERS", "1")))
+JOB_TTL_SECONDS = float(os.getenv("JOB_TTL_SECONDS", str(24 * 3600)))
+JOB_CLEANUP_INTERVAL = float(os.getenv("JOB_CLEANUP_INTERVAL", "600"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          TEXT PRIMARY KEY,
+    filename    TEXT NOT NULL,
+    path        TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    pages_done  INTEGER NOT NULL DEFAULT 0,
+    pages_total INTEGER,
+    error       TEXT,
+    result      TEXT,
+    created_at  REAL NOT NULL,
+    updated_at  REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+"""
+
+
+class JobStore:
+    """
+    Durable job table (SQLite next to the uploaded files) plus a small
+    pool of worker threads that extract queued uploads.
+
+    Every operation opens its own connection, so the store can be used
+    from the event loop and the worker threads alike. Jobs that were
+    running when the process stopped are re-queued on `start`.
+    """
+
+    def __init__(
+        self,
+        upload_dir: Path,
+        workers: int = JOB_WORKERS,
+        ttl_seconds: float = JOB_TTL_SECONDS,
+        cleanup_interval: float = JOB_CLEANUP_INTERVAL,
+        gate: Optional[ExtractionGate] = None,
+    ):
+        self.upload_dir = Path(upload_dir)
+        self.db_path = self.upload_dir / "jobs.sqlite3"
+        self.workers = workers
+        self.ttl_seconds = ttl_seconds
+        self.cleanup_interval = cleanup_interval
+        # with a gate, jobs take its extraction slots like requests do
+        self.gate = gate
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self._wakeup = threading.Condition()
+        self._stopping = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self._last_cleanup = 0.0
+
+        self.upload_dir.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+        finally:
+            conn.close()
+
+    # ---------- public API ----------
+
+    def submit(self, job_id: str, filename: str, path: Path) -> None:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, filename, path, status, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, filename, str(path), QUEUED, now, now),
+            )
+        with self._wakeup:
+            self._wakeup.notify()
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """
+        Job status without the (possibly large) result payload.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, filename, status, pages_done, pages_total, error,"
+                " created_at, updated_at, finished_at FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        return {"job_id": job.pop("id"), **job}
+
+    def get_result(self, job_id: str) -> Optional[ExtractionResult]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT result FROM jobs WHERE id = ? AND status = ?",
+                (job_id, DONE),
+            ).fetchone()
+        if row is None or row["result"] is None:
+            return None
+        return ExtractionResult.model_validate_json(row["result"])
+
+    def queue_depth(self) -> int:
+        with self._connect() as conn:
+            (n,) = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)",
+                (QUEUED, RUNNING),
+            ).fetchone()
+        return int(n)
+
+    def start(self) -> None:
+        """
+        Start the worker threads. With a gate, call it from the event loop
+        the gate is used on.
+        """
+        if self._threads:
+            return
+        if self.gate is not None:
+            self._loop = asyncio.get_running_loop()
+        self._stopping.clear()
+        with self._connect() as conn:
+            # whatever was running when we went down gets another go
+            conn.execute(
+                "UPDATE jobs SET status = ?, pages_done = 0, updated_at = ?"
+                " WHERE status = ?",
+                (QUEUED, time.time(), RUNNING),
+            )
+        for i in range(self.workers):
+            t = threading.Thread(
+                target=self._worker_loop, name=f"job-worker-{i}", daemon=True,
+            )
+            t.start()
+            self._threads.append(t)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stopping.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads.clear()
+
+    # ---------- worker side ----------
+
+    def _claim_next(self) -> Optional[sqlite3.Row]:
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT id, filename, path FROM jobs WHERE status = ?"
+                    " ORDER BY created_at LIMIT 1",
+                    (QUEUED,),
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?",
+                        (RUNNING, time.time(), row["id"]),
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return row
+
+    def _update(self, job_id: str, **fields) -> None:
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(
+                f"UPDATE jobs SET {columns} WHERE id = ?",
+                (*fields.values(), job_id),
+            )
+
+    def _run(self, job: sqlite3.Row) -> None:
+        job_id = job["id"]
+
+        def progress(done: int, total: int) -> None:
+            self._update(job_id, pages_done=done, pages_total=total)
+
+        args = (job["path"], job["filename"], None, progress)
+        try:
+            if self.gate is None:
+                result = cached_extract_from_pdf_path(*args)
+            else:
+                result = asyncio.run_coroutine_threadsafe(
+                    self.gate.run_background(cached_extract_from_pdf_path, *args),
+                    self._loop,
+                ).result()
+        except Exception as e:
+            logger.exception("Job %s failed", job_id)
+            self._update(
+                job_id, status=FAILED, error=str(e), finished_at=time.time(),
+            )
+            return
+
+        self._update(
+            job_id,
+            status=DONE,
+            result=result.model_dump_json(),
+            finished_at=time.time(),
+        )
+
+    def _worker_loop(self) -> None:
+        while not self._stopping.is_set():
+            self._maybe_cleanup()
+            try:
+                job = self._claim_next()
+            except sqlite3.Error:
+                logger.exception("Could not claim next job")
+                job = None
+
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(timeout=5.0)
+                continue
+
+            self._run(job)
+
+    # ---------- TTL cleanup ----------
+
+    def _maybe_cleanup(self) -> None:
+        now = time.time()
+        if now - self._last_cleanup < self.cleanup_interval:
+            return
+        self._last_cleanup = now
+        try:
+            self.cleanup(now)
+        except Exception:
+            logger.exception("Job cleanup failed")
+
+    def cleanup(self, now: Optional[float] = None) -> int:
+        """
+        Delete finished jobs older than the TTL, together with their
+        uploaded files. Returns the number of jobs removed.
+        """
+        cutoff = (now or time.time()) - self.ttl_seconds
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, path FROM jobs"
+                " WHERE status IN (?, ?) AND finished_at < ?",
+                (DONE, FAILED, cutoff),
+            ).fetchall()
+            for row in rows:
+                try:
+                    os.unlink(row["path"])
+                except FileNotFoundError:
+                    pass
+                conn.execute("DELETE FROM jobs WHERE id = ?", (row["id"],))
+        if rows:
+            logger.info("Removed %d expired jobs", len(rows))
+        return len(rows)
@@ -1,24 +1,78 @@
 # app/main.py
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, Response
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from pathlib import Path
-import shutil
 import uuid
-import base64
+import json
 import pdfplumber
-from typing import List
+from typing import List, Literal, Optional
 from pydantic import BaseModel
 
-from .extractor import extract_from_pdf_bytes, ExtractionResult
+from . import metrics
+from .admission import ExtractionGate, GateSaturated
+from .batch import (
+    BATCH_MAX_BYTES,
+    BATCH_MAX_DOCUMENTS,
+    BatchInput,
+    InvalidBatch,
+    discard_inputs,
+    expand_zip,
+    stream_batch,
+)
+from .cache import cached_extract_from_pdf_path, page_cache, result_cache
+from .debug_bundle import DebugBundle, DebugBundleStore
+from .documents import DocumentStore, SpooledUpload, spool_upload
+from .extractor import ExtractionResult, extract_from_pdf_path, shutdown_page_pool
+from .formats import available_media_types, encode_result, negotiate
+from .fullExtractionClass import get_template_bank
+from .jobs import DONE, FAILED, JobStore
+from .ocr import (
+    get_ocr_backend,
+    get_ocr_stats,
+    limit_tesseract_threads,
+    shutdown_ocr_pool,
+)
+from .streaming import NDJSON_MEDIA_TYPE, SSE_MEDIA_TYPE, stream_extraction
 
 UPLOAD_DIR = Path("/tmp/uploads")
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
+# Bounded executor + wait queue for the CPU-bound extraction work
+extraction_gate = ExtractionGate()
+# Durable background jobs for /upload/async
+job_store = JobStore(UPLOAD_DIR, gate=extraction_gate)
+# Upload spooling, and the PDFs served back by GET /documents/{id}
+document_store = DocumentStore()
+
+# ?debug= on /extract: write the debug bundle to a per-request directory
+# under DEBUG_DIR, or return it as a zip
+debug_store = DebugBundleStore()
+DebugMode = Literal["dir", "zip"]
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the template bank once at startup so the first request
+    # doesn't pay for reading + preparing every template PNG.
+    get_template_bank()
+    limit_tesseract_threads()
+    job_store.start()
+    yield
+    job_store.stop()
+    extraction_gate.shutdown()
+    shutdown_page_pool()
+    shutdown_ocr_pool()
+    get_ocr_backend().close()
+
+
 app = FastAPI(
     title="SinceAI PDF API",
     description="API for uploading and extracting data from PDF documents",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 # CORS configuration - allow all origins
@@ -28,6 +82,8 @@ app.add_middleware(
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    # pdf.js reads these when it fetches /documents/{id} in ranges
+    expose_headers=["Accept-Ranges", "Content-Range", "Content-Length", "ETag"],
 )
 
 
@@ -118,6 +174,113 @@ def extract_pdf_data(path: Path) -> ExtractedData:
     )
 
 
+def _result_media_type(request: Request) -> str:
+    """
+    The ExtractionResult format the client's Accept header asks for: JSON
+    unless it asks for a compact one (see formats.py). Checked before
+    extracting, so an unservable request fails fast with 406.
+    """
+    media_type = negotiate(request.headers.get("accept"))
+    if media_type is None:
+        raise HTTPException(
+            status_code=406,
+            detail=f"Available formats: {', '.join(available_media_types())}",
+        )
+    return media_type
+
+
+def _result_response(
+    result: ExtractionResult,
+    media_type: str,
+    headers: Optional[dict] = None,
+) -> Response:
+    """
+    An ExtractionResult as `media_type`, serialised here so the time it
+    takes shows up in the "serialize" stage.
+    """
+    with metrics.stage("serialize"):
+        body = encode_result(result, media_type)
+    return Response(
+        body, media_type=media_type, headers={**(headers or {}), "Vary": "Accept"},
+    )
+
+
+def _saturated(e: GateSaturated) -> HTTPException:
+    return HTTPException(
+        status_code=e.status_code,
+        detail=str(e),
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
+def _check_pdf_filename(file: UploadFile) -> None:
+    if not file.filename:
+        raise HTTPException(status_code=400, detail="No filename provided")
+
+    if not file.filename.lower().endswith(".pdf"):
+        raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+
+
+async def _spool_upload(file: UploadFile, check_capacity: bool = True) -> SpooledUpload:
+    """
+    Validate a PDF upload and copy it to a spool file in chunks, off the
+    event loop, so it is never held in memory as a whole. Extraction
+    uploads are refused before that when the extraction pool is
+    saturated.
+    """
+    _check_pdf_filename(file)
+
+    try:
+        if check_capacity:
+            extraction_gate.check_capacity()
+        return await run_in_threadpool(document_store.spool, file.file)
+    except GateSaturated as e:
+        raise _saturated(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to read file: {str(e)}")
+    finally:
+        await file.close()
+
+
+async def _extract_upload(
+    file: UploadFile,
+    debug: Optional[DebugBundle] = None,
+    keep: bool = False,
+) -> tuple[ExtractionResult, Optional[str]]:
+    """
+    Shared body of the extraction endpoints: validate and spool the
+    upload, then extract it by path on the bounded extraction pool, off
+    the event loop. Debug runs skip the result cache, so every page is
+    really processed. With `keep` the PDF goes to the document store and
+    its id is returned; otherwise the spool file is removed.
+    """
+    upload = await _spool_upload(file)
+    try:
+        # Run extraction
+        if debug is None:
+            fn = cached_extract_from_pdf_path
+            args = (str(upload.path), file.filename, upload.sha256)
+        else:
+            fn = extract_from_pdf_path
+            args = (str(upload.path), file.filename, None, None, None, debug)
+        try:
+            result = await extraction_gate.run(fn, *args)
+        except GateSaturated as e:
+            raise _saturated(e)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Extraction failed: {str(e)}")
+
+        document_id = document_store.keep(upload) if keep else None
+    finally:
+        upload.discard()
+
+    return result, document_id
+
+
+def _document_url(document_id: str) -> str:
+    return f"/documents/{document_id}"
+
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -127,131 +290,303 @@ async def root():
 @app.get("/health")
 async def health():
     """Health check for Render"""
-    return {"status": "healthy"}
+    return {
+        "status": "healthy",
+        "extraction": extraction_gate.snapshot(),
+        "jobs_pending": await run_in_threadpool(job_store.queue_depth),
+        "result_cache": result_cache.stats(),
+        "page_cache": page_cache.stats(),
+        "ocr": get_ocr_stats(),
+    }
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Per-stage latency histograms and page / row counters in the
+    Prometheus text format.
+    """
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 
 @app.post("/upload")
 async def upload_pdf(file: UploadFile = File(...)):
     """
-    Upload a PDF file and return it as base64 for frontend display.
+    Upload a PDF file for frontend display. Returns the URL it is served
+    from (GET /documents/{id}) rather than the file itself.
     """
-    if not file.filename:
-        raise HTTPException(status_code=400, detail="No filename provided")
-
-    if not file.filename.lower().endswith(".pdf"):
-        raise HTTPException(status_code=400, detail="Only PDF files are allowed")
-
-    # Read the PDF content
+    upload = await _spool_upload(file, check_capacity=False)
     try:
-        pdf_content = await file.read()
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to read file: {str(e)}")
+        document_id = document_store.keep(upload)
     finally:
-        await file.close()
-
-    # Convert to base64 data URL for frontend
-    pdf_base64 = base64.b64encode(pdf_content).decode('utf-8')
-    data_url = f"data:application/pdf;base64,{pdf_base64}"
+        upload.discard()
 
     return JSONResponse({
         "status": "success",
         "filename": file.filename,
-        "pdf": data_url
+        "document_id": document_id,
+        "pdf": _document_url(document_id),
     })
 
 
+@app.api_route("/documents/{document_id}", methods=["GET", "HEAD"])
+async def get_document(request: Request, document_id: str):
+    """
+    A PDF stored by /upload or /extract-with-pdf, streamed from disk.
+    Honours Range (and If-Range) so pdf.js can load it lazily, and
+    If-None-Match: documents never change, the ETag is their SHA-256.
+    """
+    path = document_store.path(document_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Unknown document")
+
+    etag = document_store.etag(document_id)
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=86400"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match.strip() == "*" or etag in (
+        tag.strip().removeprefix("W/") for tag in if_none_match.split(",")
+    ):
+        return Response(status_code=304, headers=headers)
+
+    return FileResponse(path, media_type="application/pdf", headers=headers)
+
+
 @app.post("/upload/async")
 async def upload_pdf_async(file: UploadFile = File(...)):
     """
     Upload a PDF file for async processing.
-    Returns immediately with a job ID (for future implementation with queue).
+    Returns immediately with a job ID; poll GET /jobs/{job_id} for progress
+    and fetch the extraction from GET /jobs/{job_id}/result when done.
     """
-    if not file.filename:
-        raise HTTPException(status_code=400, detail="No filename provided")
+    _check_pdf_filename(file)
 
-    if not file.filename.lower().endswith(".pdf"):
-        raise HTTPException(status_code=400, detail="Only PDF files are allowed")
-
-    # Create safe unique filename
+    # spooled next to the job table, off the event loop; the job store
+    # deletes the file with the job
     uid = uuid.uuid4().hex
-    dest = UPLOAD_DIR / f"{uid}_{file.filename}"
-
     try:
-        with open(dest, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        upload = await run_in_threadpool(spool_upload, file.file, UPLOAD_DIR)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to read file: {str(e)}")
     finally:
         await file.close()
 
-    # In production, you'd add this to a job queue (Redis, Celery, etc.)
-    # For now, just return the job ID
+    try:
+        await run_in_threadpool(job_store.submit, uid, file.filename, upload.path)
+    except BaseException:
+        upload.discard()
+        raise
+
     return JSONResponse({
         "status": "accepted",
         "job_id": uid,
         "filename": file.filename,
+        "status_url": f"/jobs/{uid}",
+        "result_url": f"/jobs/{uid}/result",
         "message": "PDF uploaded. Processing will be done asynchronously."
     }, status_code=202)
 
 
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    """
+    Status and progress (pages done / total) of an async extraction job.
+    """
+    job = await run_in_threadpool(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job
+
+
+@app.get("/jobs/{job_id}/result", response_model=ExtractionResult)
+async def job_result(request: Request, job_id: str):
+    """
+    ExtractionResult of a finished async job (format negotiated like
+    /extract).
+    """
+    media_type = _result_media_type(request)
+    job = await run_in_threadpool(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    if job["status"] == FAILED:
+        raise HTTPException(status_code=500, detail=f"Extraction failed: {job['error']}")
+    if job["status"] != DONE:
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+
+    result = await run_in_threadpool(job_store.get_result, job_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Job result expired")
+    return _result_response(result, media_type)
+
+
 @app.post("/extract", response_model=ExtractionResult)
-async def extract_pdf(file: UploadFile = File(...)):
+async def extract_pdf(
+    request: Request,
+    file: UploadFile = File(...),
+    debug: Optional[DebugMode] = Query(None),
+):
     """
     Upload a PDF file and extract symbols + Suoja values using CV and OCR.
     Returns structured JSON with all extracted data.
+    Answers 429/503 with Retry-After when the extraction pool is saturated.
+
+    Send `Accept: application/vnd.extraction.columnar+json` (or
+    `application/msgpack`, with msgpack installed) for a compact columnar
+    layout with symbol names interned; see formats.py.
+
+    `?debug=dir` also writes every row's crops, binarised strips and match
+    heatmaps to a per-request directory under DEBUG_DIR (its bundle id in
+    the X-Debug-Bundle header); `?debug=zip` returns those plus
+    result.json as a zip instead.
     """
-    if not file.filename:
-        raise HTTPException(status_code=400, detail="No filename provided")
+    # ?debug=zip answers with the bundle, whatever the Accept header says
+    media_type = _result_media_type(request) if debug != "zip" else None
+    if debug is None:
+        result, _ = await _extract_upload(file)
+        return _result_response(result, media_type)
+
+    if debug == "dir":
+        bundle_id, bundle = await run_in_threadpool(debug_store.create)
+    else:
+        bundle_id, bundle = uuid.uuid4().hex, DebugBundle()
+    try:
+        result, _ = await _extract_upload(file, bundle)
+        bundle.add_json("result", result.model_dump())
+    except BaseException:
+        bundle.close()
+        raise
+
+    if debug == "dir":
+        return _result_response(
+            result, media_type, headers={"X-Debug-Bundle": bundle_id},
+        )
+    return StreamingResponse(
+        bundle.iter_zip(),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f'attachment; filename="debug_{bundle_id}.zip"',
+        },
+    )
 
-    if not file.filename.lower().endswith(".pdf"):
-        raise HTTPException(status_code=400, detail="Only PDF files are allowed")
 
-    # Read the PDF content
+@app.post("/extract/stream")
+async def extract_pdf_stream(request: Request, file: UploadFile = File(...)):
+    """
+    Streaming variant of /extract: every page is sent as soon as it is
+    classified, then a summary record with total_pages / total_rows.
+
+    NDJSON by default (one JSON record per line); Server-Sent Events when
+    the client accepts text/event-stream. Records carry a "type" of
+    "start", "page", "summary" or "error". Pages arrive in completion
+    order, so use their page_number.
+    """
+    upload = await _spool_upload(file)
+
+    accept = request.headers.get("accept", "")
+    media_type = SSE_MEDIA_TYPE if SSE_MEDIA_TYPE in accept else NDJSON_MEDIA_TYPE
+    return StreamingResponse(
+        stream_extraction(extraction_gate, upload, file.filename, media_type),
+        media_type=media_type,
+        # don't let proxies sit on the records
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _spool_batch_file(file: UploadFile, budget_bytes: int) -> List[BatchInput]:
+    """
+    One file of a batch upload as batch inputs: a PDF is spooled as it
+    is, a zip archive is unpacked into its PDFs, anything else becomes a
+    rejected input (reported in the stream, not fatal).
+    """
+    name = file.filename or ""
+    if not name.lower().endswith((".pdf", ".zip")):
+        await file.close()
+        return [BatchInput(name, error="Only PDF files are allowed")]
+
     try:
-        pdf_bytes = await file.read()
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to read file: {str(e)}")
+        upload = await run_in_threadpool(document_store.spool, file.file)
     finally:
         await file.close()
+    if name.lower().endswith(".pdf"):
+        return [BatchInput(name, upload)]
 
-    # Run extraction
     try:
-        result = extract_from_pdf_bytes(pdf_bytes, file.filename)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Extraction failed: {str(e)}")
-
-    return result
+        return await run_in_threadpool(
+            expand_zip, upload, document_store.spool, budget_bytes,
+        )
+    finally:
+        upload.discard()
 
 
-@app.post("/extract-with-pdf")
-async def extract_pdf_with_base64(file: UploadFile = File(...)):
+@app.post("/extract/batch")
+async def extract_batch(request: Request, files: List[UploadFile] = File(...)):
     """
-    Upload a PDF, extract data, and return both the extraction result and the PDF as base64.
-    Useful for frontend to display PDF alongside extracted data.
+    Extract several PDFs in one request: upload them as repeated `files`
+    fields, or one zip archive of PDFs.
+
+    All pages of all documents share one work queue across the page
+    workers (EXTRACT_WORKERS), taking pages from the document with the
+    fewest left first, so small documents aren't held up by large ones.
+    Streams NDJSON (or Server-Sent Events with Accept: text/event-stream):
+    a "start" record listing the documents with their index, then one
+    "result" record (an ExtractionResult) or "error" record per document
+    as soon as it finishes, then a "summary". A document that fails only
+    produces its own error record; an "error" record without an index
+    means the batch itself failed.
     """
-    if not file.filename:
-        raise HTTPException(status_code=400, detail="No filename provided")
-
-    if not file.filename.lower().endswith(".pdf"):
-        raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+    try:
+        extraction_gate.check_capacity()
+    except GateSaturated as e:
+        for file in files:
+            await file.close()
+        raise _saturated(e)
 
-    # Read the PDF content
+    inputs: List[BatchInput] = []
     try:
-        pdf_bytes = await file.read()
+        for file in files:
+            spooled = sum(i.upload.size for i in inputs if i.upload is not None)
+            inputs.extend(await _spool_batch_file(file, BATCH_MAX_BYTES - spooled))
+        if len(inputs) > BATCH_MAX_DOCUMENTS:
+            raise InvalidBatch(
+                f"At most {BATCH_MAX_DOCUMENTS} documents per batch", status_code=413,
+            )
+        if sum(i.upload.size for i in inputs if i.upload is not None) > BATCH_MAX_BYTES:
+            raise InvalidBatch(
+                f"At most {BATCH_MAX_BYTES} bytes per batch", status_code=413,
+            )
+    except InvalidBatch as e:
+        discard_inputs(inputs)
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
+        discard_inputs(inputs)
         raise HTTPException(status_code=500, detail=f"Failed to read file: {str(e)}")
     finally:
-        await file.close()
-
-    # Run extraction
-    try:
-        result = extract_from_pdf_bytes(pdf_bytes, file.filename)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Extraction failed: {str(e)}")
+        for file in files:
+            await file.close()
+
+    accept = request.headers.get("accept", "")
+    media_type = SSE_MEDIA_TYPE if SSE_MEDIA_TYPE in accept else NDJSON_MEDIA_TYPE
+    return StreamingResponse(
+        stream_batch(extraction_gate, inputs, media_type),
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-    # Convert PDF to base64 for frontend display
-    pdf_base64 = base64.b64encode(pdf_bytes).decode('utf-8')
-    data_url = f"data:application/pdf;base64,{pdf_base64}"
 
-    return JSONResponse({
-        "extraction": result.model_dump(),
-        "pdf": data_url
-    })
+@app.post("/extract-with-pdf")
+async def extract_pdf_with_document(file: UploadFile = File(...)):
+    """
+    Upload a PDF, extract data, and return the extraction result together
+    with the URL the PDF is served from (GET /documents/{id}).
+    Useful for frontend to display PDF alongside extracted data.
+    """
+    result, document_id = await _extract_upload(file, keep=True)
+
+    # splice the model's own JSON in rather than dumping it to dicts
+    # first and encoding those again
+    with metrics.stage("serialize"):
+        body = (
+            '{"extraction":' + result.model_dump_json()
+            + ',"document_id":' + json.dumps(document_id)
+            + ',"pdf":' + json.dumps(_document_url(document_id)) + "}"
+        )
+    return Response(body, media_type="application/json")
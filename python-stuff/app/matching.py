@@ -0,0 +1,310 @@
+"""
+Alternative strategies for computing template-matching response maps.
+
+All functions here take a binarised row strip (ink = 255) and a prepared
+template, and return a TM_CCOEFF_NORMED response map of the same shape
+`cv2.matchTemplate` would produce, so peak extraction / NMS downstream
+stays the same for every mode.
+"""
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+# --- coarse-to-fine ("pyramid") matching ---
+# number of 2× downsampling steps for the coarse search
+PYRAMID_LEVELS = int(os.getenv("PYRAMID_LEVELS", "1"))
+# coarse candidates are kept down to (thresh - PYRAMID_SLACK): blurring
+# thin line art at low resolution lowers its correlation scores
+PYRAMID_SLACK = float(os.getenv("PYRAMID_SLACK", "0.15"))
+# templates smaller than this (in coarse pixels) are matched exhaustively
+PYRAMID_MIN_TEMPLATE = 8
+# extra coarse pixels re-scored around every candidate region
+PYRAMID_PAD = 2
+
+# response value for positions the coarse pass ruled out
+NO_MATCH = -1.0
+
+
+def downsample(img: np.ndarray, levels: int) -> np.ndarray:
+    """
+    Area-average `img` by 2**levels in both directions.
+    """
+    for _ in range(levels):
+        h, w = img.shape[:2]
+        img = cv2.resize(
+            img, (max(1, w // 2), max(1, h // 2)),
+            interpolation=cv2.INTER_AREA,
+        )
+    return img
+
+
+def pyramid_response(
+    bw_row: np.ndarray,
+    tpl: np.ndarray,
+    thresh: float,
+    levels: int = PYRAMID_LEVELS,
+    slack: float = PYRAMID_SLACK,
+) -> np.ndarray:
+    """
+    Coarse-to-fine TM_CCOEFF_NORMED.
+
+    1. match the downsampled template against the downsampled strip,
+    2. keep coarse positions scoring at least `thresh - slack`,
+    3. re-score only the full-resolution windows around those candidate
+       regions; every other position is set to NO_MATCH.
+
+    Inside the windows the values are what the exhaustive search computes
+    (up to float rounding), so any peak found by both is the same.
+    """
+    H, W = bw_row.shape
+    th, tw = tpl.shape
+    scale = 2 ** levels
+
+    small_tpl = downsample(tpl, levels)
+    small_row = downsample(bw_row, levels)
+    sth, stw = small_tpl.shape
+    if (
+        levels <= 0
+        or min(sth, stw) < PYRAMID_MIN_TEMPLATE
+        or sth > small_row.shape[0]
+        or stw > small_row.shape[1]
+    ):
+        return cv2.matchTemplate(bw_row, tpl, cv2.TM_CCOEFF_NORMED)
+
+    coarse = cv2.matchTemplate(small_row, small_tpl, cv2.TM_CCOEFF_NORMED)
+    candidates = (coarse >= thresh - slack).astype(np.uint8)
+
+    res = np.full((H - th + 1, W - tw + 1), NO_MATCH, np.float32)
+    if not candidates.any():
+        return res
+
+    num, _, stats, _ = cv2.connectedComponentsWithStats(
+        candidates, connectivity=8,
+    )
+    rh, rw = res.shape
+    for lab in range(1, num):
+        cx = stats[lab, cv2.CC_STAT_LEFT]
+        cy = stats[lab, cv2.CC_STAT_TOP]
+        cw = stats[lab, cv2.CC_STAT_WIDTH]
+        ch = stats[lab, cv2.CC_STAT_HEIGHT]
+
+        # candidate region → full-resolution response window
+        x0 = max(0, (cx - PYRAMID_PAD) * scale)
+        y0 = max(0, (cy - PYRAMID_PAD) * scale)
+        x1 = min(rw, (cx + cw + PYRAMID_PAD) * scale)
+        y1 = min(rh, (cy + ch + PYRAMID_PAD) * scale)
+        if x1 <= x0 or y1 <= y0:
+            continue
+
+        window = bw_row[y0 : y1 + th - 1, x0 : x1 + tw - 1]
+        res[y0:y1, x0:x1] = cv2.matchTemplate(
+            window, tpl, cv2.TM_CCOEFF_NORMED,
+        )
+
+    return res
+
+
+# --- batched frequency-domain matching ---
+# templates transformed per FFT batch (bounds the (K, Hp, Wp) work arrays)
+FFT_BATCH = max(1, int(os.getenv("FFT_BATCH", "32")))
+# strip FFT sizes are rounded up to this grid, so the differently sized
+# rows of a page share the same precomputed template spectra
+FFT_GRID = 32
+# number of (template set, FFT size) spectra kept around
+FFT_CACHE_SIZE = 16
+
+
+class SpectralTemplates:
+    """
+    A template set, zero-mean and zero-padded to one FFT size, with its
+    spectra precomputed. Keeps references to the source arrays so the
+    identity-based cache key below stays valid while it is cached.
+    """
+
+    def __init__(self, templates: dict[str, np.ndarray], fft_shape: tuple[int, int]):
+        self.sources = list(templates.values())
+        self.names = list(templates.keys())
+        self.shapes = [tpl.shape for tpl in self.sources]
+        self.fft_shape = fft_shape
+
+        Hp, Wp = fft_shape
+        self.norms = np.empty(len(self.sources), np.float64)
+        # single precision is plenty for the correlation itself (and
+        # twice as fast); window statistics below stay in float64
+        self.spectra = np.empty(
+            (len(self.sources), Hp, Wp // 2 + 1), np.complex64,
+        )
+        padded = np.zeros(fft_shape, np.float32)
+        for k, tpl in enumerate(self.sources):
+            th, tw = tpl.shape
+            t = tpl.astype(np.float64)
+            t -= t.mean()
+            self.norms[k] = np.sqrt((t * t).sum())
+            padded[:] = 0.0
+            padded[:th, :tw] = t
+            # correlation = convolution with the conjugate spectrum
+            self.spectra[k] = np.conj(np.fft.rfft2(padded))
+
+
+_spectra_cache: OrderedDict = OrderedDict()
+_spectra_lock = threading.Lock()
+
+
+def spectral_templates(
+    templates: dict[str, np.ndarray],
+    fft_shape: tuple[int, int],
+) -> SpectralTemplates:
+    key = (fft_shape, tuple((name, id(tpl)) for name, tpl in templates.items()))
+    with _spectra_lock:
+        spectral = _spectra_cache.get(key)
+        if spectral is not None:
+            _spectra_cache.move_to_end(key)
+            return spectral
+
+    spectral = SpectralTemplates(templates, fft_shape)
+    with _spectra_lock:
+        _spectra_cache[key] = spectral
+        while len(_spectra_cache) > FFT_CACHE_SIZE:
+            _spectra_cache.popitem(last=False)
+    return spectral
+
+
+def _fft_shape(H: int, W: int) -> tuple[int, int]:
+    def up(n: int) -> int:
+        return -(-n // FFT_GRID) * FFT_GRID
+    return cv2.getOptimalDFTSize(up(H)), cv2.getOptimalDFTSize(up(W))
+
+
+def _normalize_ccoeff(num: np.ndarray, denom: np.ndarray) -> np.ndarray:
+    """
+    OpenCV's TM_CCOEFF_NORMED normalisation, including its handling of
+    flat windows (zero variance → 0, rounding just past ±1 → ±1).
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = (num / denom).astype(np.float32)
+
+    # |num| >= denom (incl. 0/0 on blank windows) is rare: fix up sparsely
+    over = ~(np.abs(out) < 1.0)
+    if over.any():
+        n, d = num[over], denom[over]
+        out[over] = np.where(np.abs(n) < d * 1.125, np.sign(n), 0.0)
+    return out
+
+
+def batched_fft_responses(
+    bw_row: np.ndarray,
+    templates: dict[str, np.ndarray],
+) -> dict[str, np.ndarray]:
+    """
+    TM_CCOEFF_NORMED of every template against one strip in a batch.
+
+    The strip's spectrum and its integral images (sliding window sum and
+    sum of squares) are computed once; each template contributes one
+    spectrum product, batched with NumPy. Numerator and window variance
+    follow OpenCV's definition, so the maps agree with `cv2.matchTemplate`
+    up to float rounding. All templates must fit inside the strip.
+    """
+    if not templates:
+        return {}
+
+    H, W = bw_row.shape
+    fft_shape = _fft_shape(H, W)
+    spectral = spectral_templates(templates, fft_shape)
+
+    img = bw_row.astype(np.float64)
+    padded = np.zeros(fft_shape, np.float32)
+    padded[:H, :W] = bw_row
+    img_spectrum = np.fft.rfft2(padded).astype(np.complex64)
+
+    # integral images: window sums for any template size in O(1)
+    ii_sum, ii_sq = cv2.integral2(img, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+    window_var: dict[tuple[int, int], np.ndarray] = {}
+
+    def variance_times_n(th: int, tw: int) -> np.ndarray:
+        stats = window_var.get((th, tw))
+        if stats is None:
+            rh, rw = H - th + 1, W - tw + 1
+
+            def window(ii: np.ndarray) -> np.ndarray:
+                return (
+                    ii[th : th + rh, tw : tw + rw] - ii[:rh, tw : tw + rw]
+                    - ii[th : th + rh, :rw] + ii[:rh, :rw]
+                )
+
+            s1 = window(ii_sum)
+            stats = np.maximum(window(ii_sq) - s1 * s1 / (th * tw), 0.0)
+            window_var[(th, tw)] = stats
+        return stats
+
+    responses: dict[str, np.ndarray] = {}
+    for start in range(0, len(spectral.names), FFT_BATCH):
+        stop = start + FFT_BATCH
+        corr = np.fft.irfft2(
+            spectral.spectra[start:stop] * img_spectrum[None],
+            s=fft_shape,
+            axes=(-2, -1),
+        )
+        for k in range(start, min(stop, len(spectral.names))):
+            th, tw = spectral.shapes[k]
+            num = corr[k - start, : H - th + 1, : W - tw + 1]
+            denom = np.sqrt(variance_times_n(th, tw)) * spectral.norms[k]
+            responses[spectral.names[k]] = _normalize_ccoeff(num, denom)
+
+    return responses
+
+
+if __name__ == "__main__":
+    # Compare match modes on reference pages:
+    #   python -m app.matching page_008.png [more pages...]
+    import sys
+    import time
+
+    from .fullExtractionClass import (
+        MATCH_MODES,
+        MATCH_THRESH,
+        ROW_MARGIN_BOTTOM,
+        ROW_MARGIN_TOP,
+        ROW_SYMBOL_THRESH,
+        PageClassifier,
+        get_template_bank,
+        match_templates_in_row_multi_2d,
+    )
+
+    templates = get_template_bank().templates
+    classifier = PageClassifier()
+    timings = {mode: 0.0 for mode in MATCH_MODES}
+    rows = mismatched = 0
+
+    for page_path in sys.argv[1:]:
+        page = cv2.imread(page_path)
+        if page is None:
+            raise SystemExit(f"Could not read page image: {page_path}")
+        h, w = page.shape[:2]
+        x1, x2 = classifier.column_ranges(w)["symbol"]
+
+        for idx, (y1, y2) in enumerate(classifier.row_bands(h), start=1):
+            roi = page[y1 + ROW_MARGIN_TOP : y2 - ROW_MARGIN_BOTTOM, x1:x2]
+            strong = {}
+            for mode in MATCH_MODES:
+                t0 = time.perf_counter()
+                hits = match_templates_in_row_multi_2d(
+                    roi, templates, MATCH_THRESH, mode=mode,
+                )
+                timings[mode] += time.perf_counter() - t0
+                strong[mode] = [
+                    (d["name"], d["x"], d["y"])
+                    for d in hits if d["score"] >= ROW_SYMBOL_THRESH
+                ]
+            rows += 1
+            if len({tuple(v) for v in strong.values()}) > 1:
+                mismatched += 1
+                print(f"{page_path} row {idx:02d}: {strong}")
+
+    for mode, seconds in timings.items():
+        print(f"{mode:>10}: {seconds:.3f}s")
+    print(f"rows with differing strong hits: {mismatched}/{rows}")
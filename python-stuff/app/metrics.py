@@ -0,0 +1,262 @@
+"""
+Process-wide pipeline metrics, exposed in the Prometheus text format on
+GET /metrics.
+
+Recording a sample is a clock read plus a few additions under a lock;
+nothing is formatted until somebody scrapes. METRICS=0 turns every
+counter and span into a no-op.
+
+Page workers run in their own processes: they hand their samples back
+with every page (`REGISTRY.drain()` there, `REGISTRY.merge()` here), so
+/metrics covers the whole pipeline.
+"""
+from __future__ import annotations
+
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+METRICS_ENABLED = os.getenv("METRICS", "1") != "0"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# upper bounds in seconds: from a single template match to a whole document
+DEFAULT_BUCKETS: tuple[float, ...] = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """
+    Monotonic counter, one series per combination of label values.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def _key(self, labels: dict) -> tuple[str, ...]:
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    # ---------- transfer between processes ----------
+
+    def drain(self) -> dict:
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values: dict) -> None:
+        with self._lock:
+            for key, value in values.items():
+                self._values[key] = self._values.get(key, 0.0) + value
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}"
+            for key, v in values
+        ]
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram, one series per combination of label
+    values. Durations in seconds unless `buckets` say otherwise.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # label values -> [per-bucket counts (+Inf last), sum]
+        self._series: dict[tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        if not METRICS_ENABLED:
+            return
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """
+        Observe the wall time of the `with` block.
+        """
+        if not METRICS_ENABLED:
+            yield
+            return
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    # ---------- transfer between processes ----------
+
+    def drain(self) -> dict:
+        with self._lock:
+            series, self._series = self._series, {}
+        return series
+
+    def merge(self, series: dict) -> None:
+        with self._lock:
+            for key, (counts, total) in series.items():
+                mine = self._series.get(key)
+                if mine is None:
+                    self._series[key] = [list(counts), total]
+                    continue
+                for i, c in enumerate(counts):
+                    mine[0][i] += c
+                mine[1] += total
+
+    def render(self) -> list[str]:
+        with self._lock:
+            series = sorted((k, (list(c), s)) for k, (c, s) in self._series.items())
+        lines = []
+        for key, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} "
+                    f"{cumulative}"
+                )
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, Counter | Histogram] = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def drain(self) -> dict:
+        """
+        Take (and reset) everything recorded so far, for `merge` in
+        another process. Picklable.
+        """
+        return {name: m.drain() for name, m in self._metrics.items()}
+
+    def merge(self, samples: dict) -> None:
+        for name, values in samples.items():
+            metric = self._metrics.get(name)
+            if metric is not None and values:
+                metric.merge(values)
+
+
+REGISTRY = Registry()
+
+# ---------- pipeline metrics ----------
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "extract_stage_seconds",
+    "Time spent per pipeline stage: rasterize, color_convert, text_layer "
+    "and classify per page, template_load per template set, match per row, "
+    "ocr per page batch, serialize per response.",
+    ("stage",),
+))
+TEMPLATE_MATCH_SECONDS = REGISTRY.register(Histogram(
+    "extract_template_match_seconds",
+    "Response map and peak extraction of one template on one row "
+    "(MATCH_MODE=fft: without the shared batch transform).",
+    ("template",),
+))
+OCR_BATCH_CELLS = REGISTRY.register(Histogram(
+    "extract_ocr_batch_cells",
+    "Text cells per page OCR batch (the batch itself is timed as the "
+    "\"ocr\" stage).",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500),
+))
+PAGES = REGISTRY.register(Counter(
+    "extract_pages_total",
+    "Pages extracted, by where the result came from.",
+    ("source",),
+))
+ROWS = REGISTRY.register(Counter(
+    "extract_rows_total",
+    "Table rows classified.",
+))
+TEXT_CELLS = REGISTRY.register(Counter(
+    "extract_text_cells_total",
+    "Text cells read, by source (text_layer or ocr).",
+    ("source",),
+))
+SKIPPED_ROIS = REGISTRY.register(Counter(
+    "extract_skipped_rois_total",
+    "Symbol strips and text cells the ink prefilter found blank.",
+))
+
+
+def stage(name: str):
+    """
+    `with stage("rasterize"): ...` – time one pipeline stage.
+    """
+    return STAGE_SECONDS.time(stage=name)
+
+
+def render() -> str:
+    return REGISTRY.render()
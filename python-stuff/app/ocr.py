@@ -0,0 +1,387 @@
+from __future__ import annotations
+
+import logging
+import os
+import math
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Hashable, Optional
+
+import cv2
+import numpy as np
+import pytesseract
+
+logger = logging.getLogger(__name__)
+
+# Point to your local Tesseract installation
+TESSERACT_CMD_ENV = os.getenv("TESSERACT_CMD")  # optional override
+
+if TESSERACT_CMD_ENV:
+    pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD_ENV
+elif os.name == "nt":
+    win_default = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+    if os.path.exists(win_default):
+        pytesseract.pytesseract.tesseract_cmd = win_default
+    # else: fall back to whatever is in PATH
+
+# Which OCR engine to use: "subprocess" (pytesseract, one tesseract process
+# per call) or "tesserocr" (long-lived in-process engines, one per thread).
+OCR_BACKEND_ENV = os.getenv("OCR_BACKEND", "subprocess").strip().lower()
+# Tesseract language; None keeps tesseract's own default ("eng").
+OCR_LANG = os.getenv("OCR_LANG") or None
+
+# OCR_BATCH=0 falls back to one tesseract call per cell.
+OCR_BATCH = os.getenv("OCR_BATCH", "1") != "0"
+
+# Tesseract's txt renderer terminates every page with this separator.
+PAGE_SEPARATOR = "\f"
+
+# Concurrent OCR: a page's cells are recognised on one process-wide pool
+# of OCR_THREADS threads (0 or 1 = in the calling thread). Every page and
+# request in the process shares that pool, so it is the process' whole
+# OCR budget; page workers split it between them (see `set_ocr_threads`).
+OCR_THREADS = int(os.getenv("OCR_THREADS", str(os.cpu_count() or 1)))
+# a batched tesseract run is not split into chunks smaller than this
+# (every run pays the process start and language model load)
+OCR_CHUNK_MIN_CELLS = max(1, int(os.getenv("OCR_CHUNK_MIN_CELLS", "8")))
+
+
+def binarize_ocr_cell(roi: np.ndarray) -> np.ndarray:
+    """
+    Simple Otsu binarisation (ink = black) applied to every OCR cell.
+    Takes BGR or already-grayscale cells.
+    """
+    gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY) if roi.ndim == 3 else roi
+    _, bw = cv2.threshold(
+        gray, 0, 255,
+        cv2.THRESH_BINARY + cv2.THRESH_OTSU,
+    )
+    return bw
+
+
+# ---------- latency bookkeeping ----------
+
+class OcrStats:
+    """
+    Thread-safe latency counters for one backend. A "call" is one engine
+    invocation, which may cover several cells (batched subprocess run).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.cells = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, seconds: float, cells: int = 1) -> None:
+        with self._lock:
+            self.calls += 1
+            self.cells += cells
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "cells": self.cells,
+                "total_seconds": round(self.total_seconds, 4),
+                "max_call_seconds": round(self.max_seconds, 4),
+                "mean_call_seconds": round(
+                    self.total_seconds / self.calls, 4) if self.calls else 0.0,
+                "mean_cell_seconds": round(
+                    self.total_seconds / self.cells, 4) if self.cells else 0.0,
+            }
+
+
+# ---------- backends ----------
+
+class OcrBackend:
+    """
+    Base class: turns binarised cells into text. Subclasses implement
+    `_recognize` (one cell) and may override `_recognize_many`.
+    """
+
+    name = "base"
+    # smallest useful share of a page's cells for one pool thread
+    min_chunk_cells = 1
+
+    def __init__(self):
+        self.stats = OcrStats()
+
+    def recognize(self, bw: np.ndarray) -> str:
+        t0 = time.perf_counter()
+        text = self._recognize(bw)
+        elapsed = time.perf_counter() - t0
+        self.stats.record(elapsed)
+        logger.debug("ocr[%s] 1 cell in %.1f ms", self.name, elapsed * 1000)
+        return text
+
+    def recognize_many(
+        self, cells: dict[Hashable, np.ndarray],
+    ) -> dict[Hashable, str]:
+        """
+        Recognise independent cells. With an OCR pool they are split into
+        up to OCR_THREADS chunks (of at least `min_chunk_cells`) that are
+        recognised concurrently – the engines run outside the GIL.
+        """
+        if not cells:
+            return {}
+
+        pool = get_ocr_pool()
+        n_chunks = min(
+            _ocr_threads, math.ceil(len(cells) / self.min_chunk_cells),
+        )
+        if pool is None or n_chunks <= 1:
+            return self._recognize_many(cells)
+
+        items = list(cells.items())
+        size = math.ceil(len(items) / n_chunks)
+        futures = [
+            pool.submit(self._recognize_many, dict(items[i : i + size]))
+            for i in range(0, len(items), size)
+        ]
+        texts: dict[Hashable, str] = {}
+        for fut in futures:
+            texts.update(fut.result())
+        return texts
+
+    def _recognize(self, bw: np.ndarray) -> str:
+        raise NotImplementedError
+
+    def _recognize_many(
+        self, cells: dict[Hashable, np.ndarray],
+    ) -> dict[Hashable, str]:
+        return {key: self.recognize(bw) for key, bw in cells.items()}
+
+    def close(self) -> None:
+        pass
+
+
+class SubprocessOcrBackend(OcrBackend):
+    """
+    pytesseract: every call launches a `tesseract` process. This is the
+    fallback backend and needs nothing but the tesseract binary.
+    """
+
+    name = "subprocess"
+
+    @property
+    def min_chunk_cells(self) -> int:
+        return OCR_CHUNK_MIN_CELLS if OCR_BATCH else 1
+
+    def _recognize(self, bw: np.ndarray) -> str:
+        text = pytesseract.image_to_string(bw, lang=OCR_LANG)
+        return text.strip()
+
+    def _recognize_many(
+        self, cells: dict[Hashable, np.ndarray],
+    ) -> dict[Hashable, str]:
+        """
+        With OCR_BATCH enabled all cells go through a single tesseract run:
+        every cell is written as its own PNG and tesseract is given a list
+        file, so each cell is still recognised as a separate page with the
+        same settings as a single call – we only save the per-cell process
+        start and language model load.
+        """
+        if not OCR_BATCH or len(cells) == 1:
+            return super()._recognize_many(cells)
+
+        keys = list(cells.keys())
+        t0 = time.perf_counter()
+
+        with tempfile.TemporaryDirectory(prefix="ocr_batch_") as tmp:
+            paths: list[str] = []
+            for i, key in enumerate(keys):
+                path = os.path.join(tmp, f"cell{i:04d}.png")
+                cv2.imwrite(path, cells[key])
+                paths.append(path)
+
+            list_path = os.path.join(tmp, "cells.txt")
+            with open(list_path, "w", encoding="utf-8") as fh:
+                fh.write("\n".join(paths) + "\n")
+
+            raw = pytesseract.image_to_string(list_path, lang=OCR_LANG)
+
+        elapsed = time.perf_counter() - t0
+        self.stats.record(elapsed, cells=len(keys))
+        logger.debug(
+            "ocr[%s] %d cells in %.1f ms", self.name, len(keys), elapsed * 1000,
+        )
+
+        chunks = raw.split(PAGE_SEPARATOR)
+        if len(chunks) < len(keys):
+            # Should not happen, but never guess which text belongs where.
+            logger.warning(
+                "Batched OCR returned %d pages for %d cells, "
+                "falling back to per-cell OCR",
+                len(chunks), len(keys),
+            )
+            return super()._recognize_many(cells)
+
+        return {key: chunks[i].strip() for i, key in enumerate(keys)}
+
+
+class TesserocrBackend(OcrBackend):
+    """
+    In-process Tesseract through `tesserocr`. Each worker thread lazily
+    creates one `PyTessBaseAPI`, loads the language data once and reuses
+    it for every cell, page and request it handles afterwards.
+    """
+
+    name = "tesserocr"
+
+    def __init__(self):
+        super().__init__()
+        import tesserocr  # optional dependency, checked by the factory
+
+        self._tesserocr = tesserocr
+        self._local = threading.local()
+        self._engines: list = []
+        self._engines_lock = threading.Lock()
+
+    def _engine(self):
+        api = getattr(self._local, "api", None)
+        if api is None:
+            api = self._tesserocr.PyTessBaseAPI(lang=OCR_LANG or "eng")
+            self._local.api = api
+            with self._engines_lock:
+                self._engines.append(api)
+            logger.info(
+                "Started tesserocr engine for thread %s (%d in pool)",
+                threading.current_thread().name, len(self._engines),
+            )
+        return api
+
+    def _recognize(self, bw: np.ndarray) -> str:
+        api = self._engine()
+        h, w = bw.shape[:2]
+        api.SetImageBytes(bw.tobytes(), w, h, 1, w)
+        text = api.GetUTF8Text()
+        return text.strip()
+
+    def close(self) -> None:
+        with self._engines_lock:
+            for api in self._engines:
+                api.End()
+            self._engines.clear()
+        self._local = threading.local()
+
+
+_backend: OcrBackend | None = None
+_backend_lock = threading.Lock()
+
+
+def _create_backend(name: str) -> OcrBackend:
+    if name == "tesserocr":
+        try:
+            return TesserocrBackend()
+        except ImportError:
+            logger.warning(
+                "OCR_BACKEND=tesserocr but tesserocr is not installed, "
+                "using the subprocess backend",
+            )
+    elif name != "subprocess":
+        logger.warning("Unknown OCR_BACKEND %r, using subprocess", name)
+    return SubprocessOcrBackend()
+
+
+def get_ocr_backend() -> OcrBackend:
+    """
+    Process-wide OCR backend selected by the OCR_BACKEND env variable.
+    """
+    global _backend
+
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = _create_backend(OCR_BACKEND_ENV)
+                logger.info("OCR backend: %s", _backend.name)
+    return _backend
+
+
+# ---------- process-wide OCR thread pool ----------
+
+_ocr_threads = OCR_THREADS
+_ocr_pool: Optional[ThreadPoolExecutor] = None
+_ocr_pool_lock = threading.Lock()
+
+
+def set_ocr_threads(threads: int) -> None:
+    """
+    Size this process' OCR budget (page workers each take their share of
+    OCR_THREADS). Only possible before the pool is first used: the pool
+    is shared, so it is never replaced under running requests.
+    """
+    global _ocr_threads
+
+    with _ocr_pool_lock:
+        if _ocr_pool is not None:
+            raise RuntimeError("The OCR pool is already running")
+        _ocr_threads = max(1, threads)
+
+
+def limit_tesseract_threads() -> None:
+    """
+    With an OCR pool the budget is counted in tesseract processes, so
+    keep each of them single-threaded instead of letting OpenMP fan out
+    too. Changes the environment: call it once at process start, before
+    any OCR runs (app lifespan, page worker initializer).
+    """
+    if _ocr_threads > 1:
+        os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+
+def get_ocr_pool() -> Optional[ThreadPoolExecutor]:
+    """
+    The shared OCR pool, or None when OCR runs in the calling thread.
+    """
+    global _ocr_pool
+
+    if _ocr_threads <= 1:
+        return None
+    with _ocr_pool_lock:
+        if _ocr_pool is None:
+            _ocr_pool = ThreadPoolExecutor(
+                max_workers=_ocr_threads, thread_name_prefix="ocr",
+            )
+        return _ocr_pool
+
+
+def shutdown_ocr_pool() -> None:
+    global _ocr_pool
+
+    with _ocr_pool_lock:
+        if _ocr_pool is not None:
+            _ocr_pool.shutdown(wait=True)
+        _ocr_pool = None
+
+
+def get_ocr_stats() -> dict:
+    """
+    Backend name + latency counters, for comparing backends.
+    """
+    backend = get_ocr_backend()
+    return {
+        "backend": backend.name,
+        "threads": _ocr_threads,
+        **backend.stats.as_dict(),
+    }
+
+
+def ocr_cell(bw: np.ndarray) -> str:
+    """
+    OCR one binarised cell with the configured backend.
+    """
+    return get_ocr_backend().recognize(bw)
+
+
+def ocr_cells(cells: dict[Hashable, np.ndarray]) -> dict[Hashable, str]:
+    """
+    OCR many binarised cells, keyed by any hashable id
+    (the classifier uses `(row_index, field)`).
+    """
+    return get_ocr_backend().recognize_many(cells)
@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import threading
+from typing import AsyncIterator, Callable, Iterator, Optional
+
+from . import metrics
+from .admission import ExtractionGate, GateSaturated
+from .cache import cached_result, page_cache, store_result
+from .documents import SpooledUpload
+from .extractor import (
+    ExtractionResult,
+    ExtractionSummary,
+    count_pdf_pages,
+    iter_extracted_pages,
+)
+from .fullExtractionClass import get_template_bank
+
+logger = logging.getLogger(__name__)
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+SSE_MEDIA_TYPE = "text/event-stream"
+
+# records the worker may be ahead of the client
+STREAM_QUEUE_RECORDS = 4
+
+# marks the end of the producer's records on the queue
+_END = object()
+
+
+def iter_extraction_records(
+    pdf_path: str,
+    filename: str,
+    pdf_sha256: str,
+) -> Iterator[dict]:
+    """
+    The records of a streamed extraction, in order:
+
+      {"type": "start", "filename", "total_pages"}
+      {"type": "page", ...ExtractedPage}      one per page, as soon as it
+                                              is classified (completion
+                                              order with page workers)
+      {"type": "summary", ...ExtractionSummary}
+
+    Pages are sent as soon as they are classified; only their records
+    are kept, to put the finished result in the result cache, so the
+    next upload of the same PDF (streamed or not) is served from there.
+    A document that is already in the result cache is replayed from it;
+    newly classified pages go through the per-page cache like every other
+    extraction.
+    """
+    cached = cached_result(pdf_sha256, filename)
+    if cached is not None:
+        yield {"type": "start", "filename": filename, "total_pages": cached.total_pages}
+        for page in cached.pages:
+            yield {"type": "page", **page.model_dump()}
+        summary = ExtractionSummary(**cached.model_dump(exclude={"pages"}))
+        yield {"type": "summary", **summary.model_dump()}
+        return
+
+    bank = get_template_bank()
+    total = count_pdf_pages(pdf_path)
+    yield {"type": "start", "filename": filename, "total_pages": total}
+
+    recomputed: list[int] = []
+    pages = []
+    for page in iter_extracted_pages(
+        pdf_path, bank, total, page_cache=page_cache, recomputed=recomputed,
+    ):
+        pages.append(page)
+        yield {"type": "page", **page.model_dump()}
+
+    pages.sort(key=lambda p: p.page_number)
+    result = ExtractionResult(
+        status="ok",
+        filename=filename,
+        total_pages=len(pages),
+        total_rows=sum(len(p.rows) for p in pages),
+        pages=pages,
+        template_hash=bank.digest,
+        recomputed_pages=sorted(recomputed),
+        skipped_rois=sum(p.skipped_rois for p in pages),
+    )
+    summary = ExtractionSummary(**result.model_dump(exclude={"pages"}))
+    yield {"type": "summary", **summary.model_dump()}
+    store_result(pdf_sha256, result)
+
+
+def encode_record(record: dict, media_type: str) -> bytes:
+    """
+    One record as an NDJSON line or a Server-Sent Event.
+    """
+    with metrics.stage("serialize"):
+        data = json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+    if media_type == SSE_MEDIA_TYPE:
+        return f"event: {record['type']}\ndata: {data}\n\n".encode("utf-8")
+    return (data + "\n").encode("utf-8")
+
+
+def stream_extraction(
+    gate: ExtractionGate,
+    upload: SpooledUpload,
+    filename: str,
+    media_type: str = NDJSON_MEDIA_TYPE,
+) -> AsyncIterator[bytes]:
+    """
+    The encoded records of `iter_extraction_records` for a spooled
+    upload, produced on `gate`'s pool (see `stream_records`). The spool
+    file is removed once the worker is done with it.
+    """
+    return stream_records(
+        gate,
+        lambda: iter_extraction_records(str(upload.path), filename, upload.sha256),
+        media_type,
+        description=filename,
+        on_done=upload.discard,
+    )
+
+
+async def stream_records(
+    gate: ExtractionGate,
+    make_records: Callable[[], Iterator[dict]],
+    media_type: str = NDJSON_MEDIA_TYPE,
+    description: str = "",
+    on_done: Optional[Callable[[], None]] = None,
+) -> AsyncIterator[bytes]:
+    """
+    Run the record generator `make_records()` on `gate`'s pool and relay
+    its records as they are produced.
+
+    The worker thread hands records to the event loop one at a time,
+    through a queue of STREAM_QUEUE_RECORDS, and waits while it is full,
+    so a slow client holds the worker back instead of records piling up
+    in memory. When the client goes away, the worker stops after the
+    current record, which also cancels any pages still queued on the
+    page workers. A
+    failure after the response has started becomes a final
+    {"type": "error"} record. `on_done` runs once the worker has finished
+    (or never started), e.g. to remove its input files.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=STREAM_QUEUE_RECORDS)
+    stop = threading.Event()
+
+    def produce() -> None:
+        if stop.is_set():
+            return  # client left while we were queued
+        records = make_records()
+        try:
+            for record in records:
+                if stop.is_set():
+                    break
+                # blocks while the client is behind
+                asyncio.run_coroutine_threadsafe(queue.put(record), loop).result()
+        finally:
+            records.close()
+
+    end: list = []  # keeps the end marker's put alive until it is done
+    task = asyncio.ensure_future(gate.run(produce))
+    task.add_done_callback(
+        lambda _: end.append(asyncio.ensure_future(queue.put(_END)))
+    )
+    if on_done is not None:
+        # only once the worker thread has let go of its input
+        task.add_done_callback(lambda _: on_done())
+
+    try:
+        while True:
+            record = await queue.get()
+            if record is _END:
+                break
+            yield encode_record(record, media_type)
+
+        try:
+            task.result()
+        except GateSaturated as e:
+            yield encode_record(
+                {"type": "error", "status_code": e.status_code, "detail": str(e)},
+                media_type,
+            )
+        except Exception as e:
+            logger.exception("Streamed extraction of %s failed", description)
+            yield encode_record(
+                {
+                    "type": "error",
+                    "status_code": 500,
+                    "detail": f"Extraction failed: {str(e)}",
+                },
+                media_type,
+            )
+    finally:
+        stop.set()
+        # a worker blocked on a full queue sees `stop` once it has room
+        while not queue.empty():
+            queue.get_nowait()
+        # nobody may be left to look at the outcome: retrieve it anyway,
+        # so asyncio doesn't warn about an unretrieved exception
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
@@ -0,0 +1,200 @@
+"""
+Checks the admission control of the ExtractionGate: a full queue is
+refused with 429, a request that waits too long for a slot with 503,
+both with a Retry-After hint, and slots are given back when the work
+finishes. Extraction is replaced by a stub that blocks until released,
+so the pool can be held saturated:
+
+    python -m pytest app/test_admission.py
+    python -m app.test_admission
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from . import main
+from .admission import ExtractionGate, GateSaturated
+from .extractor import ExtractionResult
+
+PDF = ("a.pdf", b"%PDF-1.4 fake", "application/pdf")
+
+
+class _BlockingWork:
+    """
+    Stands in for an extraction: blocks its worker thread until released.
+    """
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, pdf_path, filename, *args):
+        self.started.set()
+        assert self.release.wait(10), "never released"
+        return ExtractionResult(
+            status="ok", filename=filename, total_pages=0, total_rows=0, pages=[],
+        )
+
+
+async def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+# ---------- the gate itself ----------
+
+def test_full_queue_is_refused_with_429():
+    async def scenario():
+        gate = ExtractionGate(max_in_flight=1, max_queue=1, queue_timeout=10)
+        work = _BlockingWork()
+        try:
+            running = asyncio.create_task(gate.run(work, "a.pdf", "a.pdf"))
+            await _wait_for(lambda: gate.in_flight == 1)
+            waiting = asyncio.create_task(gate.run(work, "b.pdf", "b.pdf"))
+            await _wait_for(lambda: gate.queued == 1)
+
+            with pytest.raises(GateSaturated) as exc:
+                await gate.run(work, "c.pdf", "c.pdf")
+            assert exc.value.status_code == 429
+            assert exc.value.retry_after == gate.retry_after() >= 1
+            assert gate.rejected == 1
+
+            work.release.set()
+            assert (await running).filename == "a.pdf"
+            assert (await waiting).filename == "b.pdf"
+            assert gate.snapshot()["in_flight"] == 0
+            assert gate.completed == 2
+        finally:
+            work.release.set()
+            gate.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_queue_timeout_is_refused_with_503():
+    async def scenario():
+        gate = ExtractionGate(max_in_flight=1, max_queue=4, queue_timeout=0.05)
+        work = _BlockingWork()
+        try:
+            running = asyncio.create_task(gate.run(work, "a.pdf", "a.pdf"))
+            await _wait_for(lambda: gate.in_flight == 1)
+
+            with pytest.raises(GateSaturated) as exc:
+                await gate.run(work, "b.pdf", "b.pdf")
+            assert exc.value.status_code == 503
+            assert exc.value.retry_after >= 1
+            # the timed-out request left the queue
+            assert gate.queued == 0
+
+            work.release.set()
+            await running
+            # and the slot is free again
+            assert (await gate.run(work, "c.pdf", "c.pdf")).filename == "c.pdf"
+        finally:
+            work.release.set()
+            gate.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_timed_out_waiters_never_keep_a_slot():
+    def work(pdf_path, filename):
+        time.sleep(0.004)
+        return filename
+
+    async def scenario():
+        gate = ExtractionGate(max_in_flight=2, max_queue=50, queue_timeout=0.01)
+        timed_out = 0
+        try:
+            # slots come free right around the time waiters give up
+            for _ in range(10):
+                results = await asyncio.gather(
+                    *(gate.run(work, "a.pdf", f"{i}.pdf") for i in range(12)),
+                    return_exceptions=True,
+                )
+                for r in results:
+                    assert isinstance(r, (str, GateSaturated))
+                timed_out += sum(isinstance(r, GateSaturated) for r in results)
+                await _wait_for(lambda: gate.in_flight == 0)
+                assert gate.queued == 0
+                # every slot is free again
+                assert gate._slots._value == gate.max_in_flight
+        finally:
+            gate.shutdown()
+        assert 0 < timed_out < 120
+
+    asyncio.run(scenario())
+
+
+def test_retry_after_grows_with_the_queue():
+    gate = ExtractionGate(max_in_flight=2, max_queue=10)
+    gate._avg_seconds = 3.0
+    assert gate.retry_after() == 2  # ceil(3 * 1/2)
+    gate.queued = 3
+    assert gate.retry_after() == 6  # ceil(3 * 4/2)
+
+
+# ---------- over HTTP ----------
+
+@pytest.fixture
+def saturated_app(monkeypatch):
+    """
+    Factory for the app with a one-slot gate whose slot is held by a
+    blocked /extract request. Returns (client, gate).
+    """
+    held = {}
+
+    def start(max_queue, queue_timeout):
+        gate = ExtractionGate(
+            max_in_flight=1, max_queue=max_queue, queue_timeout=queue_timeout,
+        )
+        work = _BlockingWork()
+        monkeypatch.setattr(main, "extraction_gate", gate)
+        monkeypatch.setattr(main, "cached_extract_from_pdf_path", work)
+
+        client = TestClient(main.app).__enter__()
+        first = {}
+        thread = threading.Thread(
+            target=lambda: first.update(
+                response=client.post("/extract", files={"file": PDF}),
+            ),
+        )
+        thread.start()
+        assert work.started.wait(10)
+        held.update(client=client, work=work, thread=thread, first=first)
+        return client, gate
+
+    yield start
+
+    if held:
+        held["work"].release.set()
+        held["thread"].join(10)
+        held["client"].__exit__(None, None, None)
+        # the request holding the slot still completes normally
+        assert held["first"]["response"].status_code == 200
+
+
+def test_http_429_when_the_queue_is_full(saturated_app):
+    client, gate = saturated_app(max_queue=0, queue_timeout=10)
+
+    response = client.post("/extract", files={"file": PDF})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) == gate.retry_after()
+    assert client.get("/health").json()["extraction"]["rejected"] == 1
+
+
+def test_http_503_when_waiting_times_out(saturated_app):
+    client, gate = saturated_app(max_queue=1, queue_timeout=0.05)
+
+    response = client.post("/extract", files={"file": PDF})
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,118 @@
+"""
+Checks /extract/batch: every document gets its own result or error
+record, a document that can't be read or extracted doesn't affect the
+others, and zip archives are unpacked into their PDFs. The app runs
+with poppler and tesseract stubbed out (see conftest.py):
+
+    python -m pytest app/test_batch.py
+    python -m app.test_batch
+"""
+import io
+import json
+import zipfile
+
+import pytest
+
+from .conftest import BROKEN_PDF, fake_pdf
+from .extractor import ExtractionResult
+
+
+def _records(response) -> list[dict]:
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.text.splitlines() if line]
+
+
+def _batch(client, files):
+    return _records(client.post(
+        "/extract/batch", files=[("files", f) for f in files],
+    ))
+
+
+def _single(client, name, data) -> dict:
+    response = client.post("/extract", files={"file": (name, data, "application/pdf")})
+    assert response.status_code == 200
+    return response.json()
+
+
+def _pages(record: dict) -> list:
+    return ExtractionResult.model_validate(
+        {k: v for k, v in record.items() if k not in ("type", "index")}
+    ).model_dump()["pages"]
+
+
+def test_failed_documents_are_isolated(client):
+    records = _batch(client, [
+        ("one.pdf", fake_pdf(11), "application/pdf"),
+        ("broken.pdf", BROKEN_PDF, "application/pdf"),
+        ("notes.txt", b"not a pdf", "text/plain"),
+        ("two.pdf", fake_pdf(12, 13), "application/pdf"),
+    ])
+
+    assert records[0] == {"type": "start", "documents": [
+        {"index": 0, "filename": "one.pdf"},
+        {"index": 1, "filename": "broken.pdf"},
+        {"index": 2, "filename": "notes.txt"},
+        {"index": 3, "filename": "two.pdf"},
+    ]}
+    assert records[-1] == {
+        "type": "summary", "documents": 4, "succeeded": 2, "failed": 2,
+    }
+    by_index = {r["index"]: r for r in records[1:-1]}
+    assert sorted(by_index) == [0, 1, 2, 3]
+
+    assert by_index[1]["type"] == "error"
+    assert by_index[1]["status_code"] == 500
+    assert by_index[1]["filename"] == "broken.pdf"
+    assert by_index[2]["type"] == "error"
+    assert by_index[2]["status_code"] == 400
+
+    # the good documents come out exactly as on their own
+    for index, name, data in ((0, "one.pdf", fake_pdf(11)), (3, "two.pdf", fake_pdf(12, 13))):
+        assert by_index[index]["type"] == "result"
+        assert by_index[index]["filename"] == name
+        assert _pages(by_index[index]) == _single(client, name, data)["pages"]
+
+
+def test_zip_archive(client):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("sheets/a.pdf", fake_pdf(11))
+        zf.writestr("sheets/b.PDF", BROKEN_PDF)
+        zf.writestr("readme.txt", "not a pdf")
+        zf.writestr("__MACOSX/sheets/._a.pdf", "resource fork")
+
+    records = _batch(client, [("sheets.zip", archive.getvalue(), "application/zip")])
+
+    assert [d["filename"] for d in records[0]["documents"]] == [
+        "sheets/a.pdf", "sheets/b.PDF",
+    ]
+    by_index = {r["index"]: r["type"] for r in records[1:-1]}
+    assert by_index == {0: "result", 1: "error"}
+    assert records[-1]["succeeded"] == 1 and records[-1]["failed"] == 1
+
+
+def test_cached_documents_are_answered_first(client, renderer):
+    _single(client, "one.pdf", fake_pdf(11))
+    seen = renderer.documents
+
+    records = _batch(client, [
+        ("two.pdf", fake_pdf(12), "application/pdf"),
+        ("one.pdf", fake_pdf(11), "application/pdf"),
+    ])
+    assert [(r["type"], r.get("index")) for r in records[1:-1]] == [
+        ("result", 1), ("result", 0),
+    ]
+    assert records[1]["cached"]
+    # only the new document was opened
+    assert renderer.documents == seen + 1
+
+
+def test_invalid_zip_fails_the_whole_batch(client):
+    response = client.post(
+        "/extract/batch", files=[("files", ("a.zip", b"not a zip", "application/zip"))],
+    )
+    assert response.status_code == 400
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,68 @@
+"""
+Checks that the vectorised dust removal in `binarize_and_clean` is
+byte-identical to the original per-label loop (kept as the reference in
+benchmarks/bench_binarize.py): on random noise, on synthetic schedule
+pages, on the template drawings and on the scanned sample page.
+
+    python -m pytest app/test_binarize.py
+    python -m app.test_binarize
+"""
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+from benchmarks.bench_binarize import binarize_and_clean_loop, noisy_scan
+from benchmarks.synthetic import make_page
+
+from .fullExtractionClass import TEMPLATE_DIR, binarize_and_clean
+
+SAMPLE_PAGE = Path(__file__).resolve().parent.parent / "page_008.png"
+
+
+def _assert_identical(img: np.ndarray) -> None:
+    expected = binarize_and_clean_loop(img)
+    actual = binarize_and_clean(img)
+    assert actual.dtype == expected.dtype
+    assert actual.shape == expected.shape
+    assert np.array_equal(actual, expected)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_random_noise(seed):
+    _assert_identical(noisy_scan(400, 0.01, seed=seed))
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_random_gray_levels(seed):
+    # no clean background at all: Otsu and the labelling on pure noise
+    rng = np.random.default_rng(seed)
+    _assert_identical(rng.integers(0, 256, (300, 500), dtype=np.uint8))
+
+
+def test_blank_and_solid():
+    _assert_identical(np.full((50, 80), 255, np.uint8))
+    _assert_identical(np.zeros((50, 80), np.uint8))
+
+
+def test_synthetic_page():
+    page, _ = make_page(7)
+    _assert_identical(page)
+
+
+def test_templates():
+    paths = sorted(TEMPLATE_DIR.glob("*.png"))
+    assert paths
+    for path in paths:
+        img = cv2.imdecode(np.fromfile(str(path), np.uint8), cv2.IMREAD_COLOR)
+        _assert_identical(img)
+
+
+@pytest.mark.skipif(not SAMPLE_PAGE.exists(), reason="no scanned sample page")
+def test_scanned_page():
+    _assert_identical(cv2.imread(str(SAMPLE_PAGE), cv2.IMREAD_COLOR))
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
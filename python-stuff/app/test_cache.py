@@ -0,0 +1,207 @@
+"""
+Checks the result cache: repeated uploads are served from memory or
+disk, a new PIPELINE_VERSION or template set misses, and the on-disk
+store evicts the least recently used files once it is over budget. And
+the page cache: a revised PDF only recomputes the pages that changed.
+
+Extraction (or, for the page cache, poppler and the page classifier) is
+replaced by stubs that count their calls, so this runs without poppler
+or tesseract:
+
+    python -m pytest app/test_cache.py
+    python -m app.test_cache
+"""
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from . import cache, extractor, text_layer
+from .extractor import ExtractedPage, ExtractedRow, ExtractionResult
+from .fullExtractionClass import get_template_bank
+
+
+class _CountingExtraction:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, pdf_path, filename, progress=None, page_cache=None):
+        self.calls += 1
+        return ExtractionResult(
+            status="ok", filename=filename, total_pages=0, total_rows=0,
+            pages=[], template_hash=get_template_bank().digest,
+            recomputed_pages=[],
+        )
+
+
+class _Bank:
+    def __init__(self, digest):
+        self.digest = digest
+
+
+@pytest.fixture
+def pdf(tmp_path):
+    path = tmp_path / "a.pdf"
+    path.write_bytes(b"%PDF-1.4 fake")
+    return str(path)
+
+
+@pytest.fixture
+def extraction(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "result_cache", cache.ResultCache(tmp_path / "results"))
+    stub = _CountingExtraction()
+    monkeypatch.setattr(cache, "extract_from_pdf_path", stub)
+    return stub
+
+
+# ---------- result cache ----------
+
+def test_repeated_upload_is_a_hit(pdf, extraction):
+    first = cache.cached_extract_from_pdf_path(pdf, "a.pdf")
+    second = cache.cached_extract_from_pdf_path(pdf, "renamed.pdf")
+
+    assert extraction.calls == 1
+    assert not first.cached
+    assert second.cached
+    # the same bytes under another name answer with that name
+    assert second.filename == "renamed.pdf"
+    assert cache.result_cache.stats()["memory_hits"] == 1
+
+
+def test_hit_from_disk(tmp_path, pdf, extraction, monkeypatch):
+    cache.cached_extract_from_pdf_path(pdf, "a.pdf")
+
+    # a restarted process: empty memory, same directory
+    monkeypatch.setattr(cache, "result_cache", cache.ResultCache(tmp_path / "results"))
+    assert cache.cached_extract_from_pdf_path(pdf, "a.pdf").cached
+    assert extraction.calls == 1
+    assert cache.result_cache.stats()["disk_hits"] == 1
+
+
+def test_pipeline_version_change_misses(pdf, extraction, monkeypatch):
+    cache.cached_extract_from_pdf_path(pdf, "a.pdf")
+
+    monkeypatch.setattr(cache, "PIPELINE_VERSION", cache.PIPELINE_VERSION + ":next")
+    assert not cache.cached_extract_from_pdf_path(pdf, "a.pdf").cached
+    assert extraction.calls == 2
+
+
+def test_template_change_misses(pdf, extraction, monkeypatch):
+    cache.cached_extract_from_pdf_path(pdf, "a.pdf")
+
+    monkeypatch.setattr(cache, "get_template_bank", lambda: _Bank("other templates"))
+    assert cache.cached_result(cache.sha256_file(pdf), "a.pdf") is None
+
+
+def test_disk_store_evicts_least_recently_used(tmp_path):
+    payload = "x" * 1000
+    # no memory level, so every get goes to disk
+    store = cache.ResultCache(tmp_path, memory_items=0, disk_bytes=2500)
+    store.put("a", payload)
+    store.put("b", payload)
+    os.utime(tmp_path / "a.json", (1000, 1000))
+    os.utime(tmp_path / "b.json", (2000, 2000))
+
+    assert store.get("a") == payload  # a is now the most recently used
+    store.put("c", payload)
+
+    assert store.get("b") is None
+    assert store.get("a") == payload
+    assert store.get("c") == payload
+    assert store.stats()["evictions"] == 1
+
+
+# ---------- page cache ----------
+
+class _FakeDocument:
+    """
+    Poppler and the classifier in one: renders page n as a flat gray
+    image of `shades[n - 1]`, and "classifies" a page by reading its
+    shade back into a row, counting which pages it saw.
+    """
+
+    def __init__(self, shades):
+        self.shades = shades
+        self.classified = []
+
+    def pdfinfo_from_path(self, pdf_path):
+        return {"Pages": len(self.shades)}
+
+    def convert_from_path(self, pdf_path, dpi, first_page, last_page):
+        return [
+            Image.new("RGB", (60, 80), (shade,) * 3)
+            for shade in self.shades[first_page - 1 : last_page]
+        ]
+
+    def extract_page(self, page_img, page_number, bank=None, debug=None, page_text=None):
+        self.classified.append(page_number)
+        row = ExtractedRow(
+            row_index=1, symbols=[], symbol_scores={},
+            kuvaus=str(int(page_img[0, 0, 0])), suoja="", kaapeli="",
+        )
+        return ExtractedPage(page_number=page_number, rows=[row])
+
+
+@pytest.fixture
+def page_cache(tmp_path, monkeypatch):
+    # the fake PDF has no text layer to read
+    monkeypatch.setattr(text_layer, "TEXT_LAYER", False)
+    return cache.PageCache(cache.ResultCache(tmp_path / "pages"))
+
+
+def _extract_pages(shades, page_cache, monkeypatch):
+    doc = _FakeDocument(shades)
+    monkeypatch.setattr(extractor, "pdfinfo_from_path", doc.pdfinfo_from_path)
+    monkeypatch.setattr(extractor, "convert_from_path", doc.convert_from_path)
+    monkeypatch.setattr(extractor, "extract_page", doc.extract_page)
+    result = extractor.extract_from_pdf_path(
+        "fake.pdf", "fake.pdf", workers=0, page_cache=page_cache,
+    )
+    return result, doc.classified
+
+
+def test_revised_document_recomputes_changed_pages(page_cache, monkeypatch):
+    result, classified = _extract_pages([10, 20, 30], page_cache, monkeypatch)
+    assert classified == [1, 2, 3]
+
+    result, classified = _extract_pages([10, 25, 30], page_cache, monkeypatch)
+    assert classified == [2]
+    assert result.recomputed_pages == [2]
+    assert [p.rows[0].kuvaus for p in result.pages] == ["10", "25", "30"]
+
+
+def test_moved_page_keeps_its_new_number(page_cache, monkeypatch):
+    _extract_pages([10, 20], page_cache, monkeypatch)
+
+    result, classified = _extract_pages([5, 10, 20], page_cache, monkeypatch)
+    assert classified == [1]
+    assert [(p.page_number, p.rows[0].kuvaus) for p in result.pages] == [
+        (1, "5"), (2, "10"), (3, "20"),
+    ]
+
+
+def test_pipeline_version_change_recomputes_pages(page_cache, monkeypatch):
+    _extract_pages([10, 20], page_cache, monkeypatch)
+
+    monkeypatch.setattr(cache, "PIPELINE_VERSION", cache.PIPELINE_VERSION + ":next")
+    _, classified = _extract_pages([10, 20], page_cache, monkeypatch)
+    assert classified == [1, 2]
+
+
+def test_page_key():
+    store = cache.PageCache(None)
+    page = np.full((40, 30, 3), 200, np.uint8)
+    key = store.key(page, "templates")
+
+    assert store.key(page.copy(), "templates") == key
+    changed = page.copy()
+    changed[5, 5] = 0
+    assert store.key(changed, "templates") != key
+    assert store.key(page, "other templates") != key
+    words = text_layer.PageText([(0.1, 0.1, 0.2, 0.2, "C16")])
+    assert store.key(page, "templates", words) != key
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -1,4 +1,4 @@
-from .fullExtractionClass import classify_page
+from .fullExtractionClass import classify_page, select_usable_rows
 from pprint import pprint
 
 if __name__ == "__main__":
@@ -7,6 +7,5 @@ if __name__ == "__main__":
     #for r in rows:
     #    pprint(r)
 
-    from .fullExtractionClass import usable_rows
     print("\nUsable rows dict:")
-    pprint(usable_rows)
\ No newline at end of file
+    pprint(select_usable_rows(rows))
\ No newline at end of file
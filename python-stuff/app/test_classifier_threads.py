@@ -0,0 +1,69 @@
+"""
+Checks that one PageClassifier and the shared template bank serve many
+threads at once: the same synthetic pages (see benchmarks/synthetic.py)
+classified from a thread pool, starting from an unbuilt bank, give
+exactly the rows a single thread gets, in every match mode. OCR is
+stubbed out:
+
+    python -m pytest app/test_classifier_threads.py
+    python -m app.test_classifier_threads
+"""
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from benchmarks.synthetic import make_page
+
+from . import fullExtractionClass
+from .fullExtractionClass import MATCH_MODES, PageClassifier, get_template_bank
+
+SEEDS = (5, 6, 7)
+THREADS = 6
+ROUNDS = 1
+
+
+def _fake_ocr_cells(cells):
+    return {
+        key: hashlib.md5(bw.tobytes()).hexdigest()[:12] for key, bw in cells.items()
+    }
+
+
+@pytest.fixture(scope="module")
+def pages() -> dict:
+    return {seed: make_page(seed)[0] for seed in SEEDS}
+
+
+@pytest.mark.parametrize("mode", MATCH_MODES)
+def test_classify_from_many_threads(pages, mode, monkeypatch):
+    monkeypatch.setattr(fullExtractionClass, "ocr_cells", _fake_ocr_cells)
+    classifier = PageClassifier(match_mode=mode)
+    expected = {seed: classifier.classify(page) for seed, page in pages.items()}
+    assert any(row["unique_symbols"] for rows in expected.values() for row in rows)
+
+    # the threads race to build the bank, too
+    monkeypatch.setattr(fullExtractionClass, "_template_bank", None)
+    start = threading.Barrier(THREADS)
+
+    def classify(i: int) -> tuple[int, list]:
+        order = SEEDS[i % len(SEEDS):] + SEEDS[: i % len(SEEDS)]
+        start.wait()
+        bank = get_template_bank()
+        return id(bank), [
+            (seed, classifier.classify(pages[seed]))
+            for _ in range(ROUNDS) for seed in order
+        ]
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        results = list(pool.map(classify, range(THREADS)))
+
+    # built once, shared by all
+    assert len({bank for bank, _ in results}) == 1
+    for _, classified in results:
+        for seed, rows in classified:
+            assert rows == expected[seed]
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
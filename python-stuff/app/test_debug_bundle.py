@@ -0,0 +1,195 @@
+"""
+Checks debug bundles: artifacts are written to a directory or collected
+in a zip archive that spills to a temporary file once it grows, bundle
+directories expire after the TTL, and /extract?debug=dir / ?debug=zip
+answer with the bundle id and the archive. The app runs with poppler
+and tesseract stubbed out (see conftest.py):
+
+    python -m pytest app/test_debug_bundle.py
+    python -m app.test_debug_bundle
+"""
+import io
+import json
+import os
+import threading
+import time
+import zipfile
+
+import numpy as np
+import pytest
+
+from . import debug_bundle
+from .conftest import BROKEN_PDF, fake_pdf
+from .debug_bundle import DebugBundle, DebugBundleStore
+from .extractor import ExtractionResult
+
+
+def _fill(bundle: DebugBundle) -> None:
+    bundle.add_json("rows", [{"row_index": 1, "score": np.float32(0.5)}])
+    page = bundle.page(2)
+    page.add_image("row01 sym/raw", np.zeros((4, 6), np.uint8))
+    page.add_heatmap("row01_heat_A", np.linspace(-1, 1, 12, dtype=np.float32).reshape(3, 4))
+
+
+_NAMES = {
+    "rows.json",
+    "page_002/row01_sym_raw.png",
+    "page_002/row01_heat_A.png",
+}
+
+
+def _unzip(data: bytes) -> zipfile.ZipFile:
+    zf = zipfile.ZipFile(io.BytesIO(data))
+    assert zf.testzip() is None
+    return zf
+
+
+def test_directory_bundle(tmp_path):
+    bundle = DebugBundle(tmp_path / "bundle")
+    _fill(bundle)
+
+    written = {
+        p.relative_to(tmp_path / "bundle").as_posix()
+        for p in (tmp_path / "bundle").rglob("*") if p.is_file()
+    }
+    assert written == _NAMES
+    rows = json.loads((tmp_path / "bundle" / "rows.json").read_text())
+    assert rows == [{"row_index": 1, "score": 0.5}]
+    # nothing to drop
+    bundle.close()
+
+
+def test_zip_bundle():
+    bundle = DebugBundle()
+    _fill(bundle)
+
+    zf = _unzip(b"".join(bundle.iter_zip()))
+    assert set(zf.namelist()) == _NAMES
+    assert zf.getinfo("page_002/row01_sym_raw.png").compress_type == zipfile.ZIP_STORED
+    assert zf.getinfo("rows.json").compress_type == zipfile.ZIP_DEFLATED
+    assert json.loads(zf.read("rows.json")) == [{"row_index": 1, "score": 0.5}]
+    # iterating closed it
+    bundle.close()
+
+
+def test_zip_bundle_from_many_threads():
+    bundle = DebugBundle()
+
+    def add(page_number: int) -> None:
+        page = bundle.page(page_number)
+        for i in range(20):
+            page.add_bytes(f"{i}.txt", f"{page_number}:{i}".encode())
+
+    threads = [threading.Thread(target=add, args=(n,)) for n in range(1, 5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    zf = _unzip(b"".join(bundle.iter_zip()))
+    assert len(zf.namelist()) == 80
+    assert zf.read("page_003/7.txt") == b"3:7"
+
+
+def test_zip_bundle_spills_to_disk(monkeypatch):
+    monkeypatch.setattr(debug_bundle, "DEBUG_SPOOL_BYTES", 4096)
+    bundle = DebugBundle()
+    noise = np.random.default_rng(0).integers(0, 256, (64, 64), np.uint8)
+    for i in range(4):
+        bundle.add_image(f"noise{i}", noise)
+
+    # the archive lives in a temporary file now, not in memory
+    assert bundle._spool.file._rolled
+    data = b"".join(bundle.iter_zip())
+    assert len(data) > 4096
+    assert len(_unzip(data).namelist()) == 4
+
+
+def test_store_cleanup(tmp_path):
+    store = DebugBundleStore(tmp_path, ttl_seconds=60, cleanup_interval=3600)
+    old_id, old = store.create()
+    new_id, new = store.create()
+    assert old_id != new_id
+    assert old.directory == tmp_path / old_id
+    old.add_json("result", {})
+    new.add_json("result", {})
+    an_hour_ago = time.time() - 3600
+    os.utime(old.directory, (an_hour_ago, an_hour_ago))
+
+    assert store.cleanup() == 1
+    assert not old.directory.exists()
+    assert (new.directory / "result.json").exists()
+
+
+def test_store_cleans_up_when_creating(tmp_path):
+    store = DebugBundleStore(tmp_path, ttl_seconds=60, cleanup_interval=0)
+    _, old = store.create()
+    old.add_json("result", {})
+    an_hour_ago = time.time() - 3600
+    os.utime(old.directory, (an_hour_ago, an_hour_ago))
+
+    store.create()
+    assert not old.directory.exists()
+
+
+def test_store_cleanup_without_directory(tmp_path):
+    assert DebugBundleStore(tmp_path / "missing").cleanup() == 0
+
+
+# ---------- /extract?debug= ----------
+
+def _extract(client, debug=None, data=fake_pdf(11, 12)):
+    params = {"debug": debug} if debug else {}
+    return client.post(
+        "/extract", params=params,
+        files={"file": ("a.pdf", data, "application/pdf")},
+    )
+
+
+def _pages(result: dict) -> list:
+    return ExtractionResult.model_validate(result).model_dump()["pages"]
+
+
+def test_debug_dir(client, tmp_path):
+    expected = _pages(_extract(client).json())
+
+    response = _extract(client, "dir")
+    assert response.status_code == 200
+    assert _pages(response.json()) == expected
+
+    bundle_id = response.headers["x-debug-bundle"]
+    # an id, not a path on the server
+    assert bundle_id.isalnum()
+    directory = tmp_path / "debug" / bundle_id
+    assert _pages(json.loads((directory / "result.json").read_text())) == expected
+    for page in ("page_001", "page_002"):
+        assert (directory / page / "rows.json").exists()
+        assert list((directory / page).glob("row*_heat_*.png"))
+
+
+def test_debug_zip(client, tmp_path):
+    expected = _pages(_extract(client).json())
+
+    response = _extract(client, "zip")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/zip"
+    assert "x-debug-bundle" not in response.headers
+
+    zf = _unzip(response.content)
+    assert _pages(json.loads(zf.read("result.json"))) == expected
+    names = zf.namelist()
+    assert "page_002/rows.json" in names
+    assert any(n.startswith("page_001/row") and "_heat_" in n for n in names)
+    # nothing was written to the server
+    assert not (tmp_path / "debug").exists()
+
+
+@pytest.mark.parametrize("debug", ["dir", "zip"])
+def test_debug_extraction_failure(client, debug):
+    response = _extract(client, debug, BROKEN_PDF)
+    assert response.status_code == 500
+    assert "x-debug-bundle" not in response.headers
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,116 @@
+"""
+Checks how uploaded PDFs are served back by GET /documents/{id}: the id
+is the SHA-256, which doubles as the ETag (If-None-Match -> 304), and
+Range requests get 206 with only the bytes asked for, as pdf.js needs.
+The app runs with poppler and tesseract stubbed out (see conftest.py):
+
+    python -m pytest app/test_documents.py
+    python -m app.test_documents
+"""
+import hashlib
+
+import pytest
+
+from .conftest import fake_pdf
+
+PDF_BYTES = fake_pdf(11) + b" " + bytes(range(256)) * 8
+
+
+def _upload(client, data=PDF_BYTES):
+    response = client.post(
+        "/upload", files={"file": ("a.pdf", data, "application/pdf")},
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_upload_is_content_addressed(client):
+    body = _upload(client)
+    assert body["document_id"] == hashlib.sha256(PDF_BYTES).hexdigest()
+    assert body["pdf"] == f"/documents/{body['document_id']}"
+    # the same bytes again are the same document
+    assert _upload(client)["document_id"] == body["document_id"]
+
+
+def test_get_document(client):
+    body = _upload(client)
+
+    response = client.get(body["pdf"])
+    assert response.status_code == 200
+    assert response.content == PDF_BYTES
+    assert response.headers["content-type"] == "application/pdf"
+    assert response.headers["etag"] == f'"{body["document_id"]}"'
+    assert response.headers["accept-ranges"] == "bytes"
+
+    head = client.head(body["pdf"])
+    assert head.status_code == 200
+    assert head.content == b""
+    assert int(head.headers["content-length"]) == len(PDF_BYTES)
+
+
+@pytest.mark.parametrize("if_none_match", [
+    '"{id}"',
+    'W/"{id}"',
+    '"something-else", "{id}"',
+    "*",
+])
+def test_if_none_match_is_304(client, if_none_match):
+    body = _upload(client)
+    etag = f'"{body["document_id"]}"'
+
+    response = client.get(
+        body["pdf"],
+        headers={"If-None-Match": if_none_match.format(id=body["document_id"])},
+    )
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+
+def test_stale_etag_gets_the_document(client):
+    body = _upload(client)
+    response = client.get(body["pdf"], headers={"If-None-Match": '"stale"'})
+    assert response.status_code == 200
+    assert response.content == PDF_BYTES
+
+
+def test_range_is_206(client):
+    body = _upload(client)
+
+    response = client.get(body["pdf"], headers={"Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.content == PDF_BYTES[100:200]
+    assert response.headers["content-range"] == f"bytes 100-199/{len(PDF_BYTES)}"
+
+    response = client.get(body["pdf"], headers={"Range": "bytes=-10"})
+    assert response.status_code == 206
+    assert response.content == PDF_BYTES[-10:]
+
+
+def test_if_range_with_another_etag_gets_the_whole_document(client):
+    body = _upload(client)
+    response = client.get(
+        body["pdf"], headers={"Range": "bytes=0-9", "If-Range": '"stale"'},
+    )
+    assert response.status_code == 200
+    assert response.content == PDF_BYTES
+
+
+@pytest.mark.parametrize("document_id", ["0" * 64, "not-a-hash", "..%2F..%2Fetc%2Fpasswd"])
+def test_unknown_document_is_404(client, document_id):
+    assert client.get(f"/documents/{document_id}").status_code == 404
+
+
+def test_extract_with_pdf_links_the_document(client):
+    response = client.post(
+        "/extract-with-pdf", files={"file": ("a.pdf", PDF_BYTES, "application/pdf")},
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert body["extraction"]["total_pages"] == 1
+    assert body["document_id"] == hashlib.sha256(PDF_BYTES).hexdigest()
+    assert client.get(body["pdf"]).content == PDF_BYTES
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
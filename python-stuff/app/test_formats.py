@@ -0,0 +1,113 @@
+"""
+Checks content negotiation of ExtractionResults: JSON by default, the
+columnar layout (and MessagePack, if installed) on request, both
+decoding back to the same result, 406 for formats we don't have, and
+Vary: Accept on every negotiated response. The app runs with poppler
+and tesseract stubbed out (see conftest.py):
+
+    python -m pytest app/test_formats.py
+    python -m app.test_formats
+"""
+import pytest
+
+from .conftest import fake_pdf
+from .extractor import ExtractedPage, ExtractedRow, ExtractionResult
+from .formats import (
+    COLUMNAR_MEDIA_TYPE,
+    JSON_MEDIA_TYPE,
+    MSGPACK_MEDIA_TYPE,
+    from_columnar,
+    negotiate,
+    to_columnar,
+)
+
+# not part of what was extracted
+_PER_REQUEST = {"cached", "recomputed_pages"}
+
+
+def _extract(client, accept=None):
+    headers = {"Accept": accept} if accept else {}
+    return client.post(
+        "/extract",
+        files={"file": ("a.pdf", fake_pdf(11, 12), "application/pdf")},
+        headers=headers,
+    )
+
+
+def _same(a: ExtractionResult, b: ExtractionResult) -> bool:
+    return a.model_dump(exclude=_PER_REQUEST) == b.model_dump(exclude=_PER_REQUEST)
+
+
+def test_json_is_the_default(client):
+    response = _extract(client)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == JSON_MEDIA_TYPE
+    assert "Accept" in response.headers["vary"]
+    result = ExtractionResult.model_validate_json(response.content)
+    assert result.total_pages == 2 and result.total_rows > 0
+
+
+def test_columnar_round_trip(client):
+    expected = ExtractionResult.model_validate_json(_extract(client).content)
+
+    response = _extract(client, COLUMNAR_MEDIA_TYPE)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == COLUMNAR_MEDIA_TYPE
+    assert "Accept" in response.headers["vary"]
+    doc = response.json()
+    assert doc["format"] == "columnar/1"
+    assert len(doc["rows"]["row_index"]) == expected.total_rows
+    assert _same(from_columnar(doc), expected)
+
+
+def test_msgpack_round_trip(client):
+    msgpack = pytest.importorskip("msgpack")
+    expected = ExtractionResult.model_validate_json(_extract(client).content)
+
+    response = _extract(client, "application/x-msgpack")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == MSGPACK_MEDIA_TYPE
+    assert _same(from_columnar(msgpack.unpackb(response.content)), expected)
+
+
+def test_unavailable_format_is_406_before_extracting(client, renderer):
+    response = _extract(client, "text/html, application/xml;q=0.9")
+    assert response.status_code == 406
+    assert COLUMNAR_MEDIA_TYPE in response.json()["detail"]
+    assert renderer.documents == 0
+
+
+def test_negotiate():
+    assert negotiate(None) == JSON_MEDIA_TYPE
+    assert negotiate("*/*") == JSON_MEDIA_TYPE
+    assert negotiate(f"{JSON_MEDIA_TYPE};q=0.5, {COLUMNAR_MEDIA_TYPE}") == COLUMNAR_MEDIA_TYPE
+    # a refused type is not picked for a wildcard
+    assert negotiate(f"{JSON_MEDIA_TYPE};q=0, */*") == COLUMNAR_MEDIA_TYPE
+    assert negotiate("text/html") is None
+
+
+def test_columnar_layout_keeps_scores_of_unreported_symbols():
+    row = ExtractedRow(
+        row_index=3, nro="7", symbols=["B"], symbol_scores={"A": 0.4, "B": 0.9},
+        kuvaus="Sauna", suoja="C16", kaapeli="MMJ 3x2,5S",
+    )
+    result = ExtractionResult(
+        status="ok", filename="a.pdf", total_pages=2, total_rows=2,
+        pages=[
+            ExtractedPage(page_number=1, rows=[], skipped_rois=5),
+            ExtractedPage(page_number=2, rows=[
+                row,
+                row.model_copy(update={"row_index": 4, "symbol_scores": {"B": 0.8}}),
+            ]),
+        ],
+        template_hash="abc",
+    )
+
+    doc = to_columnar(result)
+    assert doc["symbol_table"] == ["B", "A"]
+    assert doc["rows"]["scored"] == [[1, 0], None]
+    assert from_columnar(doc) == result
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,233 @@
+"""
+Checks the durable job store behind /upload/async: jobs that were
+running when the process stopped are queued again on start, workers
+report page progress, finished jobs and their files expire after the
+TTL, and GET /jobs/{id} and /jobs/{id}/result answer for jobs in every
+state. The store runs in a temporary directory, with the extraction
+stubbed out or, over HTTP, poppler and tesseract (see conftest.py):
+
+    python -m pytest app/test_jobs.py
+    python -m app.test_jobs
+"""
+import threading
+import time
+
+import pytest
+
+from . import jobs
+from .conftest import BROKEN_PDF, fake_pdf
+from .extractor import ExtractionResult
+from .jobs import DONE, FAILED, QUEUED, RUNNING, JobStore
+
+
+def _result(filename: str) -> ExtractionResult:
+    return ExtractionResult(
+        status="ok", filename=filename, total_pages=2, total_rows=0,
+        pages=[], template_hash="abc",
+    )
+
+
+class _Extraction:
+    """
+    Stands in for cached_extract_from_pdf_path: reports the first page,
+    waits for `release` (if it is cleared), reports the second and
+    returns a result – or fails for a file named "bad.pdf".
+    """
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+        self.calls = []
+
+    def __call__(self, path, filename, template_hash, progress):
+        self.calls.append(filename)
+        progress(1, 2)
+        self.started.set()
+        assert self.release.wait(10)
+        if filename == "bad.pdf":
+            raise ValueError("not a schedule")
+        progress(2, 2)
+        return _result(filename)
+
+
+def _wait(get_job, job_id, statuses=(DONE, FAILED), timeout=10.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = get_job(job_id)
+        if job is not None and job["status"] in statuses:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} is still {get_job(job_id)}")
+
+
+def _submit(store: JobStore, job_id: str, filename: str = "a.pdf"):
+    path = store.upload_dir / f"{job_id}.pdf"
+    path.write_bytes(b"%PDF-1.4")
+    store.submit(job_id, filename, path)
+    return path
+
+
+@pytest.fixture
+def extraction(monkeypatch) -> _Extraction:
+    extraction = _Extraction()
+    monkeypatch.setattr(jobs, "cached_extract_from_pdf_path", extraction)
+    return extraction
+
+
+@pytest.fixture
+def store(tmp_path, extraction):
+    store = JobStore(tmp_path / "uploads", workers=1)
+    yield store
+    store.stop()
+
+
+def test_running_jobs_are_requeued_on_start(tmp_path, extraction):
+    # the process went down halfway through a job
+    before = JobStore(tmp_path, workers=0)
+    _submit(before, "job-1")
+    before._update("job-1", status=RUNNING, pages_done=1, pages_total=2)
+
+    after = JobStore(tmp_path, workers=0)
+    after.start()
+    job = after.get("job-1")
+    assert job["status"] == QUEUED
+    assert job["pages_done"] == 0
+    assert after.queue_depth() == 1
+
+    # and a worker picks it up again
+    after = JobStore(tmp_path, workers=1)
+    after.start()
+    try:
+        assert _wait(after.get, "job-1")["status"] == DONE
+    finally:
+        after.stop()
+    assert extraction.calls == ["a.pdf"]
+    assert after.get_result("job-1") == _result("a.pdf")
+
+
+def test_progress(store, extraction):
+    extraction.release.clear()
+    store.start()
+    _submit(store, "job-1")
+
+    assert extraction.started.wait(10)
+    job = store.get("job-1")
+    assert job["status"] == RUNNING
+    assert (job["pages_done"], job["pages_total"]) == (1, 2)
+    assert store.get_result("job-1") is None
+
+    extraction.release.set()
+    job = _wait(store.get, "job-1")
+    assert job["status"] == DONE
+    assert (job["pages_done"], job["pages_total"]) == (2, 2)
+    assert job["finished_at"] is not None
+
+
+def test_failed_job(store):
+    store.start()
+    _submit(store, "job-1", "bad.pdf")
+
+    job = _wait(store.get, "job-1")
+    assert job["status"] == FAILED
+    assert job["error"] == "not a schedule"
+    assert store.get_result("job-1") is None
+
+
+def test_ttl_cleanup_removes_row_and_file(tmp_path, extraction):
+    store = JobStore(tmp_path, workers=1, ttl_seconds=60, cleanup_interval=3600)
+    store.start()
+    try:
+        done = _submit(store, "done")
+        failed = _submit(store, "failed", "bad.pdf")
+        for job_id in ("done", "failed"):
+            _wait(store.get, job_id)
+    finally:
+        store.stop()
+    queued = _submit(store, "queued")
+    finished_at = store.get("done")["finished_at"]
+
+    # nothing has expired yet
+    assert store.cleanup(finished_at + 30) == 0
+    assert done.exists() and store.get("done") is not None
+
+    assert store.cleanup(finished_at + 3600) == 2
+    assert store.get("done") is None and not done.exists()
+    assert store.get("failed") is None and not failed.exists()
+    # jobs that haven't finished are never removed
+    assert store.get("queued")["status"] == QUEUED and queued.exists()
+
+
+def test_cleanup_tolerates_missing_files(tmp_path, extraction):
+    store = JobStore(tmp_path, workers=0, ttl_seconds=60)
+    path = _submit(store, "job-1")
+    store._update("job-1", status=DONE, finished_at=time.time() - 120)
+    path.unlink()
+
+    assert store.cleanup() == 1
+    assert store.get("job-1") is None
+
+
+# ---------- HTTP ----------
+
+def _upload_async(client, data: bytes, filename: str = "a.pdf") -> dict:
+    response = client.post(
+        "/upload/async", files={"file": (filename, data, "application/pdf")},
+    )
+    assert response.status_code == 202
+    return response.json()
+
+
+def _job(client, job_id):
+    response = client.get(f"/jobs/{job_id}")
+    return response.json() if response.status_code == 200 else None
+
+
+def test_done_job(client):
+    body = _upload_async(client, fake_pdf(11, 12))
+    assert body["status_url"] == f"/jobs/{body['job_id']}"
+
+    job = _wait(lambda job_id: _job(client, job_id), body["job_id"])
+    assert job["status"] == DONE
+    assert (job["pages_done"], job["pages_total"]) == (2, 2)
+
+    response = client.get(body["result_url"])
+    assert response.status_code == 200
+    result = ExtractionResult.model_validate_json(response.content)
+    assert result.filename == "a.pdf"
+    assert result.total_pages == 2
+
+
+def test_failed_job_result_is_500(client):
+    body = _upload_async(client, BROKEN_PDF)
+
+    job = _wait(lambda job_id: _job(client, job_id), body["job_id"])
+    assert job["status"] == FAILED
+    response = client.get(body["result_url"])
+    assert response.status_code == 500
+    assert response.json()["detail"].startswith("Extraction failed: ")
+
+
+def test_pending_job_result_is_409(client, extraction):
+    extraction.release.clear()
+    try:
+        body = _upload_async(client, fake_pdf(11))
+        assert extraction.started.wait(10)
+
+        assert client.get(body["status_url"]).json()["status"] == RUNNING
+        response = client.get(body["result_url"])
+        assert response.status_code == 409
+        assert response.json()["detail"] == f"Job is {RUNNING}"
+    finally:
+        extraction.release.set()
+    _wait(lambda job_id: _job(client, job_id), body["job_id"])
+    assert client.get(body["result_url"]).status_code == 200
+
+
+def test_unknown_job_is_404(client):
+    assert client.get("/jobs/nope").status_code == 404
+    assert client.get("/jobs/nope/result").status_code == 404
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,125 @@
+"""
+Checks that the match modes agree: on the symbol strips of synthetic
+schedule pages (see benchmarks/synthetic.py), the pyramid search and
+the batched FFT matcher find exactly the detections of the exhaustive
+one, with the same scores up to float rounding, and the FFT response
+maps stay within that tolerance of `cv2.matchTemplate` everywhere.
+
+    python -m pytest app/test_matching.py
+    python -m app.test_matching
+"""
+import cv2
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import make_page
+
+from .fullExtractionClass import (
+    MATCH_THRESH,
+    ROW_MARGIN_BOTTOM,
+    ROW_MARGIN_TOP,
+    PageClassifier,
+    get_template_bank,
+    match_templates_in_row_multi_2d,
+    prep_row_roi_2d,
+)
+from .matching import NO_MATCH, batched_fft_responses, pyramid_response
+
+SEEDS = (0, 1, 2, 3)
+# scores may differ in the last bits of a float32
+SCORE_TOL = 1e-5
+
+
+def _symbol_strips(seed: int) -> list:
+    page, _ = make_page(seed)
+    classifier = PageClassifier()
+    h, w = page.shape[:2]
+    x1, x2 = classifier.column_ranges(w)["symbol"]
+    return [
+        page[y1 + ROW_MARGIN_TOP : y2 - ROW_MARGIN_BOTTOM, x1:x2]
+        for y1, y2 in classifier.row_bands(h)
+    ]
+
+
+def _detections(seed: int, mode: str) -> list[list[dict]]:
+    templates = get_template_bank().templates
+    return [
+        match_templates_in_row_multi_2d(roi, templates, MATCH_THRESH, mode=mode)
+        for roi in _symbol_strips(seed)
+    ]
+
+
+def _assert_same(rows: list[list[dict]], expected: list[list[dict]]) -> None:
+    assert len(rows) == len(expected)
+    for hits, want in zip(rows, expected):
+        assert [{**d, "score": None} for d in hits] == [
+            {**d, "score": None} for d in want
+        ]
+        assert [d["score"] for d in hits] == pytest.approx(
+            [d["score"] for d in want], abs=SCORE_TOL,
+        )
+
+
+@pytest.fixture(scope="module", params=SEEDS)
+def exhaustive(request) -> tuple[int, list[list[dict]]]:
+    return request.param, _detections(request.param, "exhaustive")
+
+
+def test_pages_have_symbols(exhaustive):
+    _, rows = exhaustive
+    assert any(rows) and not all(rows)
+
+
+def test_pyramid_matches_exhaustive(exhaustive):
+    seed, expected = exhaustive
+    # inside its windows the pyramid computes the very same response
+    _assert_same(_detections(seed, "pyramid"), expected)
+
+
+def test_pyramid_response_is_exact_where_searched():
+    templates = get_template_bank().templates
+    pruned = 0
+    for roi in _symbol_strips(SEEDS[0]):
+        bw = prep_row_roi_2d(roi)
+        for tpl in templates.values():
+            if tpl.shape[0] > bw.shape[0] or tpl.shape[1] > bw.shape[1]:
+                continue
+            res = pyramid_response(bw, tpl, MATCH_THRESH)
+            searched = res != NO_MATCH
+            pruned += int((~searched).sum())
+            expected = cv2.matchTemplate(bw, tpl, cv2.TM_CCOEFF_NORMED)
+            np.testing.assert_allclose(
+                res[searched], expected[searched], rtol=0, atol=SCORE_TOL,
+            )
+            # nothing left out would have been a detection
+            assert (expected[~searched] < MATCH_THRESH).all()
+    # the coarse pass did rule positions out
+    assert pruned > 0
+
+
+def test_fft_matches_exhaustive(exhaustive):
+    seed, expected = exhaustive
+    _assert_same(_detections(seed, "fft"), expected)
+
+
+@pytest.mark.parametrize("seed", SEEDS[:2])
+def test_fft_response_is_within_tolerance(seed):
+    templates = get_template_bank().templates
+    for roi in _symbol_strips(seed):
+        bw = prep_row_roi_2d(roi)
+        fitting = {
+            name: tpl for name, tpl in templates.items()
+            if tpl.shape[0] <= bw.shape[0] and tpl.shape[1] <= bw.shape[1]
+        }
+        responses = batched_fft_responses(bw, fitting)
+        assert responses.keys() == fitting.keys()
+        for name, tpl in fitting.items():
+            expected = cv2.matchTemplate(bw, tpl, cv2.TM_CCOEFF_NORMED)
+            assert responses[name].shape == expected.shape
+            np.testing.assert_allclose(
+                responses[name], expected, rtol=0, atol=SCORE_TOL, err_msg=name,
+            )
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,219 @@
+"""
+Checks batched OCR in the subprocess backend: all cells of a page go
+through one tesseract run over a list file, and its output, one text per
+image terminated by "\\f", is mapped back to the (row, field) keys – also
+when cells are empty and tesseract reads nothing from them. Also checks
+the OCR thread budget: the pool size set by `set_ocr_threads`, its split
+between page workers, and OMP_THREAD_LIMIT for pooled tesseract runs.
+
+pytesseract is replaced by a stub that "reads" every cell image as its
+size, so this runs without tesseract:
+
+    python -m pytest app/test_ocr.py
+    python -m app.test_ocr
+"""
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from . import extractor, ocr
+
+
+class _FakeTesseract:
+    """
+    Reads a cell as "<width>x<height>", and a blank cell as nothing;
+    a list file gives the texts of its images, each followed by "\\f",
+    the way tesseract's txt renderer does. `pages` overrides how many
+    texts a list file returns.
+    """
+
+    def __init__(self, pages=None):
+        self.pages = pages
+        self.calls = []
+
+    @staticmethod
+    def _read(img: np.ndarray) -> str:
+        if not (img < 128).any():
+            return ""
+        h, w = img.shape[:2]
+        return f"{w}x{h}\n"
+
+    def image_to_string(self, image, lang=None):
+        if not isinstance(image, str):
+            self.calls.append(1)
+            return self._read(image)
+
+        with open(image, encoding="utf-8") as fh:
+            paths = [line.strip() for line in fh if line.strip()]
+        self.calls.append(len(paths))
+        texts = [self._read(cv2.imread(p, cv2.IMREAD_GRAYSCALE)) for p in paths]
+        return "".join(text + ocr.PAGE_SEPARATOR for text in texts[: self.pages])
+
+
+def _cell(w: int, h: int, ink: bool = True) -> np.ndarray:
+    bw = np.full((h, w), 255, np.uint8)
+    if ink:
+        bw[h // 4 : h // 2, 2 : w - 2] = 0
+    return bw
+
+
+def _page_cells() -> dict:
+    cells = {}
+    for row in range(1, 6):
+        for i, field in enumerate(("nro", "kuvaus", "suoja", "kaapeli")):
+            # every third cell is blank
+            cells[(row, field)] = _cell(20 + 10 * row, 10 + i, ink=(row + i) % 3 != 0)
+    return cells
+
+
+def _expected(cells: dict) -> dict:
+    return {
+        key: f"{bw.shape[1]}x{bw.shape[0]}" if (bw < 128).any() else ""
+        for key, bw in cells.items()
+    }
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    monkeypatch.setattr(ocr, "OCR_BATCH", True)
+    return ocr.SubprocessOcrBackend()
+
+
+def test_batch_maps_texts_back_to_cells(backend, monkeypatch):
+    fake = _FakeTesseract()
+    monkeypatch.setattr(ocr.pytesseract, "image_to_string", fake.image_to_string)
+    cells = _page_cells()
+
+    texts = backend._recognize_many(cells)
+
+    assert fake.calls == [len(cells)]
+    assert texts == _expected(cells)
+    assert "" in texts.values()
+
+
+def test_trailing_empty_cells(backend, monkeypatch):
+    monkeypatch.setattr(
+        ocr.pytesseract, "image_to_string", _FakeTesseract().image_to_string,
+    )
+    cells = {
+        (1, "nro"): _cell(30, 12),
+        (1, "kuvaus"): _cell(40, 12, ink=False),
+        (2, "nro"): _cell(50, 12, ink=False),
+    }
+    assert backend._recognize_many(cells) == {
+        (1, "nro"): "30x12", (1, "kuvaus"): "", (2, "nro"): "",
+    }
+
+
+def test_short_output_falls_back_to_single_cells(backend, monkeypatch):
+    fake = _FakeTesseract(pages=3)
+    monkeypatch.setattr(ocr.pytesseract, "image_to_string", fake.image_to_string)
+    cells = _page_cells()
+
+    texts = backend._recognize_many(cells)
+
+    # never guess: the whole batch is recognised again, cell by cell
+    assert fake.calls == [len(cells)] + [1] * len(cells)
+    assert texts == _expected(cells)
+
+
+def test_chunked_on_the_ocr_pool(backend, monkeypatch):
+    fake = _FakeTesseract()
+    monkeypatch.setattr(ocr.pytesseract, "image_to_string", fake.image_to_string)
+    monkeypatch.setattr(ocr, "OCR_CHUNK_MIN_CELLS", 4)
+    cells = _page_cells()
+
+    assert backend.recognize_many(cells) == _expected(cells)
+    assert sum(fake.calls) == len(cells)
+
+
+# ---------- thread budget ----------
+
+@pytest.fixture
+def budget(monkeypatch):
+    """
+    A fresh OCR budget: no pool yet (set_ocr_threads refuses to resize a
+    running one) and no OMP_THREAD_LIMIT; the pool is shut down after.
+    """
+    ocr.shutdown_ocr_pool()
+    monkeypatch.setattr(ocr, "_ocr_pool", None)
+    monkeypatch.setattr(ocr, "_ocr_threads", ocr.OCR_THREADS)
+    monkeypatch.delenv("OMP_THREAD_LIMIT", raising=False)
+    yield
+    ocr.shutdown_ocr_pool()
+
+
+def test_set_ocr_threads_sizes_the_pool(budget):
+    ocr.set_ocr_threads(3)
+    pool = ocr.get_ocr_pool()
+    assert pool._max_workers == 3
+    assert ocr.get_ocr_pool() is pool
+
+    # never resized under running requests
+    with pytest.raises(RuntimeError):
+        ocr.set_ocr_threads(2)
+    assert ocr.get_ocr_pool() is pool
+
+    ocr.shutdown_ocr_pool()
+    ocr.set_ocr_threads(2)
+    assert ocr.get_ocr_pool()._max_workers == 2
+
+
+@pytest.mark.parametrize("threads", [1, 0, -3])
+def test_one_thread_means_no_pool(budget, threads):
+    ocr.set_ocr_threads(threads)
+    assert ocr._ocr_threads == 1
+    assert ocr.get_ocr_pool() is None
+
+
+@pytest.mark.parametrize("total, workers, share", [
+    (8, 2, 4), (8, 3, 2), (4, 4, 1), (2, 4, 1),
+])
+def test_page_workers_split_the_budget(budget, monkeypatch, total, workers, share):
+    monkeypatch.setattr(extractor, "OCR_THREADS", total)
+    monkeypatch.setattr(extractor, "get_template_bank", lambda: None)
+    monkeypatch.setattr(extractor, "get_ocr_backend", lambda: None)
+    cv_threads = cv2.getNumThreads()
+    try:
+        extractor._init_page_worker(workers)
+    finally:
+        cv2.setNumThreads(cv_threads)
+
+    assert ocr._ocr_threads == share
+    # tesseract runs single-threaded only when they run side by side
+    assert os.environ.get("OMP_THREAD_LIMIT") == ("1" if share > 1 else None)
+
+
+def test_limit_tesseract_threads(budget):
+    ocr.set_ocr_threads(1)
+    ocr.limit_tesseract_threads()
+    assert "OMP_THREAD_LIMIT" not in os.environ
+
+    ocr.set_ocr_threads(4)
+    ocr.limit_tesseract_threads()
+    assert os.environ["OMP_THREAD_LIMIT"] == "1"
+
+
+def test_limit_tesseract_threads_keeps_an_explicit_limit(budget, monkeypatch):
+    monkeypatch.setenv("OMP_THREAD_LIMIT", "2")
+    ocr.set_ocr_threads(4)
+    ocr.limit_tesseract_threads()
+    assert os.environ["OMP_THREAD_LIMIT"] == "2"
+
+
+def test_chunks_follow_the_budget(budget, backend, monkeypatch):
+    fake = _FakeTesseract()
+    monkeypatch.setattr(ocr.pytesseract, "image_to_string", fake.image_to_string)
+    monkeypatch.setattr(ocr, "OCR_CHUNK_MIN_CELLS", 1)
+    ocr.set_ocr_threads(3)
+    cells = _page_cells()
+
+    assert backend.recognize_many(cells) == _expected(cells)
+    assert len(fake.calls) == 3
+    assert sum(fake.calls) == len(cells)
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,170 @@
+"""
+Checks the pluggable OCR backends: OCR_BACKEND picks the engine, with
+the subprocess backend as the fallback for unknown names and a missing
+tesserocr, and the tesserocr backend keeps one long-lived engine per
+thread, reused for every cell that thread reads and ended on close.
+
+tesserocr is replaced by a fake module whose engine "reads" a cell as
+its size, so this runs without it (or tesseract) installed:
+
+    python -m pytest app/test_ocr_backends.py
+    python -m app.test_ocr_backends
+"""
+import sys
+import threading
+import types
+
+import numpy as np
+import pytest
+
+from . import ocr
+
+
+class _FakeApi:
+    """
+    Stands in for tesserocr.PyTessBaseAPI. Tesseract engines are not
+    thread-safe, so every call checks it comes from the creating thread.
+    """
+
+    created: list = []
+
+    def __init__(self, lang):
+        self.lang = lang
+        self.thread = threading.get_ident()
+        self.cells = 0
+        self.ended = False
+        self._size = None
+        _FakeApi.created.append(self)
+
+    def _check(self):
+        assert not self.ended
+        assert threading.get_ident() == self.thread
+
+    def SetImageBytes(self, data, width, height, bytes_per_pixel, bytes_per_line):
+        self._check()
+        assert len(data) == height * bytes_per_line
+        assert (bytes_per_pixel, bytes_per_line) == (1, width)
+        self._size = (width, height)
+
+    def GetUTF8Text(self):
+        self._check()
+        self.cells += 1
+        return "{}x{}\n".format(*self._size)
+
+    def End(self):
+        self.ended = True
+
+
+@pytest.fixture
+def tesserocr(monkeypatch):
+    _FakeApi.created = []
+    module = types.ModuleType("tesserocr")
+    module.PyTessBaseAPI = _FakeApi
+    monkeypatch.setitem(sys.modules, "tesserocr", module)
+    return module
+
+
+@pytest.fixture
+def fresh_backend(monkeypatch):
+    """
+    No process-wide backend yet; whatever the test creates is closed.
+    """
+    monkeypatch.setattr(ocr, "_backend", None)
+    yield
+    if ocr._backend is not None:
+        ocr._backend.close()
+
+
+def _cell(w: int, h: int) -> np.ndarray:
+    return np.full((h, w), 255, np.uint8)
+
+
+def test_factory(tesserocr):
+    assert isinstance(ocr._create_backend("subprocess"), ocr.SubprocessOcrBackend)
+    assert isinstance(ocr._create_backend("nonsense"), ocr.SubprocessOcrBackend)
+    backend = ocr._create_backend("tesserocr")
+    assert isinstance(backend, ocr.TesserocrBackend)
+    assert backend.name == "tesserocr"
+
+
+def test_factory_without_tesserocr(monkeypatch):
+    # an import of a module set to None raises ImportError
+    monkeypatch.setitem(sys.modules, "tesserocr", None)
+    assert isinstance(ocr._create_backend("tesserocr"), ocr.SubprocessOcrBackend)
+
+
+def test_ocr_backend_env_selects_the_shared_backend(tesserocr, fresh_backend, monkeypatch):
+    monkeypatch.setattr(ocr, "OCR_BACKEND_ENV", "tesserocr")
+    backend = ocr.get_ocr_backend()
+    assert isinstance(backend, ocr.TesserocrBackend)
+    assert ocr.get_ocr_backend() is backend
+
+    assert ocr.ocr_cell(_cell(30, 12)) == "30x12"
+    assert backend.stats.as_dict()["cells"] == 1
+
+
+def test_one_engine_per_thread(tesserocr, monkeypatch):
+    monkeypatch.setattr(ocr, "OCR_LANG", "fin")
+    backend = ocr.TesserocrBackend()
+
+    assert backend.recognize(_cell(30, 12)) == "30x12"
+    assert backend.recognize(_cell(40, 10)) == "40x10"
+    assert len(_FakeApi.created) == 1
+    assert _FakeApi.created[0].lang == "fin"
+
+    texts = {}
+
+    def read(n: int) -> None:
+        for i in range(5):
+            texts[(n, i)] = backend.recognize(_cell(10 + n, 10 + i))
+
+    threads = [threading.Thread(target=read, args=(n,)) for n in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert texts == {(n, i): f"{10 + n}x{10 + i}" for n in range(3) for i in range(5)}
+    # one more engine per thread, each reused for all of its cells
+    assert len(_FakeApi.created) == 4
+    assert [api.cells for api in _FakeApi.created] == [2, 5, 5, 5]
+    assert backend.stats.as_dict()["calls"] == 17
+
+
+def test_close_ends_every_engine(tesserocr):
+    backend = ocr.TesserocrBackend()
+    backend.recognize(_cell(30, 12))
+    t = threading.Thread(target=backend.recognize, args=(_cell(30, 12),))
+    t.start()
+    t.join()
+
+    backend.close()
+    assert len(_FakeApi.created) == 2
+    assert all(api.ended for api in _FakeApi.created)
+
+    # a new engine after closing
+    assert backend.recognize(_cell(20, 10)) == "20x10"
+    assert len(_FakeApi.created) == 3 and not _FakeApi.created[-1].ended
+
+
+def test_tesserocr_cells_on_the_ocr_pool(tesserocr, monkeypatch):
+    ocr.shutdown_ocr_pool()
+    monkeypatch.setattr(ocr, "_ocr_pool", None)
+    monkeypatch.setattr(ocr, "_ocr_threads", 3)
+    backend = ocr.TesserocrBackend()
+    cells = {(row, "suoja"): _cell(20 + row, 12) for row in range(1, 12)}
+    try:
+        texts = backend.recognize_many(cells)
+    finally:
+        ocr.shutdown_ocr_pool()
+        backend.close()
+
+    assert texts == {key: f"{bw.shape[1]}x12" for key, bw in cells.items()}
+    # read on the pool's threads, each with its own engine
+    assert 1 <= len(_FakeApi.created) <= 3
+    assert all(api.thread != threading.get_ident() for api in _FakeApi.created)
+    assert sum(api.cells for api in _FakeApi.created) == len(cells)
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
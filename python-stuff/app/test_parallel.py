@@ -0,0 +1,108 @@
+"""
+Checks that page-parallel extraction gives exactly the serial result:
+the same synthetic PDF is extracted with EXTRACT_WORKERS=0 and
+EXTRACT_WORKERS=2 and the two ExtractionResults must be equal.
+
+Poppler is replaced by a fake renderer that hands out synthetic schedule
+pages (see benchmarks/synthetic.py), and tesseract by a small script that
+"reads" every cell as a digest of its pixels. The script is put in
+TESSERACT_CMD, so the spawned page workers pick it up as well:
+
+    python -m pytest app/test_parallel.py
+    python -m app.test_parallel
+"""
+import stat
+import sys
+
+import cv2
+import pytesseract
+from PIL import Image
+
+from benchmarks.synthetic import load_templates, make_page
+
+from . import extractor, text_layer
+
+SEEDS = (11, 12, 13, 14)
+
+# Reads an image or a list file of images the way tesseract's txt
+# renderer does: one text per image, each terminated by "\f". Blank
+# cells read as nothing.
+_FAKE_TESSERACT = '''#!{python}
+import hashlib
+import sys
+
+import cv2
+
+src, out_base = sys.argv[1], sys.argv[2]
+if src.endswith(".txt"):
+    with open(src, encoding="utf-8") as fh:
+        images = [line.strip() for line in fh if line.strip()]
+else:
+    images = [src]
+
+texts = []
+for path in images:
+    gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    ink = (gray < 128).any()
+    texts.append(hashlib.md5(gray.tobytes()).hexdigest()[:12] if ink else "")
+
+with open(out_base + ".txt", "w", encoding="utf-8") as fh:
+    fh.write("".join(text + "\\n\\f" for text in texts))
+'''
+
+
+class _FakeRenderer:
+    def __init__(self, seeds):
+        templates = load_templates()
+        self.pages = [
+            Image.fromarray(cv2.cvtColor(make_page(seed, templates)[0], cv2.COLOR_BGR2RGB))
+            for seed in seeds
+        ]
+
+    def pdfinfo_from_path(self, pdf_path):
+        return {"Pages": len(self.pages)}
+
+    def convert_from_path(self, pdf_path, dpi, first_page, last_page):
+        return [page.copy() for page in self.pages[first_page - 1 : last_page]]
+
+
+def _fake_tesseract(tmp_path, monkeypatch) -> None:
+    cmd = tmp_path / "tesseract"
+    cmd.write_text(_FAKE_TESSERACT.format(python=sys.executable))
+    cmd.chmod(cmd.stat().st_mode | stat.S_IXUSR)
+    # this process reads the setting at import time, the workers on spawn
+    monkeypatch.setattr(pytesseract.pytesseract, "tesseract_cmd", str(cmd))
+    monkeypatch.setenv("TESSERACT_CMD", str(cmd))
+
+
+def _extract(workers: int, monkeypatch) -> extractor.ExtractionResult:
+    monkeypatch.setattr(extractor, "EXTRACT_WORKERS", workers)
+    return extractor.extract_from_pdf_path("fake.pdf", "fake.pdf")
+
+
+def test_parallel_matches_serial(tmp_path, monkeypatch):
+    _fake_tesseract(tmp_path, monkeypatch)
+    renderer = _FakeRenderer(SEEDS)
+    monkeypatch.setattr(extractor, "pdfinfo_from_path", renderer.pdfinfo_from_path)
+    monkeypatch.setattr(extractor, "convert_from_path", renderer.convert_from_path)
+    # the fake PDF has no text layer to read
+    monkeypatch.setattr(text_layer, "TEXT_LAYER", False)
+
+    extractor.shutdown_page_pool()
+    try:
+        serial = _extract(0, monkeypatch)
+        parallel = _extract(2, monkeypatch)
+    finally:
+        extractor.shutdown_page_pool()
+
+    assert serial.total_pages == len(SEEDS)
+    assert serial.total_rows > 0
+    # the stub must actually have been used, or the comparison is empty
+    assert any(row.kuvaus for page in serial.pages for row in page.rows)
+    assert parallel == serial
+
+
+if __name__ == "__main__":
+    import pytest
+
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,181 @@
+"""
+Checks the vectorised peak extraction and NMS of the template matcher
+(`_response_peaks` + `_non_max_suppression`) against the greedy
+minMaxLoc loop they replaced, on synthetic response maps.
+
+The maps are built so that every pixel at or above the threshold is a
+local maximum (isolated peaks, and plateaus of equal pixels). On such
+maps the greedy loop and the vectorised version must report exactly the
+same hits; on real maps the loop additionally reports weak duplicates
+on the slopes of a peak, which is the intended difference.
+
+    python -m pytest app/test_peaks.py
+    python -m app.test_peaks
+"""
+import math
+
+import cv2
+import numpy as np
+import pytest
+
+from .fullExtractionClass import _non_max_suppression, _response_peaks
+
+THRESH = 0.5
+NMS_MARGIN = 3
+
+
+def _greedy_reference(maps, sizes, thresh, nms_margin, across_templates=False):
+    """
+    The old loop: take the best position of all maps, blank the box
+    around it, repeat until nothing reaches `thresh`. With
+    `across_templates` the box also blanks the positions of the other
+    templates whose centre falls in it. Returns {(label, x, y, score)}.
+    """
+    maps = [m.copy() for m in maps]
+    hits = set()
+    while True:
+        best = None
+        for label, res in enumerate(maps):
+            _, max_val, _, max_loc = cv2.minMaxLoc(res)
+            if best is None or max_val > best[0]:
+                best = (max_val, label, max_loc)
+        max_val, label, (x, y) = best
+        if max_val < thresh:
+            return hits
+        hits.add((label, x, y, float(max_val)))
+
+        tw, th = sizes[label]
+        x0, y0 = x - nms_margin, y - nms_margin
+        x1, y1 = x + tw + nms_margin, y + th + nms_margin
+        for other, res in enumerate(maps):
+            if other == label:
+                res[max(0, y0):max(0, y1), max(0, x0):max(0, x1)] = -1.0
+            elif across_templates:
+                ow, oh = sizes[other]
+                # positions whose centre (x + ow/2, y + oh/2) is in the box
+                bx0, bx1 = (max(0, math.ceil(v - ow / 2)) for v in (x0, x1))
+                by0, by1 = (max(0, math.ceil(v - oh / 2)) for v in (y0, y1))
+                res[by0:by1, bx0:bx1] = -1.0
+
+
+def _vectorised(maps, sizes, thresh, nms_margin, across_templates=False):
+    xs, ys, scores, labels, widths, heights = [], [], [], [], [], []
+    for label, res in enumerate(maps):
+        py, px, ps = _response_peaks(res, thresh)
+        xs.append(px)
+        ys.append(py)
+        scores.append(ps)
+        labels.append(np.full(len(ps), label))
+        widths.append(np.full(len(ps), sizes[label][0]))
+        heights.append(np.full(len(ps), sizes[label][1]))
+    xs, ys, scores, labels, widths, heights = (
+        np.concatenate(a) for a in (xs, ys, scores, labels, widths, heights)
+    )
+    kept = _non_max_suppression(
+        xs, ys, widths, heights, scores, labels, nms_margin, across_templates,
+    )
+    return {
+        (int(labels[i]), int(xs[i]), int(ys[i]), float(scores[i])) for i in kept
+    }
+
+
+def _response_map(rng, shape=(40, 160), peaks=25, plateaus=4):
+    """
+    Noise below THRESH with isolated peaks and small plateaus above it;
+    no two above-threshold pixels touch unless they are one plateau.
+    """
+    h, w = shape
+    res = rng.uniform(-0.2, THRESH * 0.9, shape).astype(np.float32)
+    taken = np.zeros(shape, bool)
+
+    def place(y, x, ph, pw, score):
+        ys, xs = slice(max(0, y - 1), y + ph + 1), slice(max(0, x - 1), x + pw + 1)
+        if taken[ys, xs].any():
+            return
+        res[y:y + ph, x:x + pw] = score
+        taken[y:y + ph, x:x + pw] = True
+
+    for _ in range(peaks):
+        place(int(rng.integers(h)), int(rng.integers(w)), 1, 1,
+              rng.uniform(THRESH, 1.0))
+    for _ in range(plateaus):
+        place(int(rng.integers(h - 3)), int(rng.integers(w - 3)),
+              int(rng.integers(1, 4)), int(rng.integers(2, 4)),
+              rng.uniform(THRESH, 1.0))
+    return res
+
+
+def test_response_peaks_is_a_dilation():
+    rng = np.random.default_rng(0)
+    res = rng.uniform(-1, 1, (60, 200)).astype(np.float32)
+    res = cv2.GaussianBlur(res, (5, 5), 0)
+
+    ys, xs, scores = _response_peaks(res, 0.1)
+
+    # a peak is a pixel not below anything in its 3×3 neighbourhood
+    local_max = res >= cv2.dilate(res, np.ones((3, 3), np.uint8))
+    exp_ys, exp_xs = np.nonzero(local_max & (res >= 0.1))
+    assert np.array_equal(ys, exp_ys)
+    assert np.array_equal(xs, exp_xs)
+    assert np.array_equal(scores, res[exp_ys, exp_xs])
+
+
+def test_response_peaks_below_threshold():
+    res = np.full((10, 10), 0.3, np.float32)
+    ys, xs, scores = _response_peaks(res, THRESH)
+    assert len(ys) == len(xs) == len(scores) == 0
+
+
+def test_plateau_is_one_hit():
+    res = np.zeros((20, 40), np.float32)
+    res[5:7, 10:13] = 0.8  # 2×3 plateau
+    sizes = [(12, 8)]
+
+    hits = _vectorised([res], sizes, THRESH, NMS_MARGIN)
+    # the first plateau pixel in row-major order, like cv2.minMaxLoc
+    assert hits == {(0, 10, 5, float(np.float32(0.8)))}
+    assert hits == _greedy_reference([res], sizes, THRESH, NMS_MARGIN)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_single_template_matches_greedy_loop(seed):
+    rng = np.random.default_rng(seed)
+    res = _response_map(rng)
+    sizes = [(int(rng.integers(4, 30)), int(rng.integers(4, 20)))]
+
+    expected = _greedy_reference([res], sizes, THRESH, NMS_MARGIN)
+    assert expected
+    assert _vectorised([res], sizes, THRESH, NMS_MARGIN) == expected
+
+
+@pytest.mark.parametrize("across_templates", [False, True])
+@pytest.mark.parametrize("seed", range(20))
+def test_several_templates_match_greedy_loop(seed, across_templates):
+    rng = np.random.default_rng(100 + seed)
+    sizes = [
+        (int(rng.integers(4, 30)), int(rng.integers(4, 20))) for _ in range(3)
+    ]
+    maps = [_response_map(rng, peaks=12, plateaus=2) for _ in sizes]
+
+    expected = _greedy_reference(maps, sizes, THRESH, NMS_MARGIN, across_templates)
+    actual = _vectorised(maps, sizes, THRESH, NMS_MARGIN, across_templates)
+    assert actual == expected
+
+
+def test_cross_template_flag():
+    sizes = [(20, 10), (20, 10)]
+    strong = np.zeros((30, 100), np.float32)
+    weak = np.zeros((30, 100), np.float32)
+    strong[5, 10] = 0.9
+    weak[6, 14] = 0.7   # overlaps the strong hit
+    weak[6, 60] = 0.6   # somewhere else in the row
+
+    independent = _vectorised([strong, weak], sizes, THRESH, NMS_MARGIN)
+    assert {(label, x) for label, x, _, _ in independent} == {(0, 10), (1, 14), (1, 60)}
+
+    across = _vectorised([strong, weak], sizes, THRESH, NMS_MARGIN, True)
+    assert {(label, x) for label, x, _, _ in across} == {(0, 10), (1, 60)}
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
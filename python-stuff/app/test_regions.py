@@ -0,0 +1,165 @@
+"""
+Checks region rendering (RASTER_MODE=regions): every crop PageRegions
+hands out lines up with the same crop of the full page rendered at the
+region's DPI, whether the region was rendered at the layout DPI or at
+another one, and a page classified from its regions reads the same rows
+as the full page.
+
+pdftoppm is replaced by a small script that renders a synthetic schedule
+page (see benchmarks/synthetic.py) at -r and cuts the -x/-y/-W/-H box
+out of it, the way poppler's crop-box rendering does:
+
+    python -m pytest app/test_regions.py
+    python -m app.test_regions
+"""
+import hashlib
+import math
+import os
+import stat
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import PAGE_DPI, PAGE_H, PAGE_W, make_page
+
+from . import extractor, fullExtractionClass
+from .extractor import RASTER_DPI, iter_pdf_regions
+from .fullExtractionClass import OCR_FIELDS, PageClassifier, PageRegions
+
+SEED = 21
+WIDTH_PT = PAGE_W * 72 / PAGE_DPI
+HEIGHT_PT = PAGE_H * 72 / PAGE_DPI
+
+_FAKE_PDFTOPPM = '''#!{python}
+import math
+import sys
+
+import cv2
+
+args = sys.argv[1:]
+opts = {{}}
+while args[0].startswith("-"):
+    flag = args.pop(0)
+    if flag != "-gray":
+        opts[flag] = int(args.pop(0))
+
+page = cv2.imread({page!r}, cv2.IMREAD_GRAYSCALE)
+dpi = opts["-r"]
+size = (math.ceil({width_pt!r} * dpi / 72), math.ceil({height_pt!r} * dpi / 72))
+if size != (page.shape[1], page.shape[0]):
+    page = cv2.resize(page, size, interpolation=cv2.INTER_AREA)
+x, y = opts["-x"], opts["-y"]
+box = page[y : y + opts["-H"], x : x + opts["-W"]]
+ok, buf = cv2.imencode(".pgm", box)
+sys.stdout.buffer.write(buf.tobytes())
+'''
+
+
+def render(gray: np.ndarray, dpi: int) -> np.ndarray:
+    """
+    The full page at `dpi`, as the fake pdftoppm renders it.
+    """
+    size = (math.ceil(WIDTH_PT * dpi / 72), math.ceil(HEIGHT_PT * dpi / 72))
+    if size == (gray.shape[1], gray.shape[0]):
+        return gray
+    return cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+
+
+@pytest.fixture
+def page(tmp_path, monkeypatch) -> np.ndarray:
+    bgr, _ = make_page(SEED)
+    gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+    cv2.imwrite(str(tmp_path / "page.png"), gray)
+
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    script = bin_dir / "pdftoppm"
+    script.write_text(_FAKE_PDFTOPPM.format(
+        python=sys.executable, page=str(tmp_path / "page.png"),
+        width_pt=WIDTH_PT, height_pt=HEIGHT_PT,
+    ))
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+
+    def pdfinfo_from_path(pdf_path, first_page=None, last_page=None):
+        return {"Pages": 1, "Page    1 size": f"{WIDTH_PT!r} x {HEIGHT_PT!r} pts"}
+
+    monkeypatch.setattr(extractor, "pdfinfo_from_path", pdfinfo_from_path)
+    (tmp_path / "page.pdf").write_bytes(b"%PDF-1.4")
+    return gray
+
+
+def _regions(tmp_path, symbol_dpi: int, text_dpi: int) -> PageRegions:
+    pages = list(iter_pdf_regions(
+        str(tmp_path / "page.pdf"), total=1,
+        symbol_dpi=symbol_dpi, text_dpi=text_dpi,
+    ))
+    assert [n for n, _ in pages] == [1]
+    return pages[0][1]
+
+
+def _boxes(classifier: PageClassifier) -> list[tuple[str, tuple[int, int, int, int]]]:
+    """
+    Every box `classify` crops (layout pixels): the symbol strip and the
+    text cells of each row.
+    """
+    columns = classifier.column_ranges(PAGE_W)
+    boxes = []
+    for y1, y2 in classifier.row_bands(PAGE_H):
+        for field in ("symbol",) + OCR_FIELDS:
+            x1, x2 = columns[field]
+            boxes.append((field, (x1, y1, x2, y2)))
+    return boxes
+
+
+@pytest.mark.parametrize("symbol_dpi, text_dpi", [
+    (RASTER_DPI, RASTER_DPI),
+    (2 * RASTER_DPI, RASTER_DPI),
+    (RASTER_DPI, 200),
+    (150, 450),
+])
+def test_region_crops_line_up_with_the_full_page(tmp_path, page, symbol_dpi, text_dpi):
+    regions = _regions(tmp_path, symbol_dpi, text_dpi)
+    assert regions.shape == (PAGE_H, PAGE_W)
+    assert set(regions.regions) == {"symbol", "text"}
+
+    full = {dpi: render(page, dpi) for dpi in {symbol_dpi, text_dpi}}
+    for field, (x1, y1, x2, y2) in _boxes(PageClassifier()):
+        dpi = symbol_dpi if field == "symbol" else text_dpi
+        crop, scale = regions.crop(x1, y1, x2, y2)
+        assert scale == dpi / RASTER_DPI
+        expected = full[dpi][
+            round(y1 * scale) : round(y2 * scale),
+            round(x1 * scale) : round(x2 * scale),
+        ]
+        assert crop.shape == expected.shape, (field, x1, y1)
+        np.testing.assert_array_equal(crop, expected)
+
+
+def test_region_crops_at_layout_dpi_equal_page_crops(tmp_path, page):
+    regions = _regions(tmp_path, RASTER_DPI, RASTER_DPI)
+    whole = PageRegions.whole(page)
+    for _, box in _boxes(PageClassifier()):
+        np.testing.assert_array_equal(regions.crop(*box)[0], whole.crop(*box)[0])
+
+
+def test_classify_regions_like_the_full_page(tmp_path, page, monkeypatch):
+    def fake_ocr_cells(cells):
+        return {
+            key: hashlib.md5(bw.tobytes()).hexdigest()[:12]
+            for key, bw in cells.items()
+        }
+
+    monkeypatch.setattr(fullExtractionClass, "ocr_cells", fake_ocr_cells)
+    classifier = PageClassifier()
+    expected = classifier.classify(cv2.cvtColor(page, cv2.COLOR_GRAY2BGR))
+    assert any(row["unique_symbols"] for row in expected)
+
+    rows = classifier.classify(_regions(tmp_path, RASTER_DPI, RASTER_DPI))
+    assert rows == expected
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
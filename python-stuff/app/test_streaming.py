@@ -0,0 +1,165 @@
+"""
+Checks that PDF rasterisation is streamed: only a bounded number of
+rendered pages is alive at any time, so peak memory stays flat as the
+page count grows. And that streamed responses are: the worker producing
+records stays at most a few records ahead of a slow client, stops when
+the client goes away, and a finished stream fills the result cache.
+
+Poppler is replaced by a fake renderer that hands out large PIL pages,
+so this runs without any system dependencies:
+
+    python -m pytest app/test_streaming.py
+    python -m app.test_streaming
+"""
+import asyncio
+import json
+import threading
+import tracemalloc
+import weakref
+
+import numpy as np
+from PIL import Image
+
+from . import extractor
+from .admission import ExtractionGate
+from .conftest import fake_pdf
+from .streaming import STREAM_QUEUE_RECORDS, stream_records
+
+# roughly an A4 page at 150 DPI – big enough to dominate the allocations
+PAGE_W, PAGE_H = 1240, 1754
+
+
+class _FakeRenderer:
+    def __init__(self, total_pages: int):
+        self.total_pages = total_pages
+        self.alive = 0
+        self.max_alive = 0
+
+    def _released(self):
+        self.alive -= 1
+
+    def pdfinfo_from_path(self, pdf_path):
+        return {"Pages": self.total_pages}
+
+    def convert_from_path(self, pdf_path, dpi, first_page, last_page):
+        pages = []
+        for _ in range(first_page, last_page + 1):
+            img = Image.new("RGB", (PAGE_W, PAGE_H), (255, 255, 255))
+            self.alive += 1
+            self.max_alive = max(self.max_alive, self.alive)
+            weakref.finalize(img, self._released)
+            pages.append(img)
+        return pages
+
+
+def _run(total_pages: int, monkeypatch) -> tuple[int, int]:
+    renderer = _FakeRenderer(total_pages)
+    monkeypatch.setattr(extractor, "pdfinfo_from_path", renderer.pdfinfo_from_path)
+    monkeypatch.setattr(extractor, "convert_from_path", renderer.convert_from_path)
+    monkeypatch.setattr(
+        extractor, "extract_page",
+        lambda page_img, page_number, bank=None, debug=None, page_text=None: extractor.ExtractedPage(
+            page_number=page_number, rows=[],
+        ),
+    )
+
+    tracemalloc.start()
+    result = extractor.extract_from_pdf_bytes(b"%PDF-1.4 fake", "fake.pdf")
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert result.total_pages == total_pages
+    assert [p.page_number for p in result.pages] == list(range(1, total_pages + 1))
+    return renderer.max_alive, peak
+
+
+def test_peak_memory_is_constant_in_page_count(monkeypatch):
+    alive_small, peak_small = _run(3, monkeypatch)
+    alive_large, peak_large = _run(30, monkeypatch)
+
+    # never more than one render window of pages in memory
+    assert alive_small <= extractor.RASTER_WINDOW
+    assert alive_large <= extractor.RASTER_WINDOW
+
+    # 10× the pages must not mean 10× the memory
+    page_bytes = PAGE_W * PAGE_H * 3
+    assert peak_large < peak_small + page_bytes
+
+
+# ---------- streamed responses ----------
+
+class _CountingRecords:
+    def __init__(self, n: int):
+        self.n = n
+        self.produced = 0
+        self.closed = threading.Event()
+
+    def __call__(self):
+        try:
+            for i in range(self.n):
+                self.produced += 1
+                yield {"type": "page", "page_number": i + 1}
+        finally:
+            self.closed.set()
+
+
+def test_worker_waits_for_a_slow_client():
+    async def scenario():
+        gate = ExtractionGate()
+        records = _CountingRecords(50)
+        ahead = []
+        try:
+            received = 0
+            async for _ in stream_records(gate, records):
+                received += 1
+                await asyncio.sleep(0.005)  # a slow client
+                ahead.append(records.produced - received)
+            assert received == 50
+        finally:
+            gate.shutdown()
+        return ahead
+
+    ahead = asyncio.run(scenario())
+    # the queue, plus the record the worker is waiting to put
+    assert max(ahead) <= STREAM_QUEUE_RECORDS + 1
+
+
+def test_worker_stops_when_the_client_leaves():
+    async def scenario():
+        gate = ExtractionGate()
+        records = _CountingRecords(1000)
+        done = asyncio.Event()
+        stream = stream_records(gate, records, on_done=done.set)
+        try:
+            for _ in range(3):
+                await stream.__anext__()
+            await stream.aclose()
+            await asyncio.wait_for(done.wait(), 5)
+        finally:
+            gate.shutdown()
+        return records
+
+    records = asyncio.run(scenario())
+    assert records.closed.is_set()
+    assert records.produced <= 3 + STREAM_QUEUE_RECORDS + 2
+
+
+def test_streamed_result_is_cached(client, renderer):
+    pdf = ("a.pdf", fake_pdf(11, 12), "application/pdf")
+    response = client.post("/extract/stream", files={"file": pdf})
+    assert response.status_code == 200
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [r["type"] for r in records] == ["start", "page", "page", "summary"]
+    assert renderer.documents == 1
+
+    result = client.post("/extract", files={"file": pdf}).json()
+    assert result["cached"]
+    assert renderer.documents == 1
+    assert [p["page_number"] for p in result["pages"]] == [1, 2]
+    assert result["pages"] == [r for r in records if r.pop("type") == "page"]
+
+
+if __name__ == "__main__":
+    import pytest
+
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,238 @@
+"""
+Checks the text-layer fast path on small PDFs written here, text only,
+in Helvetica: word positions are taken relative to the page's media box
+(the box poppler renders), PageText.text_in reads a cell the way OCR
+would, rotated pages and pages with too few words have no text layer,
+and the classifier reads text cells from the layer and reports where
+each row's text came from in text_source. OCR is stubbed out:
+
+    python -m pytest app/test_text_layer.py
+    python -m app.test_text_layer
+"""
+import hashlib
+
+import pdfplumber
+import pytest
+from pdfminer.fontmetrics import FONT_METRICS
+
+from benchmarks.synthetic import PAGE_DPI, PAGE_H, PAGE_W, make_page
+
+from . import fullExtractionClass, text_layer
+from .fullExtractionClass import OCR_FIELDS, PageClassifier
+from .text_layer import PageText, iter_page_texts, read_page_text
+
+# synthetic pages in points
+PAGE_W_PT = PAGE_W * 72 / PAGE_DPI
+PAGE_H_PT = PAGE_H * 72 / PAGE_DPI
+FONT_SIZE = 6
+# Helvetica glyph widths, in 1/1000 em
+_HELVETICA = FONT_METRICS["Helvetica"][1]
+
+
+def _pdf_string(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_text_pdf(pages: list[dict]) -> bytes:
+    """
+    A PDF with one page per dict: "words" as (x, top, text) in points
+    from the media box's top-left corner, "mediabox" (default 600×800),
+    and optionally "cropbox" and "rotate".
+    """
+    objects = [
+        None,  # catalog
+        None,  # page tree
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for page in pages:
+        mx0, my0, mx1, my1 = page.get("mediabox", (0, 0, 600, 800))
+        stream = "".join(
+            f"BT /F1 {FONT_SIZE} Tf {mx0 + x:.2f} {my1 - top - FONT_SIZE:.2f} Td"
+            f" ({_pdf_string(text)}) Tj ET\n"
+            for x, top, text in page["words"]
+        ).encode("latin-1")
+        objects.append(
+            f"<< /Length {len(stream)} >>\nstream\n".encode("latin-1")
+            + stream + b"endstream"
+        )
+        content = len(objects)
+
+        attrs = f"/MediaBox [{mx0} {my0} {mx1} {my1}]"
+        if "cropbox" in page:
+            attrs += " /CropBox [{} {} {} {}]".format(*page["cropbox"])
+        if page.get("rotate"):
+            attrs += f" /Rotate {page['rotate']}"
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R {attrs}"
+            f" /Resources << /Font << /F1 3 0 R >> >> /Contents {content} 0 R >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+
+    objects[0] = "<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        body = obj if isinstance(obj, bytes) else obj.encode("latin-1")
+        out += f"{number} 0 obj\n".encode("ascii") + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("ascii")
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode("ascii")
+    out += (
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+        f"startxref\n{xref}\n%%EOF\n"
+    ).encode("ascii")
+    return bytes(out)
+
+
+def _page_text(tmp_path, page: dict):
+    path = tmp_path / "page.pdf"
+    path.write_bytes(make_text_pdf([page]))
+    with pdfplumber.open(path) as pdf:
+        return read_page_text(pdf.pages[0])
+
+
+_WORDS = [(60, 100, "one"), (120, 100, "two"), (60, 400, "three"),
+          (300, 400, "four"), (300, 700, "five")]
+
+
+def test_words_are_relative_to_the_media_box(tmp_path):
+    page_text = _page_text(tmp_path, {"words": _WORDS})
+    assert [w[4] for w in page_text.words] == ["one", "two", "three", "four", "five"]
+    x0, top, x1, bottom, _ = page_text.words[3]
+    assert x0 == pytest.approx(300 / 600)
+    assert (top + bottom) / 2 == pytest.approx((400 + FONT_SIZE / 2) / 800, abs=0.005)
+    assert x1 > x0 and bottom > top
+
+    # neither a crop box nor a media box away from the origin moves them
+    for page in (
+        {"words": _WORDS, "cropbox": (0, 0, 300, 400)},
+        {"words": _WORDS, "mediabox": (50, 100, 650, 900)},
+        {"words": _WORDS, "mediabox": (50, 100, 650, 900), "cropbox": (150, 300, 450, 700)},
+    ):
+        moved = _page_text(tmp_path, page)
+        assert len(moved.words) == len(page_text.words)
+        for a, b in zip(moved.words, page_text.words):
+            assert a[4] == b[4] and a[:4] == pytest.approx(b[:4])
+
+
+def test_rotated_page_has_no_text_layer(tmp_path):
+    assert _page_text(tmp_path, {"words": _WORDS}) is not None
+    assert _page_text(tmp_path, {"words": _WORDS, "rotate": 90}) is None
+
+
+def test_too_few_words(tmp_path, monkeypatch):
+    monkeypatch.setattr(text_layer, "TEXT_LAYER_MIN_WORDS", 5)
+    assert _page_text(tmp_path, {"words": _WORDS[:4]}) is None
+    assert _page_text(tmp_path, {"words": _WORDS}) is not None
+    assert _page_text(tmp_path, {"words": []}) is None
+
+
+def test_iter_page_texts(tmp_path, monkeypatch):
+    monkeypatch.setattr(text_layer, "TEXT_LAYER", True)
+    path = tmp_path / "doc.pdf"
+    path.write_bytes(make_text_pdf([{"words": _WORDS}, {"words": _WORDS[:1]}]))
+
+    texts = list(iter_page_texts(str(path), 3))
+    assert isinstance(texts[0], PageText)
+    # too few words, and a page the text layer doesn't have
+    assert texts[1:] == [None, None]
+
+    path.write_bytes(b"%PDF-1.4 not really")
+    assert list(iter_page_texts(str(path), 2)) == [None, None]
+
+    monkeypatch.setattr(text_layer, "TEXT_LAYER", False)
+    path.write_bytes(make_text_pdf([{"words": _WORDS}]))
+    assert list(iter_page_texts(str(path), 1)) == [None]
+
+
+def test_text_in():
+    page_text = PageText([
+        # two lines, the second one's words slightly out of step
+        (0.30, 0.11, 0.40, 0.13, "MMJ"),
+        (0.10, 0.10, 0.25, 0.12, "Sauna"),
+        (0.20, 0.152, 0.30, 0.172, "3x2,5S"),
+        (0.10, 0.15, 0.18, 0.17, "C16"),
+        # centre outside the box
+        (0.45, 0.10, 0.60, 0.12, "outside"),
+        (0.10, 0.19, 0.20, 0.23, "below"),
+    ])
+    assert page_text.text_in(0.0, 0.05, 0.5, 0.2) == "Sauna MMJ\nC16 3x2,5S"
+    assert page_text.text_in(0.0, 0.0, 0.5, 0.05) == ""
+    assert page_text.text_in(0.5, 0.0, 1.0, 1.0) == "outside"
+
+
+# ---------- the classifier reading from the text layer ----------
+
+def _fake_ocr_cells(cells):
+    return {
+        key: "ocr:" + hashlib.md5(bw.tobytes()).hexdigest()[:8]
+        for key, bw in cells.items()
+    }
+
+
+def _cell_words(classifier, truth, left_out=()) -> list:
+    """
+    The truth's texts as words, where the page draws them: a little
+    inside the left edge of their cell, vertically centred in the row.
+    """
+    columns = classifier.column_ranges(PAGE_W)
+    scale = 72 / PAGE_DPI
+    words = []
+    for row, (y1, y2) in zip(truth, classifier.row_bands(PAGE_H)):
+        for field in OCR_FIELDS:
+            if not row[field] or (row["row_index"], field) in left_out:
+                continue
+            top = (y1 + y2) / 2 * scale - FONT_SIZE / 2
+            x = (columns[field][0] + 10) * scale
+            for word in row[field].split():
+                words.append((x, top, word))
+                width = sum(_HELVETICA[c] for c in word) * FONT_SIZE / 1000
+                # wide enough a gap for pdfplumber to keep the words apart
+                x += width + FONT_SIZE
+    return words
+
+
+def test_text_cells_come_from_the_text_layer(tmp_path, monkeypatch):
+    monkeypatch.setattr(fullExtractionClass, "ocr_cells", _fake_ocr_cells)
+    classifier = PageClassifier()
+    image, truth = make_page(3)
+    filled = [row["row_index"] for row in truth if row["kuvaus"]]
+    empty = [row["row_index"] for row in truth if not row["kuvaus"]]
+    assert filled and empty
+    mixed = filled[0]
+
+    page_text = _page_text(tmp_path, {
+        "words": _cell_words(classifier, truth, left_out={(mixed, "kaapeli")}),
+        "mediabox": (0, 0, PAGE_W_PT, PAGE_H_PT),
+        # what a viewer shows; the words still line up with the raster
+        "cropbox": (20, 20, PAGE_W_PT - 20, PAGE_H_PT - 20),
+    })
+    rows = {r["row_index"]: r for r in classifier.classify(image, page_text=page_text)}
+
+    for row in truth:
+        got = rows[row["row_index"]]
+        if row["row_index"] in empty:
+            assert got["text_source"] == "none"
+            continue
+        for field in OCR_FIELDS:
+            if (row["row_index"], field) == (mixed, "kaapeli"):
+                assert got[field].startswith("ocr:")
+                assert got["text_sources"][field] == "ocr"
+            else:
+                assert got[field] == row[field]
+                assert got["text_sources"][field] == "text_layer"
+        expected = "mixed" if row["row_index"] == mixed else "text_layer"
+        assert got["text_source"] == expected
+
+    # without a text layer, every cell is OCR'd
+    for got in classifier.classify(image):
+        assert got["text_source"] == ("none" if got["row_index"] in empty else "ocr")
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,154 @@
+"""
+Text-layer fast path: read the text cells of vector PDFs straight from
+the PDF instead of running OCR on the rendered page.
+
+CAD exports usually carry the schedule's text (nro, kuvaus, suoja,
+kaapeli) as real text. pdfplumber gives every word with its position,
+so a cell's text is simply the words that lie inside it. Symbols are
+still template-matched on the raster, and cells the text layer has no
+words for fall back to OCR (see `PageClassifier.classify`).
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+from typing import Iterator, Optional
+
+import pdfplumber
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# TEXT_LAYER=0 always OCRs, even when the PDF has a text layer.
+TEXT_LAYER = os.getenv("TEXT_LAYER", "1") != "0"
+# a page needs at least this many real words to count as having a
+# usable text layer (scans have none, or only a few stray ones)
+TEXT_LAYER_MIN_WORDS = int(os.getenv("TEXT_LAYER_MIN_WORDS", "5"))
+
+# what pdfminer emits for glyphs of fonts without a Unicode mapping
+_UNMAPPED_GLYPH = "(cid:"
+
+
+class PageText:
+    """
+    The words of one page's text layer, each as
+    (x0, top, x1, bottom, text) with coordinates in fractions of the page
+    size, so they line up with the classifier's column fractions and row
+    bands at any DPI. Small and picklable: it travels with the page to
+    the page workers.
+    """
+
+    def __init__(self, words: list[tuple[float, float, float, float, str]]):
+        self.words = words
+
+    def text_in(self, x1: float, y1: float, x2: float, y2: float) -> str:
+        """
+        Text of the words whose centre lies in the box (page fractions):
+        lines top to bottom, words left to right – the shape OCR returns
+        for a cell.
+        """
+        inside = [
+            (top, bottom, left, text)
+            for left, top, right, bottom, text in self.words
+            if x1 <= (left + right) / 2 < x2 and y1 <= (top + bottom) / 2 < y2
+        ]
+        if not inside:
+            return ""
+        inside.sort()
+
+        lines: list[list[tuple[float, str]]] = []
+        line_bottom = None
+        for top, bottom, left, text in inside:
+            # a word starting above the current line's bottom joins it
+            if line_bottom is None or top >= line_bottom:
+                lines.append([])
+                line_bottom = bottom
+            else:
+                line_bottom = max(line_bottom, bottom)
+            lines[-1].append((left, text))
+        return "\n".join(
+            " ".join(text for _, text in sorted(line)) for line in lines
+        )
+
+    def fingerprint(self) -> str:
+        hasher = hashlib.blake2b(digest_size=16)
+        for word in self.words:
+            hasher.update(repr(word).encode("utf-8"))
+        return hasher.hexdigest()
+
+
+def read_page_text(page) -> Optional[PageText]:
+    """
+    The text layer of a pdfplumber page, or None when it has no usable
+    one (scanned page, text drawn as outlines, fonts without a Unicode
+    mapping) or is rotated, where the words' coordinates don't match the
+    rendered page.
+    """
+    if page.rotation:
+        return None
+
+    # poppler renders the media box (not the crop box), and pdfplumber
+    # gives word positions in the media box's coordinates too
+    x0, top, x1, bottom = page.mediabox
+    width, height = x1 - x0, bottom - top
+    if width <= 0 or height <= 0:
+        return None
+
+    words = [
+        (
+            (w["x0"] - x0) / width,
+            (w["top"] - top) / height,
+            (w["x1"] - x0) / width,
+            (w["bottom"] - top) / height,
+            w["text"],
+        )
+        for w in page.extract_words()
+        if _UNMAPPED_GLYPH not in w["text"]
+    ]
+    if len(words) < TEXT_LAYER_MIN_WORDS:
+        return None
+    return PageText(words)
+
+
+def iter_page_texts(pdf_path: str, total: int) -> Iterator[Optional[PageText]]:
+    """
+    The `read_page_text` of pages 1..total, one page at a time. Yields
+    None for every page when the text layer is disabled or the PDF can't
+    be parsed (poppler may still render it, so that is not an error).
+    """
+    if not TEXT_LAYER:
+        for _ in range(total):
+            yield None
+        return
+
+    pdf = None
+    try:
+        pdf = pdfplumber.open(pdf_path)
+        pages = pdf.pages
+    except Exception as e:
+        if pdf is not None:
+            pdf.close()
+        logger.warning("No text layer for %s: %s", pdf_path, e)
+        for _ in range(total):
+            yield None
+        return
+
+    with pdf:
+        for page_number in range(1, total + 1):
+            page_text = None
+            if page_number <= len(pages):
+                page = pages[page_number - 1]
+                try:
+                    with metrics.stage("text_layer"):
+                        page_text = read_page_text(page)
+                except Exception as e:
+                    logger.warning(
+                        "Text layer of %s page %d unreadable: %s",
+                        pdf_path, page_number, e,
+                    )
+                finally:
+                    # pdfplumber caches every parsed object on the page
+                    page.close()
+            yield page_text
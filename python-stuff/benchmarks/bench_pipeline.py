@@ -0,0 +1,284 @@
+"""
+End-to-end benchmark on synthetic schedule pages (see `synthetic.py`).
+
+Two phases, each in a fresh process so peak RSS is its own:
+
+  classify  – `classify_page_image` on in-memory pages
+  pdf       – `extract_from_pdf_bytes` on the same pages wrapped in a
+              multi-page PDF (needs poppler, like the service)
+
+Reported per phase: pages/sec, mean latency per pipeline stage (from the
+`app.metrics` histograms), peak RSS, and detection accuracy against the
+known ground truth: symbol precision / recall / F1 over (row, symbol)
+pairs, rows whose symbol set is exactly right, and exact-match rate of
+the text fields. Results go to stdout and, with --out, to a JSON file
+that can be compared across commits.
+
+    python -m benchmarks.bench_pipeline [--pages 10] [--seed 0] [--timeout 1800] [--out bench.json]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+from queue import Empty
+
+TEXT_FIELDS = ("nro", "kuvaus", "suoja", "kaapeli")
+
+# settings that change what the pipeline does, recorded with every run
+CONFIG_ENV = (
+    "MATCH_MODE", "NMS_ACROSS_TEMPLATES", "INK_MIN_FRACTION", "OCR_BACKEND",
+    "OCR_BATCH", "OCR_THREADS", "RASTER_MODE", "SYMBOL_DPI", "TEXT_DPI", "TEXT_LAYER",
+    "EXTRACT_WORKERS",
+)
+
+# longest a phase may run (--timeout), and how often the parent looks
+# whether its process is still alive while waiting for the result
+PHASE_TIMEOUT = 1800.0
+POLL_SECONDS = 1.0
+
+
+def peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def stage_latencies(samples: dict) -> dict:
+    """
+    Mean seconds and count per stage from drained `extract_stage_seconds`
+    samples.
+    """
+    out = {}
+    for (stage,), (counts, total) in sorted(samples.get("extract_stage_seconds", {}).items()):
+        n = sum(counts)
+        out[stage] = {"count": n, "mean_seconds": round(total / n, 6) if n else 0.0}
+    return out
+
+
+def score(truth: list[list[dict]], predicted: list[list[dict]]) -> dict:
+    """
+    Accuracy of per-page row predictions ({"row_index", "symbols", text
+    fields}) against the ground truth.
+    """
+    tp = fp = fn = rows = exact_rows = 0
+    text_hits = {f: 0 for f in TEXT_FIELDS}
+    text_total = {f: 0 for f in TEXT_FIELDS}
+
+    for page_truth, page_pred in zip(truth, predicted):
+        by_index = {r["row_index"]: r for r in page_pred}
+        for t in page_truth:
+            p = by_index.get(t["row_index"], {})
+            want, got = set(t["symbols"]), set(p.get("symbols", []))
+            tp += len(want & got)
+            fp += len(got - want)
+            fn += len(want - got)
+            rows += 1
+            exact_rows += want == got
+            for f in TEXT_FIELDS:
+                if t[f]:
+                    text_total[f] += 1
+                    text_hits[f] += p.get(f, "").strip() == t[f]
+
+    precision = tp / (tp + fp) if tp + fp else 1.0
+    recall = tp / (tp + fn) if tp + fn else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {
+        "symbol_precision": round(precision, 4),
+        "symbol_recall": round(recall, 4),
+        "symbol_f1": round(f1, 4),
+        "rows_exact": round(exact_rows / rows, 4) if rows else 0.0,
+        "text_exact": {
+            f: round(text_hits[f] / text_total[f], 4) if text_total[f] else None
+            for f in TEXT_FIELDS
+        },
+    }
+
+
+# ---------- phases (run in child processes) ----------
+
+def _phase_classify(n_pages: int, seed: int) -> dict:
+    from app import metrics
+    from app.fullExtractionClass import classify_page_image, get_template_bank
+
+    from .synthetic import load_templates, make_page
+
+    get_template_bank()
+    templates = load_templates()
+    pages = [make_page(seed + i, templates) for i in range(n_pages)]
+    classify_page_image(pages[0][0])  # warm-up
+    metrics.REGISTRY.drain()
+
+    predicted = []
+    t0 = time.perf_counter()
+    for img, _ in pages:
+        rows = classify_page_image(img)
+        predicted.append([
+            {"row_index": r["row_index"], "symbols": r["unique_symbols"],
+             **{f: r[f] for f in TEXT_FIELDS}}
+            for r in rows
+        ])
+    elapsed = time.perf_counter() - t0
+
+    return {
+        "pages": n_pages,
+        "seconds": round(elapsed, 4),
+        "pages_per_sec": round(n_pages / elapsed, 3),
+        "stages": stage_latencies(metrics.REGISTRY.drain()),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "accuracy": score([t for _, t in pages], predicted),
+    }
+
+
+def _phase_pdf(n_pages: int, seed: int) -> dict:
+    from app import metrics
+    from app.extractor import extract_from_pdf_bytes, shutdown_page_pool
+    from app.fullExtractionClass import get_template_bank
+
+    from .synthetic import load_templates, make_page, make_pdf
+
+    get_template_bank()
+    templates = load_templates()
+    pages = [make_page(seed + i, templates) for i in range(n_pages)]
+    truth = [t for _, t in pages]
+    pdf_bytes = make_pdf([img for img, _ in pages])
+    del pages
+    metrics.REGISTRY.drain()
+
+    try:
+        t0 = time.perf_counter()
+        result = extract_from_pdf_bytes(pdf_bytes, "synthetic.pdf")
+        elapsed = time.perf_counter() - t0
+    finally:
+        shutdown_page_pool()
+
+    predicted = [
+        [{"row_index": r.row_index, "symbols": r.symbols,
+          **{f: getattr(r, f) for f in TEXT_FIELDS}} for r in p.rows]
+        for p in sorted(result.pages, key=lambda p: p.page_number)
+    ]
+    return {
+        "pages": n_pages,
+        "pdf_bytes": len(pdf_bytes),
+        "seconds": round(elapsed, 4),
+        "pages_per_sec": round(n_pages / elapsed, 3),
+        "stages": stage_latencies(metrics.REGISTRY.drain()),
+        # parent process only; page workers (EXTRACT_WORKERS) have their own
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "accuracy": score(truth, predicted),
+    }
+
+
+PHASES = {"classify": _phase_classify, "pdf": _phase_pdf}
+
+
+def _child(phase: str, n_pages: int, seed: int, queue) -> None:
+    try:
+        # process start, as in the service's lifespan
+        from app.ocr import limit_tesseract_threads
+
+        limit_tesseract_threads()
+        queue.put(PHASES[phase](n_pages, seed))
+    except Exception as e:
+        queue.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def run_phase(
+    phase: str, n_pages: int, seed: int, timeout: float = PHASE_TIMEOUT,
+) -> dict:
+    """
+    Run one phase in a fresh process. A phase whose process dies without
+    a result (OOM killer, a crash in native code) or that runs longer
+    than `timeout` seconds is reported as failed instead of hanging the
+    benchmark.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_child, args=(phase, n_pages, seed, queue))
+    proc.start()
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            try:
+                return queue.get(timeout=POLL_SECONDS)
+            except Empty:
+                pass
+            if not proc.is_alive():
+                # the result may still have been in flight
+                try:
+                    return queue.get(timeout=POLL_SECONDS)
+                except Empty:
+                    return {"error": f"process exited with code {proc.exitcode}"}
+            if time.monotonic() > deadline:
+                proc.terminate()
+                return {"error": f"timed out after {timeout:g} s"}
+    finally:
+        proc.join(timeout=10 * POLL_SECONDS)
+        if proc.is_alive():
+            proc.kill()
+            proc.join()
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--phase", choices=sorted(PHASES), action="append",
+        help="run only this phase (repeatable; default: all)",
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=PHASE_TIMEOUT,
+        help="seconds after which a phase counts as failed (default: %(default)g)",
+    )
+    parser.add_argument("--out", type=Path, help="write the results as JSON here")
+    args = parser.parse_args()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "pages": args.pages,
+        "seed": args.seed,
+        "config": {k: os.environ[k] for k in CONFIG_ENV if k in os.environ},
+        "phases": {},
+    }
+    for phase in args.phase or list(PHASES):
+        result = run_phase(phase, args.pages, args.seed, args.timeout)
+        report["phases"][phase] = result
+        if "error" in result:
+            print(f"{phase:>8}: failed – {result['error']}")
+            continue
+        acc = result["accuracy"]
+        print(
+            f"{phase:>8}: {result['pages_per_sec']:7.2f} pages/s  "
+            f"peak RSS {result['peak_rss_mb']:7.1f} MB  "
+            f"symbol F1 {acc['symbol_f1']:.3f}  rows exact {acc['rows_exact']:.3f}"
+        )
+        for stage, s in result["stages"].items():
+            print(f"{'':>10}{stage:<14} {s['mean_seconds'] * 1000:9.2f} ms × {s['count']}")
+
+    if args.out is not None:
+        args.out.write_text(json.dumps(report, indent=2))
+        print(f"wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
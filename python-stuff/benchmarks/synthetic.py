@@ -0,0 +1,186 @@
+"""
+Synthetic schedule pages with known ground truth, for the benchmarks.
+
+A page is REF_PAGE_WIDTH × REF_PAGE_HEIGHT, white, with the table's
+rules drawn in: above and below every row band, and between the
+columns. Every row band gets 0–2 symbols
+pasted from `app/templates/` into the symbol column (never two of a
+mutually-exclusive group) and rendered text in the nro / kuvaus / suoja
+/ kaapeli columns. Some rows are left empty, as on real sheets.
+
+Pages are generated from a seed, so every run and every commit sees
+exactly the same input.
+"""
+from __future__ import annotations
+
+import io
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from app.fullExtractionClass import (
+    COLUMN_FRACS,
+    MUTUALLY_EXCLUSIVE_GROUPS,
+    REF_PAGE_HEIGHT,
+    REF_PAGE_WIDTH,
+    REF_ROW_BANDS,
+    ROW_MARGIN_BOTTOM,
+    ROW_MARGIN_TOP,
+    TEMPLATE_DIR,
+)
+
+PAGE_W = int(REF_PAGE_WIDTH)
+PAGE_H = int(REF_PAGE_HEIGHT)
+# DPI the reference layout (and the templates) correspond to
+PAGE_DPI = 300
+
+# share of rows left completely empty
+EMPTY_ROW_RATE = 0.2
+# gap between symbols / from the symbol column's left edge
+SYMBOL_GAP = 16
+# table rules are kept this far away from pasted content
+RULE_CLEARANCE = 4
+
+_KUVAUS_WORDS = (
+    "Valaistus", "Pistorasiat", "Ilmanvaihto", "Lattialammitys", "Kiuas",
+    "Liesi", "Astianpesukone", "Pesukone", "Kuivausrumpu", "Ulkovalot",
+    "Autolampa", "Sauna", "Keittio", "Kylpyhuone", "Varasto", "Piha",
+)
+_CABLES = ("MMJ 3x1,5S", "MMJ 3x2,5S", "MMJ 5x1,5S", "MMJ 5x2,5S", "MCMK 4x6+6")
+_FUSES = ("C10", "C16", "B16", "C20", "3x25A", "3x35A", "30mA")
+
+_FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+
+def load_templates() -> dict[str, np.ndarray]:
+    """
+    The raw template drawings (BGR), by name – the same files the
+    classifier's template bank is built from.
+    """
+    templates = {}
+    for p in sorted(TEMPLATE_DIR.glob("*.png")):
+        img = cv2.imdecode(np.fromfile(str(p), np.uint8), cv2.IMREAD_COLOR)
+        if img is not None:
+            templates[p.stem] = img
+    return templates
+
+
+def _exclusive(a: str, b: str) -> bool:
+    return any(a in g and b in g for g in MUTUALLY_EXCLUSIVE_GROUPS)
+
+
+def _column(field: str) -> tuple[int, int]:
+    x1_frac, x2_frac = COLUMN_FRACS[field]
+    return int(round(x1_frac * PAGE_W)), int(round(x2_frac * PAGE_W))
+
+
+def _put_text(page: np.ndarray, text: str, field: str, y1: int, y2: int) -> None:
+    x1, x2 = _column(field)
+    scale, thickness = 0.9, 2
+    while scale > 0.4:
+        (tw, th), _ = cv2.getTextSize(text, _FONT, scale, thickness)
+        if tw <= x2 - x1 - 2 * SYMBOL_GAP:
+            break
+        scale -= 0.1
+    baseline = (y1 + y2 + th) // 2
+    cv2.putText(
+        page, text, (x1 + SYMBOL_GAP, baseline), _FONT, scale, (0, 0, 0),
+        thickness, cv2.LINE_AA,
+    )
+
+
+def _column_rules() -> list[int]:
+    """
+    x of the vertical table rules: one outside each outer column and one
+    halfway through every gap between neighbouring columns.
+    """
+    edges = sorted(_column(field) for field in COLUMN_FRACS)
+    rules = [edges[0][0] - RULE_CLEARANCE]
+    for (_, left_x2), (right_x1, _) in zip(edges, edges[1:]):
+        rules.append((left_x2 + right_x1) // 2)
+    rules.append(edges[-1][1] + RULE_CLEARANCE)
+    return rules
+
+
+def make_page(
+    seed: int,
+    templates: dict[str, np.ndarray] | None = None,
+) -> tuple[np.ndarray, list[dict]]:
+    """
+    One synthetic BGR page and its ground truth: per row band
+    {"row_index", "symbols" (sorted names), "nro", "kuvaus", "suoja",
+    "kaapeli"}, with "" for text that isn't there.
+    """
+    if templates is None:
+        templates = load_templates()
+    rng = np.random.default_rng(seed)
+    page = np.full((PAGE_H, PAGE_W, 3), 255, np.uint8)
+
+    # table rules: row band edges and column edges
+    for y1, y2 in REF_ROW_BANDS:
+        for y in (y1 - RULE_CLEARANCE, y2 + RULE_CLEARANCE):
+            cv2.line(page, (0, y), (PAGE_W - 1, y), (0, 0, 0), 2)
+    table_top = REF_ROW_BANDS[0][0] - RULE_CLEARANCE
+    table_bottom = REF_ROW_BANDS[-1][1] + RULE_CLEARANCE
+    for x in _column_rules():
+        cv2.line(page, (x, table_top), (x, table_bottom), (0, 0, 0), 2)
+
+    sx1, sx2 = _column("symbol")
+    truth = []
+    for idx, (y1, y2) in enumerate(REF_ROW_BANDS, start=1):
+        row = {"row_index": idx, "symbols": [], "nro": "", "kuvaus": "",
+               "suoja": "", "kaapeli": ""}
+        truth.append(row)
+        if rng.random() < EMPTY_ROW_RATE:
+            continue
+
+        # --- symbols that fit the strip, left to right ---
+        top = y1 + ROW_MARGIN_TOP + RULE_CLEARANCE
+        bottom = y2 - ROW_MARGIN_BOTTOM - RULE_CLEARANCE
+        fitting = [n for n, t in templates.items() if t.shape[0] <= bottom - top]
+        x = sx1 + SYMBOL_GAP
+        for _ in range(int(rng.integers(1, 3))):
+            candidates = [
+                n for n in fitting
+                if templates[n].shape[1] <= sx2 - SYMBOL_GAP - x
+                and not any(n == m or _exclusive(n, m) for m in row["symbols"])
+            ]
+            if not candidates:
+                break
+            name = candidates[int(rng.integers(len(candidates)))]
+            tpl = templates[name]
+            th, tw = tpl.shape[:2]
+            y = top + int(rng.integers(0, bottom - top - th + 1))
+            page[y : y + th, x : x + tw] = np.minimum(page[y : y + th, x : x + tw], tpl)
+            row["symbols"].append(name)
+            x += tw + SYMBOL_GAP
+        row["symbols"].sort()
+
+        # --- text ---
+        row["nro"] = f"{int(rng.integers(1, 40))}"
+        row["kuvaus"] = " ".join(
+            _KUVAUS_WORDS[int(i)] for i in rng.choice(len(_KUVAUS_WORDS), 2, replace=False)
+        )
+        row["suoja"] = _FUSES[int(rng.integers(len(_FUSES)))]
+        row["kaapeli"] = _CABLES[int(rng.integers(len(_CABLES)))]
+        for field in ("nro", "kuvaus", "suoja", "kaapeli"):
+            _put_text(page, row[field], field, y1, y2)
+
+    # a little scanner dust
+    dust = rng.random((PAGE_H, PAGE_W)) < 0.0002
+    page[dust] = 0
+    return page, truth
+
+
+def make_pdf(pages: list[np.ndarray], dpi: int = PAGE_DPI) -> bytes:
+    """
+    Wrap page images into one (image-only) multi-page PDF at `dpi`, so
+    rasterising it at the same DPI gives the pages back.
+    """
+    images = [Image.fromarray(cv2.cvtColor(p, cv2.COLOR_BGR2RGB)) for p in pages]
+    out = io.BytesIO()
+    images[0].save(
+        out, "PDF", save_all=True, append_images=images[1:], resolution=float(dpi),
+    )
+    return out.getvalue()